@@ -0,0 +1,103 @@
+"""
+Adaptive azimuth sampling of the linearizations (see linearization.adaptiveAzimuthLinearization)
+
+The MBC3 only uses the azimuth average of the transformed state matrices, which usually converges with much fewer
+azimuths than the 36 typically used. The azimuths are refined on nested grids (e.g. 6, 12, 36 per revolution):
+ - the first grid is linearized for all the cases
+ - the next grid only adds the azimuths that are not already in the previous one (extra linearizations, run as
+   separate simulations), and only for the cases that have not converged
+ - a case has converged when the averaged MBC state matrix and its eigenvalues change less than a tolerance
+   between two grids
+The linearization files of the extra azimuths are linked to the main case, as `base.<n>.lin`, such that the
+postprocessing (e.g. postproLinearization) sees a single set of equally spaced azimuths. The files are numbered by
+grid (the first n0 files are the first grid, followed by the azimuths added by each grid), not in azimuth order: the
+MBC uses the azimuth stored in each file.
+"""
+import os
+import glob
+import shutil
+import numpy as np
+
+try:
+    from .mbc3 import fx_mbc3, eiganalysis
+    from .fastJobs import outputFiles
+except ImportError:
+    from mbc3 import fx_mbc3, eiganalysis
+    from fastJobs import outputFiles
+
+
+def azimuthLevels(nMax=36, n0=6):
+    """
+    Number of azimuths of nested grids, from n0 to nMax, each grid being a multiple of the previous one.
+    e.g. azimuthLevels(36, 6) = [6, 12, 36]
+    """
+    if nMax % n0 != 0:
+        raise Exception('The maximum number of azimuths ({}) should be a multiple of the initial number ({})'.format(nMax, n0))
+    levels = [n0]
+    while levels[-1] < nMax:
+        n = levels[-1]
+        levels.append(min([m*n for m in range(2, nMax//n+1) if nMax % (m*n) == 0]))
+    return levels
+
+
+def newPhases(n, nPrev):
+    """ Fractions of a revolution of the azimuths of a grid of n points that are not in the grid of nPrev points """
+    k = np.arange(n)
+    return k[(k*nPrev) % n != 0]/n
+
+
+def azimuthConvergence(FileNames, nPrev):
+    """
+    Change of the azimuth-averaged MBC state matrix and of its eigenvalues, between the first nPrev linearization
+    files (previous grid) and all the files (current grid).
+
+    OUTPUTS:
+      - dA: relative change of the averaged state matrix (Frobenius norm)
+      - dEig: maximum relative change of the eigenvalues (sorted by natural frequency)
+    """
+    MBC, _, _ = fx_mbc3(FileNames, verbose=False, eigen=False)
+    A    = MBC['AvgA']
+    Aprev = np.mean(MBC['A'][:,:,:nPrev], axis=2)
+    dA   = np.linalg.norm(A-Aprev)/max(np.linalg.norm(A), 1e-16)
+    ev   = eiganalysis(A,     MBC['ndof2'], MBC['ndof1'])[0]
+    evp  = eiganalysis(Aprev, MBC['ndof2'], MBC['ndof1'])[0]
+    l, lp = ev['Evals'][np.argsort(ev['NaturalFrequencies'])], evp['Evals'][np.argsort(evp['NaturalFrequencies'])]
+    if len(l)!=len(lp):
+        return dA, np.inf
+    dEig = np.max(np.abs(l-lp)/np.maximum(np.abs(l), 1e-6)) if len(l)>0 else 0
+    return dA, dEig
+
+
+def appendLinFiles(fstFile, levelFst, nExisting):
+    """
+    Link (or copy) the linearization files of an extra simulation to the main case, as base.<nExisting+j>.lin
+    (numbered after the existing files, not in azimuth order)
+    OUTPUTS:
+      - n: number of linearization files of the main case
+    """
+    base = os.path.splitext(fstFile)[0]
+    for j, src in enumerate(outputFiles(levelFst)):
+        dst = '{}.{:d}.lin'.format(base, nExisting+j+1)
+        if os.path.exists(dst):
+            if os.path.samefile(src, dst):
+                continue
+            os.remove(dst)
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copy2(src, dst)
+    return nExisting + len(outputFiles(levelFst))
+
+
+def trimLinFiles(fstFile, n):
+    """ Remove the linearization files base.<k>.lin with k>n (e.g. from a previous run with more azimuths) """
+    base = os.path.splitext(fstFile)[0]
+    for f in glob.glob(base+'.*.lin'):
+        try:
+            k = int(f[len(base)+1:-4])
+        except ValueError:
+            continue
+        if k>n:
+            os.remove(f)
+            if os.path.exists(f+'.npz'):
+                os.remove(f+'.npz')
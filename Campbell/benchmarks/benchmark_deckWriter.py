@@ -0,0 +1,49 @@
+"""
+Benchmark of the generation of linearization cases from a template deck (see deckWriter and
+linearization.writeFASTLinInputs)
+
+The template deck of _ExampleData/5MW_Land_Lin_Templates is copied to a temporary folder, and the input files of
+nCases operating points are written (by default 10000). The time spent rendering the cases is reported separately.
+
+Usage:
+    python benchmark_deckWriter.py [nCases]
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import numpy as np
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from linearization import writeFASTLinInputs
+from deckWriter import DeckTemplate
+
+EXAMPLE_DIR = os.path.join(os.path.dirname(__file__), '..', '..', '_ExampleData')
+
+
+if __name__=='__main__':
+    nCases = int(sys.argv[1]) if len(sys.argv)>1 else 10000
+    tmpDir = tempfile.mkdtemp()
+    try:
+        for d in ['5MW_Land_Lin_Templates', '5MW_Baseline']:
+            shutil.copytree(os.path.join(EXAMPLE_DIR, d), os.path.join(tmpDir, d))
+        fst     = os.path.join(tmpDir, '5MW_Land_Lin_Templates', 'Main_5MW_Land_Lin.fst')
+        workDir = os.path.join(tmpDir, 'Lin')
+        WS    = 3+0.1*np.arange(nCases) # unique case names
+        RPM   = np.linspace(6, 12.1, nCases)
+        Pitch = np.linspace(0, 20, nCases)
+
+        t0 = time.time()
+        files = writeFASTLinInputs(fst, workDir, WS, RPM, Pitch, cache=False)
+        t1 = time.time()
+        print('Cases written : {:d} in {:.2f}s ({:.2f} ms/case)'.format(len(files), t1-t0, (t1-t0)/nCases*1000))
+
+        tpl = DeckTemplate(fst)
+        PARAMS = [{'__name__':'c{:d}'.format(i), 'EDFile|RotSpeed':rpm, 'InflowFile|HWindSpeed':ws, 'LinTimes':list(100+np.arange(36)/36*60/rpm)} for i,(ws,rpm) in enumerate(zip(WS,RPM))]
+        t0 = time.time()
+        for p in PARAMS:
+            tpl.render(p, workDir)
+        t1 = time.time()
+        print('Rendering only: {:.2f}s ({:.2f} ms/case)'.format(t1-t0, (t1-t0)/nCases*1000))
+    finally:
+        shutil.rmtree(tmpDir)
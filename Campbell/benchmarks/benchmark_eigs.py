@@ -0,0 +1,60 @@
+"""
+Benchmark of the sparse eigenanalysis (lowest modes only, see mbc3.eiganalysisSparse) against the dense one (mbc3.eiganalysis)
+
+The state matrix is the one of a synthetic structural model with a banded stiffness matrix (e.g. a chain of finite
+elements as in BeamDyn), with Rayleigh damping, and one first order state.
+
+Usage:
+    python benchmark_eigs.py [ndof2] [nModes]
+"""
+import os
+import sys
+import time
+import numpy as np
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from mbc3 import eiganalysis, eiganalysisSparse
+
+
+def syntheticStateMatrix(ndof2=600, ndof1=1, seed=0):
+    """ State matrix (2*ndof2+ndof1) of a chain of springs and masses, states ordered as {q2, q2_dot, q1} """
+    rng = np.random.RandomState(seed)
+    k   = 1e4*(1+rng.rand(ndof2+1))
+    m   = 1+rng.rand(ndof2)
+    K   = np.diag(k[:-1]+k[1:]) - np.diag(k[1:-1],1) - np.diag(k[1:-1],-1)
+    C   = 1e-3*K + 1e-2*np.diag(m)
+    Minv = np.diag(1/m)
+    ns  = 2*ndof2+ndof1
+    A   = np.zeros((ns,ns))
+    A[:ndof2, ndof2:2*ndof2] = np.eye(ndof2)
+    A[ndof2:2*ndof2, :ndof2]        = -Minv @ K
+    A[ndof2:2*ndof2, ndof2:2*ndof2] = -Minv @ C
+    A[2*ndof2:, 2*ndof2:] = -1 # first order states
+    return A
+
+
+if __name__ == '__main__':
+    ndof2  = int(sys.argv[1]) if len(sys.argv)>1 else 600
+    nModes = int(sys.argv[2]) if len(sys.argv)>2 else 20
+    A = syntheticStateMatrix(ndof2)
+    eiganalysisSparse(syntheticStateMatrix(100), 100, 1, nModes=5) # warm-up (imports of scipy)
+
+    t0 = time.perf_counter()
+    mbc, _ = eiganalysis(A, ndof2, 1)
+    tDense = time.perf_counter()-t0
+    t0 = time.perf_counter()
+    mbcs, _ = eiganalysisSparse(A, ndof2, 1, nModes=nModes)
+    tSparse = time.perf_counter()-t0
+    fmax = np.sort(mbc['NaturalFreqs_Hz'])[nModes-1]*(1+1e-8)
+    t0 = time.perf_counter()
+    mbcw, _ = eiganalysisSparse(A, ndof2, 1, fmax=fmax)
+    tWindow = time.perf_counter()-t0
+
+    fDense  = np.sort(mbc['NaturalFreqs_Hz'])[:nModes]
+    fSparse = np.sort(mbcs['NaturalFreqs_Hz'])
+    fWindow = np.sort(mbcw['NaturalFreqs_Hz'])
+    np.testing.assert_allclose(fSparse, fDense, rtol=1e-8)
+    np.testing.assert_allclose(fWindow, fDense[:len(fWindow)], rtol=1e-8)
+    print('States: {:d}, modes: {:d} (lowest {:.3f} Hz to {:.3f} Hz)'.format(A.shape[0], nModes, fDense[0], fDense[-1]))
+    print('Dense (all modes)   : {:8.4f}s'.format(tDense))
+    print('Sparse (nModes)     : {:8.4f}s  speedup {:6.1f}x'.format(tSparse, tDense/tSparse))
+    print('Sparse (fmax)       : {:8.4f}s  speedup {:6.1f}x ({:d} modes)'.format(tWindow, tDense/tWindow, len(fWindow)))
@@ -0,0 +1,126 @@
+"""
+Benchmark of the extraction of identified and unidentified modes in postproMBC (see linearization.extractModes)
+
+The vectorized implementation is compared to the original loop-based implementation on synthetic data
+(by default 500 operating points and 60 modes). The outputs are checked to be identical.
+
+Usage:
+    python benchmark_postproMBC.py [nOP] [nModes]
+"""
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from linearization import extractModes
+
+
+def syntheticModes(nOP=500, nModes=60, nModesIDd=None, seed=0):
+    """ Synthetic ModeData, ModeIDs and ModeNames as read by postproMBC """
+    if nModesIDd is None:
+        nModesIDd = 2*nModes//3
+    rng = np.random.RandomState(seed)
+    WS  = np.linspace(3, 25, nOP)
+    RPM = np.linspace(5, 12, nOP)
+    ModeData = []
+    ModeIDs  = np.zeros((nModesIDd, nOP), dtype=int)
+    for iOP in range(nOP):
+        n = nModes - rng.randint(0, 4) # varying number of modes per OP
+        ModeData.append({'Fnat' :np.sort(rng.rand(n)*5),
+                         'Fdmp' :np.sort(rng.rand(n)*5),
+                         'Damps':rng.rand(n)*0.1})
+        ID = rng.permutation(n)[:nModesIDd]+1
+        ID[rng.rand(len(ID))<0.1] = 0 # modes not found at this OP
+        ModeIDs[:len(ID),iOP] = ID
+    ModeNames = np.array(['Mode {:d} - description'.format(i+1) for i in range(nModesIDd)], dtype=object)
+    ModeNames[::7] = ['Mode {:d} (not shown)'.format(i+1) for i in range(0, nModesIDd, 7)]
+    ModeIDs[-1,:] = 0 # a mode never found
+    return ModeData, ModeIDs, ModeNames, WS, RPM
+
+
+def extractModesLoops(ModeData, ModeIDs, ModeNames, WS, RPM):
+    """ Original implementation of postproMBC, with loops, used as reference """
+    nModesIDd = len(ModeNames)
+    UnMapped_WS   = []
+    UnMapped_RPM  = []
+    UnMapped_Freq = []
+    UnMapped_Damp = []
+    for iOP,(ws,rpm) in enumerate(zip(WS,RPM)):
+        m = ModeData[iOP]
+        nModesMax = len(m['Fnat'])
+        nModes = min(nModesMax, nModesIDd)
+        Indices = (np.asarray(ModeIDs[:,iOP])-1).astype(int)
+        IndicesMissing = [i for i in np.arange(nModes) if i not in Indices]
+        f   = np.asarray([m['Fnat'] [iiMode] for iiMode in IndicesMissing])
+        d   = np.asarray([m['Damps'][iiMode] for iiMode in IndicesMissing])
+        ws  = np.asarray([ws]*len(f))
+        rpm = np.asarray([rpm]*len(f))
+        UnMapped_Freq = np.concatenate((UnMapped_Freq, f))
+        UnMapped_Damp = np.concatenate((UnMapped_Damp, d))
+        UnMapped_WS   = np.concatenate((UnMapped_WS, ws))
+        UnMapped_RPM  = np.concatenate((UnMapped_RPM, rpm))
+    for m,ws,rpm in zip(ModeData,WS,RPM):
+        f   = m['Fnat'][nModesIDd:]
+        d   = m['Damps'][nModesIDd:]
+        ws  = np.asarray([ws]*len(f))
+        rpm = np.asarray([rpm]*len(f))
+        UnMapped_Freq = np.concatenate((UnMapped_Freq, f))
+        UnMapped_Damp = np.concatenate((UnMapped_Damp, d))
+        UnMapped_WS   = np.concatenate((UnMapped_WS, ws))
+        UnMapped_RPM  = np.concatenate((UnMapped_RPM, rpm))
+    cols=[ m.split('-')[0].strip().replace(' ','_') for m in ModeNames]
+    cols=[v + str(cols[:i].count(v) + 1) if cols.count(v) > 1 else v for i, v in enumerate(cols)]
+    Freq = pd.DataFrame(np.nan, index=np.arange(len(WS)), columns=cols)
+    Damp = pd.DataFrame(np.nan, index=np.arange(len(WS)), columns=cols)
+    for iMode in np.arange(nModesIDd):
+        ModeIndices = (np.asarray(ModeIDs[iMode,:])-1).astype(int)
+        ModeName= ModeNames[iMode].replace('_',' ')
+        if ModeName.find('(not shown)')>0:
+            f   = np.asarray([m['Fnat'][iiMode]  for m,iiMode in zip(ModeData,ModeIndices) if iiMode>=0 ])
+            d   = np.asarray([m['Damps'][iiMode] for m,iiMode in zip(ModeData,ModeIndices) if iiMode>=0 ])
+            ws  = np.asarray([ws  for ws,iiMode in zip(WS,ModeIndices)   if iiMode>=0 ])
+            rpm = np.asarray([rpm for rpm,iiMode in zip(RPM,ModeIndices) if iiMode>=0 ])
+            UnMapped_Freq = np.concatenate((UnMapped_Freq, f))
+            UnMapped_Damp = np.concatenate((UnMapped_Damp, d))
+            UnMapped_WS   = np.concatenate((UnMapped_WS, ws))
+            UnMapped_RPM  = np.concatenate((UnMapped_RPM, rpm))
+        else:
+            if all(ModeIndices==-1):
+                pass
+            else:
+                f=np.asarray([m['Fnat'] [iiMode] if iiMode>=0 else np.nan for m,iiMode in zip(ModeData,ModeIndices)])
+                d=np.asarray([m['Damps'][iiMode] if iiMode>=0 else np.nan for m,iiMode in zip(ModeData,ModeIndices)])
+                Freq.iloc[:, iMode]=f
+                Damp.iloc[:, iMode]=d
+    M = np.column_stack((UnMapped_WS, UnMapped_RPM, UnMapped_Freq, UnMapped_Damp))
+    UnMapped = pd.DataFrame(data=M, columns=['WS_[m/s]','RotSpeed_[rpm]','Freq_[Hz]','Damping_[-]'])
+    return Freq, Damp, UnMapped
+
+
+def timeit(fun, args, nRep=3):
+    """ Best time of nRep calls """
+    T = []
+    for i in range(nRep):
+        t0 = time.perf_counter()
+        out = fun(*args)
+        T.append(time.perf_counter()-t0)
+    return min(T), out
+
+
+if __name__ == '__main__':
+    nOP    = int(sys.argv[1]) if len(sys.argv)>1 else 500
+    nModes = int(sys.argv[2]) if len(sys.argv)>2 else 60
+    args = syntheticModes(nOP, nModes)
+    # NOTE: "Skipping mode" messages of extractModes are not relevant here
+    stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+    tVec,  (Freq1, Damp1, UnMapped1) = timeit(extractModes, args)
+    sys.stdout = stdout
+    tLoop, (Freq0, Damp0, UnMapped0) = timeit(extractModesLoops, args, nRep=1)
+    pd.testing.assert_frame_equal(Freq0, Freq1)
+    pd.testing.assert_frame_equal(Damp0, Damp1)
+    pd.testing.assert_frame_equal(UnMapped0, UnMapped1)
+    print('Operating points: {:d}, modes: {:d}, unmapped modes: {:d}'.format(nOP, nModes, len(UnMapped0)))
+    print('Loops     : {:8.4f}s'.format(tLoop))
+    print('Vectorized: {:8.4f}s'.format(tVec))
+    print('Speedup   : {:8.1f}x (outputs identical)'.format(tLoop/tVec))
@@ -0,0 +1,860 @@
+"""
+Campbell diagram data from OpenFAST linearization files: MBC, mode identification and tables.
+
+Python port of the MATLAB functions of the Campbell folder:
+   postproLinearization.m, getCampbellData.m, campbell_diagram_data.m, identifyModes.m,
+   campbellData2TXT.m, modesData2CSV.m, getFullFilenamesOP.m, readOperatingPoints.m
+
+The CSV files written are identical in layout to the ones written by the MATLAB scripts,
+and can be read by `postproMBC` (see linearization.py).
+"""
+import os
+import re
+import glob
+import time
+import numpy as np
+import pandas as pd
+
+try:
+    from .mbc3 import fx_mbc3
+except ImportError:
+    from mbc3 import fx_mbc3
+
+
+# --------------------------------------------------------------------------------}
+# --- Operating points
+# --------------------------------------------------------------------------------{
+def readOperatingPoints(filename, delim=','):
+    """
+    Reads an "Operating Point" delimited file to a dictionary, see readOperatingPoints.m
+
+    The header columns are stripped from units and spaces, and standardized, e.g.:
+       WindSpeed_[m/s], RotorSpeed_[rpm], PitchAngle_[deg], GeneratorTorque_[Nm], Filename_[-]
+
+    OUTPUTS:
+      - OP : dictionary with standardized keys:
+            - nOP : number of operating points
+            - rpmSweep: True if no wind speed is provided
+            - Filename: fst filenames for each operating point
+            - {WindSpeed, RotorSpeed}: at least one of the two
+            - {GeneratorTorque, PitchAngle, TowerTopDispFA}: Optional fields
+    """
+    df = pd.read_csv(filename, sep=delim)
+    OP = dict()
+    for col in df.columns:
+        fieldname = col.replace(' ','').replace('_','')
+        fieldname = re.sub(r'(\(.*\))|(\[.*\])', '', fieldname)
+        fieldname = ''.join([c for c in fieldname if c.isalpha()])
+        fieldname_clean = fieldname.strip().lower()
+        values = df[col].values
+        if fieldname_clean in ['wind','windspeed','ws']:
+            OP['WindSpeed'] = values.astype(float)
+        elif fieldname_clean in ['rotorspeed','rotspeed','rpm','omega']:
+            OP['RotorSpeed'] = values.astype(float)
+        elif fieldname_clean in ['generatortorque','gentrq','gentorque']:
+            OP['GeneratorTorque'] = values.astype(float)
+        elif fieldname_clean in ['pitchangle','pitch','bldpitch']:
+            OP['PitchAngle'] = values.astype(float)
+        elif fieldname_clean in ['filename','file','filenames']:
+            OP['Filename'] = [str(f) for f in values]
+        elif fieldname_clean in ['fullpath','fullpaths','path','paths','filepath','filepaths']:
+            OP['Filename'] = [str(f) for f in values]
+        elif fieldname_clean in ['ttdspfa','ttdispfa','towertopdispfa']:
+            OP['TowerTopDispFA'] = values.astype(float)
+        else:
+            OP[fieldname] = values
+
+    # Check that at least the rotational speed or wind speed was provided
+    if 'WindSpeed' not in OP and 'RotorSpeed' not in OP:
+        raise Exception('The operating point file should at least contain the Wind Speed or Rotor Speed column')
+    if 'RotorSpeed' in OP and 'WindSpeed' not in OP:
+        OP['rpmSweep'] = True
+        OP['nOP']      = len(OP['RotorSpeed'])
+    else:
+        OP['rpmSweep'] = False
+        OP['nOP']      = len(OP['WindSpeed'])
+
+    # Generate a standardized filename if "FileName" was not provided
+    if 'Filename' not in OP:
+        OP['Filename'] = defaultFilenames(OP, OP['rpmSweep'])
+    else:
+        # Removing quotes from filenames if any
+        OP['Filename'] = [re.sub('(\')|(")', '', f).strip() for f in OP['Filename']]
+    return OP
+
+
+def defaultFilenames(OP, rpmSweep=None):
+    """ Generate default filenames for linearization based on RotorSpeed (for rpmSweep) or WindSpeed """
+    if rpmSweep is None:
+        rpmSweep = 'WindSpeed' not in OP
+    if rpmSweep:
+        return ['rpm{:05.2f}.fst'.format(rpm) for rpm in OP['RotorSpeed']]
+    else:
+        return ['ws{:04.1f}.fst'.format(ws) for ws in OP['WindSpeed']]
+
+
+def getFullFilenamesOP(simulationFolder, OP_file_or_dict):
+    """
+    Return full names of OpenFAST input files based on a operating point file or dictionary
+
+    INPUTS
+      - simulationFolder:  (ignored if OP['Fullpath'] is present)
+      - OP_file_or_dict: path to a csv file that contains information about the Operating points (see readOperatingPoints)
+                   or dictionary with (depending on simulation) keys: RotorSpeed, WindSpeed, Filename, Fullpath
+    OUTPUTS:
+      - fullpaths: path to FST files
+      - OP: dictionary of operating points
+    """
+    if isinstance(OP_file_or_dict, dict):
+        OP = OP_file_or_dict.copy()
+        if 'Fullpath' not in OP and 'Filename' not in OP:
+            OP['Filename'] = defaultFilenames(OP)
+    else:
+        OP = readOperatingPoints(OP_file_or_dict)
+    if 'Fullpath' in OP:
+        fullpaths = list(OP['Fullpath'])
+    else:
+        fullpaths = [os.path.join(simulationFolder, re.sub('(\')|(")', '', f).strip()).replace('\\','/') for f in OP['Filename']]
+    OP['Fullpath'] = fullpaths
+    OP['nOP']      = len(fullpaths)
+    return fullpaths, OP
+
+
+def _readFASTPar(filename, keys):
+    """ Read the values of a set of keys from an OpenFAST input file (values are the first entry of a line, key the second) """
+    values = dict()
+    with open(filename, 'r', errors='replace') as f:
+        for line in f:
+            sp = line.split()
+            if len(sp)>=2 and sp[1] in keys and sp[1] not in values:
+                v = sp[0].strip('"').strip("'")
+                try:
+                    v = float(v)
+                except ValueError:
+                    if v.lower() in ['true','false']:
+                        v = v.lower()=='true'
+                values[sp[1]] = v
+    missing = [k for k in keys if k not in values]
+    if len(missing)>0:
+        raise Exception('Keys {} not found in file: {}'.format(missing, filename))
+    return values
+
+
+# --------------------------------------------------------------------------------}
+# --- Campbell data
+# --------------------------------------------------------------------------------{
+def getCampbellData(FastFiles, WindSpeed=None, verbose=True, eigOpts=None):
+    """
+    Returns a list of "CampbellData" by Running MBC on FAST linearization files, see getCampbellData.m
+
+    INPUTS:
+     - FastFiles: list of path to ".fst" files (must exist)
+                  Linearization files fill be looked for based on these filenames.
+    OPTIONAL INPUTS:
+     - WindSpeed: array of same size than FastFiles, containing wind speed values
+     - eigOpts: options for a sparse eigenanalysis of the lowest modes only, e.g. {'nModes':20} or {'fmax':5}
+                (see mbc3.eiganalysisSparse). Useful for large models (e.g. with BeamDyn)
+    OUTPUTS:
+     - CampbellData: list of dictionaries (see campbell_diagram_data), with additional keys WindSpeed and CompAero
+    """
+    if WindSpeed is None:
+        WindSpeed = np.full(len(FastFiles), np.nan)
+    CampbellData = []
+    for iOP, fst in enumerate(FastFiles):
+        CD = getCampbellDataOP(fst, WindSpeed[iOP], verbose=verbose, eigOpts=eigOpts)
+        if CD is not None:
+            CampbellData.append(CD)
+    return CampbellData
+
+
+def getCampbellDataOP(fst, WindSpeed=np.nan, verbose=True, eigOpts=None):
+    """
+    Returns the "CampbellData" of one operating point, by running MBC on the linearization files of a ".fst" file.
+    Returns None if no linearization files are found. See getCampbellData.
+    """
+    # -- Reading data from fst file
+    baseDir  = os.path.dirname(fst)
+    FP       = _readFASTPar(fst, ['CompAero','EDFile'])
+    EP       = _readFASTPar(os.path.join(baseDir, FP['EDFile']), ['TipRad','HubRad','TowerHt'])
+    BladeLen = EP['TipRad'] - EP['HubRad']
+    TowerLen = EP['TowerHt']
+
+    # --- Finding *.lin files
+    fullbase = os.path.splitext(fst)[0].replace('\\','/')
+    FileNames = findLinFiles(fullbase, verbose=verbose)
+    if len(FileNames)==0:
+        print('warning::No linearization data for base {}.  Skipping operating point.'.format(os.path.basename(fullbase)))
+        return None
+
+    # --- Find checkpoints files *.chkp
+    # When visualization is active, will write the mode information into a ".postmbc" file for OpenFAST rerun
+    chkpFile = fullbase + '.ModeShapeVTK.chkp'
+    ModesVizName = None
+    if os.path.exists(chkpFile):
+        print('Chkp file:  {}'.format(chkpFile))
+        ModesVizName = fullbase + '.ModeShapeVTK.postmbc'
+
+    # --- Performing MBC on existing lin files
+    mbc_data, _, _ = fx_mbc3(FileNames, verbose=verbose, ModeVizFileName=ModesVizName, eigOpts=eigOpts)
+    CD = campbell_diagram_data(mbc_data, BladeLen, TowerLen)
+    CD['WindSpeed'] = WindSpeed
+    CD['CompAero']  = FP['CompAero']
+    return CD
+
+
+def findLinFiles(fullbase, verbose=True):
+    """ Return the list of contiguous linearization files fullbase.1.lin, fullbase.2.lin, etc. """
+    nPerPeriod = len(glob.glob(fullbase+'.*.lin'))
+    if verbose:
+        print('Lin. files: {}.*.lin ({})'.format(fullbase, nPerPeriod))
+    FileNames = []
+    for iT in range(nPerPeriod):
+        f = '{}.{:d}.lin'.format(fullbase, iT+1)
+        if not os.path.exists(f):
+            print('warning::Linearization data {:d} missing for base {}.'.format(iT+1, os.path.basename(fullbase)))
+            break
+        FileNames.append(f)
+    return FileNames
+
+
+def campbell_diagram_data(mbc_data, BladeLen, TowerLen):
+    """
+    Modes information (sorted by frequencies) and table from MBC data, see campbell_diagram_data.m
+
+    INPUTS:
+      - mbc_data: the output data from fx_mbc3 containing DescStates and eigSol fields (as well as ndof2 & performedTrasformation)
+      - BladeLen and TowerLen are the lengths (in meters) of the blade and the tower, respectively, and are used for scaling the magnitudes of
+        the rows (for consistent units)
+    OUTPUTS:
+      - CampbellData: dictionary with keys NaturalFreq_Hz, DampingRatio, RotSpeed_rpm, WindSpeed, Modes, ModesTable
+    """
+    usePercent = False
+    eigSol = mbc_data['eigSol']
+    ndof   = mbc_data['ndof2'] + mbc_data['ndof1'] # number of translational states
+    nModes = len(eigSol['Evals'])
+
+    # --- change the state descriptions (add collective, sine, cosine, etc) and remove the second order derivatives
+    DescStates = PrettyStateDescriptions(mbc_data['DescStates'], mbc_data['ndof2'], mbc_data['performedTransformation'])
+
+    # --- store indices of max mode for state and to order natural frequencies
+    StatesMaxMode  = np.argmax(eigSol['MagnitudeModes'], axis=1) # find which mode has the maximum value for each state
+    SortedFreqIndx = np.argsort(eigSol['NaturalFreqs_Hz'], kind='stable')
+
+    CampbellData = dict()
+    if BladeLen!=0 or TowerLen!=0:
+        # scale the magnitude of the modes by ScalingFactor (for consistent units)
+        ScalingFactor  = getScaleFactors(DescStates, TowerLen, BladeLen)
+        ModesMagnitude = ScalingFactor[:,None] * eigSol['MagnitudeModes'] # scale the rows
+        CampbellData['ScalingFactor'] = ScalingFactor
+    else:
+        ModesMagnitude = eigSol['MagnitudeModes']
+    if usePercent:
+        scaleCol = np.sum(ModesMagnitude, axis=0)/100 # find the sum of the column, and multiply by 100 (divide here) to get a percentage
+    else:
+        scaleCol = np.max(ModesMagnitude, axis=0) # find the maximum value in the column, so the first element has value of 1
+    ModesMagnitude = ModesMagnitude / scaleCol # scale the columns
+
+    CampbellData['NaturalFreq_Hz'] = eigSol['NaturalFreqs_Hz'][SortedFreqIndx]
+    CampbellData['DampingRatio']   = eigSol['DampRatios'][SortedFreqIndx]
+    CampbellData['RotSpeed_rpm']   = mbc_data['RotSpeed_rpm']
+    if 'WindSpeed' in mbc_data:
+        CampbellData['WindSpeed']  = mbc_data['WindSpeed']
+
+    CampbellData['Modes'] = []
+    for i in range(nModes):
+        iSorted = SortedFreqIndx[i]
+        mode = dict()
+        mode['NaturalFreq_Hz'] = eigSol['NaturalFreqs_Hz'][iSorted]
+        mode['DampedFreq_Hz']  = eigSol['DampedFreqs_Hz'][iSorted]
+        mode['DampingRatio']   = eigSol['DampRatios'][iSorted]
+
+        sort_state = np.argsort(-ModesMagnitude[:,iSorted], kind='stable')
+        mode['DescStates']     = [DescStates[j] for j in sort_state]
+        mode['MagnitudePhase'] = ModesMagnitude[sort_state, iSorted]
+        Phase = eigSol['PhaseModes_deg'][sort_state, iSorted]
+        # if the phase is more than +/- 90 degrees different than the first
+        # one (whose value == 1 or is the largest %), we'll stick a negative value on the magnitude:
+        Phase = np.mod(Phase, 360)
+        PhaseDiff = np.mod(Phase - Phase[0], 360) # difference in range [0, 360)
+        PhaseDiff[PhaseDiff>180] -= 360  # move to range (-180, 180]
+        if not usePercent:
+            PhaseIndx = PhaseDiff > 90
+            mode['MagnitudePhase'][PhaseIndx] *= -1
+            PhaseDiff[PhaseIndx] -= 180
+            PhaseIndx = PhaseDiff <= -90
+            mode['MagnitudePhase'][PhaseIndx] *= -1
+            PhaseDiff[PhaseIndx] += 180
+        mode['PhaseDiff'] = PhaseDiff
+        mode['StateHasMaxAtThisMode'] = (StatesMaxMode == iSorted)[sort_state]
+        CampbellData['Modes'].append(mode)
+
+    # --- Table of modes
+    nColsPerMode = 5
+    CampbellData['nColsPerMode'] = nColsPerMode
+    T = [[None]*(nColsPerMode*nModes) for _ in range(ndof+5)]
+    for i, mode in enumerate(CampbellData['Modes']):
+        c = i*nColsPerMode
+        T[0][c] = 'Mode number:'                        ; T[0][c+1] = i+1
+        T[1][c] = 'Natural (undamped) frequency (Hz):'  ; T[1][c+1] = mode['NaturalFreq_Hz']
+        T[2][c] = 'Damped frequency (Hz):'              ; T[2][c+1] = mode['DampedFreq_Hz']
+        T[3][c] = 'Damping ratio (-):'                  ; T[3][c+1] = mode['DampingRatio']
+        T[4][c]   = 'Mode {:d} state description'.format(i+1)
+        T[4][c+1] = 'State has max at mode {:d}'.format(i+1)
+        if usePercent:
+            T[4][c+2] = 'Mode {:d} contribution (%)'.format(i+1)
+        else:
+            T[4][c+2] = 'Mode {:d} signed magnitude'.format(i+1)
+        T[4][c+3] = 'Mode {:d} phase (deg)'.format(i+1)
+        for j in range(ndof):
+            T[5+j][c]   = mode['DescStates'][j]
+            T[5+j][c+1] = bool(mode['StateHasMaxAtThisMode'][j])
+            T[5+j][c+2] = mode['MagnitudePhase'][j]
+            T[5+j][c+3] = mode['PhaseDiff'][j]
+    CampbellData['ModesTable'] = T
+    return CampbellData
+
+
+def PrettyStateDescriptions(DescStates, ndof2, performedTransformation):
+    """ Keep q2 and q1 states descriptions, replace blade numbers by collective/cosine/sine, and remove parenthesis """
+    DescStates = list(DescStates[:ndof2]) + list(DescStates[2*ndof2:])
+    if performedTransformation:
+        Rep = [('BD_1','Blade collective'), ('BD_2','Blade cosine'), ('BD_3','Blade sine'),
+               ('blade 1','blade collective'), ('blade 2','blade cosine'), ('blade 3','blade sine'),
+               ('Blade1','Blade collective '), ('Blade2','Blade cosine '), ('Blade3','Blade sine '),
+               ('PitchBearing1','Pitch bearing collective '), ('PitchBearing2','Pitch bearing cosine '), ('PitchBearing3','Pitch bearing sine ')]
+        StateDesc = []
+        for s in DescStates:
+            for old, new in Rep:
+                s = s.replace(old, new)
+            StateDesc.append(s)
+    else:
+        StateDesc = list(DescStates)
+    for i, s in enumerate(StateDesc):
+        First = s.split('(')
+        Last  = s.split(')')
+        if len(First[0])!=len(s) and len(Last[-1])!=len(s):
+            StateDesc[i] = First[0].strip() + Last[-1]
+    return StateDesc
+
+
+def getScaleFactors(DescStates, TowerLen, BladeLen):
+    """ Scaling factors for tower and blade translational dofs """
+    ScalingFactor = np.ones(len(DescStates))
+    for i, s in enumerate(DescStates):
+        # look for tower translational dofs:
+        if s.find('tower')>=0 or s.find('Tower')>=0:
+            ScalingFactor[i] = 1/TowerLen
+        # look for blade dofs:
+        elif s.find('blade')>=0 or s.find('Blade')>=0:
+            if s.find('rotational')<0: # make sure this isn't a rotational dof from BeamDyn
+                ScalingFactor[i] = 1/BladeLen
+    return ScalingFactor
+
+
+# --------------------------------------------------------------------------------}
+# --- Mode identification
+# --------------------------------------------------------------------------------{
+modesDesc = [
+    ['Generator DOF (not shown)'     , 'ED Variable speed generator DOF, rad'],
+    ['1st Tower FA'                  , 'ED 1st tower fore-aft bending mode DOF, m'],
+    ['1st Tower SS'                  , 'ED 1st tower side-to-side bending mode DOF, m'],
+    ['1st Blade Flap (Regressive)'   , 'ED 1st flapwise bending-mode DOF of blade (sine|cosine), m',
+                                       r'Blade (sine|cosine) finite element node \d rotational displacement in Y, rad'],
+    ['1st Blade Flap (Collective)'   , 'ED 1st flapwise bending-mode DOF of blade collective, m',
+                                       r'Blade collective finite element node \d rotational displacement in Y, rad'],
+    ['1st Blade Flap (Progressive)'  , 'ED 1st flapwise bending-mode DOF of blade (sine|cosine), m'],
+    ['1st Blade Edge (Regressive)'   , 'ED 1st edgewise bending-mode DOF of blade (sine|cosine), m',
+                                       r'Blade (sine|cosine) finite element node \d rotational displacement in X, rad'],
+    ['1st Blade Edge (Progressive)'  , 'ED 1st edgewise bending-mode DOF of blade (sine|cosine), m'],
+    ['1st Drivetrain Torsion'        , 'ED Drivetrain rotational-flexibility DOF, rad'],
+    ['2nd Tower FA'                  , 'ED 2nd tower fore-aft bending mode DOF, m'],
+    ['2nd Tower SS'                  , 'ED 2nd tower side-to-side bending mode DOF, m'],
+    ['2nd Blade Flap (Regressive)'   , 'ED 2nd flapwise bending-mode DOF of blade (sine|cosine), m'],
+    ['2nd Blade Flap (Collective)'   , 'ED 2nd flapwise bending-mode DOF of blade collective, m',
+                                       r'Blade collective finite element node \d rotational displacement in Y, rad'],
+    ['2nd Blade Flap (Progressive)'  , 'ED 2nd flapwise bending-mode DOF of blade (sine|cosine), m'],
+    ['Nacelle Yaw (not shown)'       , 'ED Nacelle yaw DOF, rad'],
+]
+
+
+def identifyModes(CampbellData):
+    """
+    Identify modes from CampbellData and creates a ModesData dictionary, see identifyModes.m
+
+    INPUTS:
+      - CampbellData: list of CampbellData (one per operating point), as returned for instance by getCampbellData
+    OUTPUTS:
+      - ModesData: dictionary with keys: modeID_table, modeID_name, opTable, ModesTable (one per OP), ModesTable_names (one per OP)
+    """
+    nModes = len(modesDesc)
+    nRuns  = len(CampbellData)
+    modeID_table = np.zeros((nModes, nRuns), dtype=int)
+    for i, CD in enumerate(CampbellData):
+        Modes = CD['Modes']
+        modesIdentified = np.zeros(len(Modes), dtype=bool)
+        for modeID in range(1, nModes): # list of modes we want to identify
+            if len(modesDesc[modeID][1].strip())==0:
+                continue
+            found     = False
+            tryNumber = 0
+            while not found and tryNumber<=2:
+                m = -1
+                while not found and m < len(Modes)-1:
+                    m += 1
+                    if modesIdentified[m] or Modes[m]['NaturalFreq_Hz']<0.1: # already identified this mode
+                        continue
+                    if tryNumber==0:
+                        maxDesc = [d for d,b in zip(Modes[m]['DescStates'], Modes[m]['StateHasMaxAtThisMode']) if b]
+                        if len(maxDesc)==0:
+                            tryNumber += 1
+                    if tryNumber>0:
+                        if tryNumber < len(Modes[m]['DescStates']):
+                            maxDesc = [d for d,b in zip(Modes[m]['DescStates'], Modes[m]['StateHasMaxAtThisMode']) if not b]
+                        else:
+                            maxDesc = []
+                    for desc in maxDesc:
+                        if any([re.search(exp, desc) is not None for exp in modesDesc[modeID][1:]]):
+                            modesIdentified[m]     = True
+                            modeID_table[modeID,i] = m+1
+                            found = True
+                            break
+                tryNumber += 1
+
+    # --- Creating tables to be written to file
+    idTable, modeID_name, ModesTable_names = createIDTable(CampbellData, modeID_table, modesDesc)
+    opTable = createOPTable(CampbellData)
+    ModesData = dict()
+    ModesData['ModesTable']       = [CD['ModesTable'] for CD in CampbellData]
+    ModesData['ModesTable_names'] = ModesTable_names
+    ModesData['modeID_table']     = idTable
+    ModesData['modeID_name']      = modeID_name
+    ModesData['opTable']          = opTable
+    return ModesData
+
+
+def createIDTable(CampbellData, modeID_table, modesDesc):
+    """ Create a table (list of lists) that contains the mode identification: Mode Names and IDs for each OP """
+    nPoints = len(CampbellData)
+    ModesTable_names = [None]*nPoints
+    Table = [[None]*(nPoints+1) for _ in range(len(modesDesc)+2)]
+    Table[0][0] = 'Mode Number Table'
+    iRef = max(int(np.floor(nPoints/2+0.5))-1, 0) # We'll use that file as a reference
+    if CampbellData[iRef]['CompAero'] > 0: # NOTE: using ref file to look at CompAero
+        Table[1][0] = 'Wind Speed (mps)'
+        for i, CD in enumerate(CampbellData):
+            Table[1][i+1] = CD['WindSpeed']
+            ModesTable_names[i] = '{:g} mps'.format(CD['WindSpeed'])
+        idSheetName = 'WS_ModesID'
+    else:
+        Table[1][0] = 'Rotor Speed (rpm)'
+        for i, CD in enumerate(CampbellData):
+            Table[1][i+1] = CD['RotSpeed_rpm']
+            ModesTable_names[i] = '{:g} RPM'.format(CD['RotSpeed_rpm'])
+        idSheetName = 'ModesID'
+    for i, MD in enumerate(modesDesc):
+        Table[i+2][0] = MD[0]
+        Table[i+2][1:] = list(modeID_table[i,:])
+    return Table, idSheetName, ModesTable_names
+
+
+def createOPTable(CampbellData):
+    """ Create a table (list of lists) that contains the operating points """
+    opTable = [['Operating Points'], ['Wind Speed (mps)'], ['Rotor Speed (rpm)']]
+    for CD in CampbellData:
+        opTable[0].append(None)
+        opTable[1].append(CD['WindSpeed'])
+        opTable[2].append(CD['RotSpeed_rpm'])
+    return opTable
+
+
+def extractModes(ModeData, ModeIDs, ModeNames, WS, RPM):
+    """ 
+    Sort the frequencies and damping of each operating point into identified and unidentified modes (see linearization.postproMBC)
+    The frequencies and damping of all operating points are stored in 2D arrays (nOP x nModesMax), padded with NaN,
+    and the modes are extracted with masks and fancy indexing.
+
+    INPUTS:
+      - ModeData: list of dictionaries for each OP, with keys 'Fnat' and 'Damps'
+      - ModeIDs: array (nModesIDd x nOP) of mode indices (1-based, 0 when mode is not found at a given OP)
+      - ModeNames: array of nModesIDd mode names
+      - WS, RPM: wind speed and rotor speed for each OP
+    OUTPUTS:
+        - Freq, Damp, UnMapped: see linearization.postproMBC
+    """
+    nOP       = len(ModeData)
+    nModesIDd = len(ModeNames)
+    WS        = np.asarray(WS)
+    RPM       = np.asarray(RPM)
+    ModeIDs   = np.asarray(ModeIDs).reshape(nModesIDd, nOP)
+    Indices   = (ModeIDs-1).astype(int)                  # nModesIDd x nOP, -1 for missing modes
+
+    # --- Frequencies and damping of all OPs into NaN-padded arrays
+    nModesOP  = np.array([len(m['Fnat']) for m in ModeData], dtype=int)
+    nModesMax = np.max(nModesOP) if nOP>0 else 0
+    F = np.full((nOP, nModesMax), np.nan)
+    D = np.full((nOP, nModesMax), np.nan)
+    for iOP, m in enumerate(ModeData):
+        F[iOP, :nModesOP[iOP]] = m['Fnat']
+        D[iOP, :nModesOP[iOP]] = m['Damps']
+    iCol = np.arange(nModesMax)[None,:]
+
+    # --- Unidentified modes, before "nModes" (somehow sometimes we have 15 modes IDd but only 14 in the ModeData..)
+    nModes = np.minimum(nModesOP, nModesIDd)
+    Mapped = np.zeros((nOP, nModesMax), dtype=bool)
+    iOPs   = np.tile(np.arange(nOP), (nModesIDd,1))
+    bValid = (Indices>=0) & (Indices<nModesMax)
+    Mapped[iOPs[bValid], Indices[bValid]] = True
+    iOP1, iMode1 = np.nonzero((iCol < nModes[:,None]) & ~Mapped)
+    # --- Unidentified modes, beyond "nModes"
+    iOP2, iMode2 = np.nonzero((iCol >= nModesIDd) & (iCol < nModesOP[:,None]))
+    # --- Identified modes that are "not shown"
+    bNotShown = np.array([n.replace('_',' ').find('(not shown)')>0 for n in ModeNames], dtype=bool).reshape(-1)
+    INotShown = Indices[bNotShown,:]
+    iOP3      = iOPs[bNotShown,:][INotShown>=0]
+    iMode3    = INotShown[INotShown>=0]
+
+    iOPu   = np.concatenate((iOP1 , iOP2 , iOP3 )).astype(int)
+    iModeu = np.concatenate((iMode1, iMode2, iMode3)).astype(int)
+    UnMapped_WS   = np.concatenate(([], np.asarray(WS[iOPu].tolist())))  # NOTE: WS and RPM may be of object type
+    UnMapped_RPM  = np.concatenate(([], np.asarray(RPM[iOPu].tolist())))
+    UnMapped_Freq = np.concatenate(([], F[iOPu, iModeu]))
+    UnMapped_Damp = np.concatenate(([], D[iOPu, iModeu]))
+
+    # --- Put identified modes into a more convenient form
+    cols=[ m.split('-')[0].strip().replace(' ','_') for m in ModeNames]
+    cols=[v + str(cols[:i].count(v) + 1) if cols.count(v) > 1 else v for i, v in enumerate(cols)]
+    bEmpty = np.all(Indices==-1, axis=1) & ~bNotShown
+    for iMode in np.where(bEmpty)[0]:
+        print('Skipping mode number ',iMode)
+    bShown = ~bNotShown & ~bEmpty
+    IShown = np.where(Indices>=0, Indices, 0)
+    Fm = np.where(Indices>=0, F[iOPs, IShown], np.nan)   # nModesIDd x nOP
+    Dm = np.where(Indices>=0, D[iOPs, IShown], np.nan)
+    Fm[~bShown,:] = np.nan
+    Dm[~bShown,:] = np.nan
+    Freq = pd.DataFrame(Fm.T, index=np.arange(len(WS)), columns=cols)
+    Damp = pd.DataFrame(Dm.T, index=np.arange(len(WS)), columns=cols)
+    #  Removing modes that are full nan (not_shown ones)
+    # NOTE: damgerous since OP is not part of it anymore
+    # Freq.dropna(how='all',axis=0,inplace=True)
+    # Freq.dropna(how='all',axis=1,inplace=True)
+    # Damp.dropna(how='all',axis=0,inplace=True)
+    # Damp.dropna(how='all',axis=1,inplace=True)
+
+    # --- UnMapped modes into a dataframe
+    M = np.column_stack((UnMapped_WS, UnMapped_RPM, UnMapped_Freq, UnMapped_Damp))
+    UnMapped = pd.DataFrame(data=M, columns=['WS_[m/s]','RotSpeed_[rpm]','Freq_[Hz]','Damping_[-]'])
+    return Freq, Damp, UnMapped
+
+
+# --------------------------------------------------------------------------------}
+# --- Writers
+# --------------------------------------------------------------------------------{
+def cellarray2csv(csvName, M):
+    """ Write a table (list of lists) to a csv file, with the same format as cellarray2csv.m """
+    def fmt(v):
+        if v is None:
+            return ''
+        elif isinstance(v, (bool, np.bool_)):
+            return '{:d}'.format(v)
+        elif isinstance(v, str):
+            return v.replace(',',' ') # no matter what, we don't want commas in a csv file
+        v = float(v)
+        if np.isnan(v):
+            return 'NaN'
+        elif np.isinf(v):
+            return 'Inf' if v>0 else '-Inf'
+        return '{:f}'.format(v)
+    with open(csvName, 'w') as f:
+        for row in M:
+            f.write(','.join([fmt(v) for v in row])+'\n')
+
+
+def modesData2CSV(BaseName, ModesData, suffix=''):
+    """
+    Write summary of Campbell data and modes identification to several CSV files
+    The files generated will be:
+       - BaseName + '_ModesID.csv'
+       - BaseName + '_OP.csv'
+       - BaseName + '_PointXX.csv' for each operating point where XX is the index.
+    """
+    filenames = ['{}_ModesID{}.csv'.format(BaseName, suffix), '{}_OP{}.csv'.format(BaseName, suffix)]
+    cellarray2csv(filenames[0], ModesData['modeID_table'])
+    cellarray2csv(filenames[1], ModesData['opTable'])
+    for iOP, T in enumerate(ModesData['ModesTable']):
+        filenames.append('{}_Point{:02d}{}.csv'.format(BaseName, iOP+1, suffix))
+        cellarray2csv(filenames[-1], T)
+    return filenames
+
+
+def modesData2NPZ(BaseName, ModesData, suffix=''):
+    """
+    Write Campbell data and modes identification to a single binary file: BaseName + suffix + '.npz'
+    This file contains the same information as the files written by modesData2CSV, see readCampbellNPZ for the content.
+    Values are stored with full precision (the csv files have 6 decimals).
+    """
+    opTable = ModesData['opTable']
+    idTable = ModesData['modeID_table']
+    Tables  = ModesData['ModesTable']
+    nOP     = len(Tables)
+    num = lambda v: np.nan if v is None else float(v)
+    # --- Dimensions
+    nc      = 5 # number of columns per mode, see campbell_diagram_data
+    nModes  = np.array([len(T[0])//nc for T in Tables], dtype=int)
+    nStates = np.array([len(T)-5 for T in Tables], dtype=int)
+    nModesMax  = np.max(nModes)  if nOP>0 else 0
+    nStatesMax = np.max(nStates) if nOP>0 else 0
+    # --- Frequencies, damping and mode shapes (padded with NaN)
+    d = dict()
+    d['WS']      = np.array([num(v) for v in opTable[1][1:]], dtype=float)
+    d['RPM']     = np.array([num(v) for v in opTable[2][1:]], dtype=float)
+    d['OPNames'] = np.array(ModesData['ModesTable_names'], dtype=str)
+    d['nModes']  = nModes
+    for k in ['Fnat','Fdmp','Damps']:
+        d[k] = np.full((nOP, nModesMax), np.nan)
+    d['DescStates']  = np.full((nOP, nModesMax, nStatesMax), '', dtype=object)
+    d['StateHasMax'] = np.zeros((nOP, nModesMax, nStatesMax), dtype=bool)
+    d['Magnitude']   = np.full((nOP, nModesMax, nStatesMax), np.nan)
+    d['Phase']       = np.full((nOP, nModesMax, nStatesMax), np.nan)
+    for iOP, T in enumerate(Tables):
+        for i in range(nModes[iOP]):
+            c = i*nc
+            d['Fnat'] [iOP,i] = num(T[1][c+1])
+            d['Fdmp'] [iOP,i] = num(T[2][c+1])
+            d['Damps'][iOP,i] = num(T[3][c+1])
+            for j in range(nStates[iOP]):
+                d['DescStates'] [iOP,i,j] = T[5+j][c]
+                d['StateHasMax'][iOP,i,j] = bool(T[5+j][c+1])
+                d['Magnitude']  [iOP,i,j] = num(T[5+j][c+2])
+                d['Phase']      [iOP,i,j] = num(T[5+j][c+3])
+    d['DescStates'] = d['DescStates'].astype(str)
+    # --- Mode identification
+    d['modeID_name'] = np.array(ModesData['modeID_name'], dtype=str)
+    d['ModeNames']   = np.array([row[0] if row[0] is not None else '' for row in idTable[2:]], dtype=str)
+    d['ModeIDs']     = np.array([[int(v) for v in row[1:]] for row in idTable[2:]], dtype=int).reshape(-1, nOP)
+    filename = BaseName + suffix + '.npz'
+    np.savez(filename, **d)
+    return filename
+
+
+def readCampbellNPZ(filename):
+    """
+    Read a file written by modesData2NPZ
+
+    OUTPUTS:
+      - dictionary with keys:
+         - WS, RPM: wind speed and rotor speed, array of size nOP
+         - OPNames: name of each OP (e.g. '8 mps')
+         - nModes: number of modes for each OP
+         - Fnat, Fdmp, Damps: natural frequency, damped frequency and damping ratio, arrays of shape nOP x nModesMax
+         - DescStates, StateHasMax, Magnitude, Phase: mode shapes, arrays of shape nOP x nModesMax x nStatesMax
+              (states are sorted by magnitude for each mode, as in the Campbell_PointXX.csv files)
+         - ModeNames: names of the modes to identify (nModesIDd)
+         - ModeIDs: index (1-based) of each identified mode for each OP (0 if not found), array of shape nModesIDd x nOP
+         - modeID_name: 'WS_ModesID' or 'ModesID'
+    """
+    with np.load(filename) as npz:
+        d = {k:npz[k] for k in npz.files}
+    d['modeID_name'] = str(d['modeID_name'])
+    return d
+
+
+def replaceModeDescription(s):
+    """ Perform replacements to shorten mode description """
+    Rep = [('First time derivative of','d/dt of'), ('fore-aft bending mode DOF, m','FA'), ('side-to-side bending mode DOF, m','SS'),
+           ('bending-mode DOF of blade ',''), (' rotational-flexibility DOF, rad','-ROT'), ('rotational displacement in ','rot'),
+           ('Drivetrain','DT'), ('translational displacement in ','trans'), (', rad',''), (', m',''), ('finite element node ','N'),
+           ('cosine','cos'), ('sine','sin'), ('collective','coll.'), ('Blade','Bld'), ('rotZ','TORS-R'), ('transX','FLAP-D'),
+           ('transY','EDGE-D'), ('rotX','EDGE-R'), ('rotY','FLAP-R'), ('flapwise','FLAP'), ('edgewise','EDGE'), (',','|')]
+    for old, new in Rep:
+        s = s.replace(old, new)
+    return s
+
+
+def campbellData2TXT(TxtFilename, CampbellData, nFreqOut=20):
+    """ Write summary of Campbell data (prior to mode identification) to a text file, see campbellData2TXT.m """
+    def ShortModeDescr(mode):
+        Desc = [d for d,b in zip(mode['DescStates'], mode['StateHasMaxAtThisMode']) if b]
+        DescCat   = ''
+        DescCatED = ''
+        if len(Desc)==0:
+            DescCatED = 'NoMax -'
+            Desc = mode['DescStates'][:8]
+        nBD = 0
+        for d in Desc:
+            s = replaceModeDescription(d)
+            if d[:2]=='BD':
+                nBD += 1
+            elif d[:2]=='ED':
+                DescCatED = s + ' - ' + DescCatED
+            else:
+                DescCat = DescCat + ' - ' + s
+        DescCat = DescCatED + DescCat
+        if nBD>0:
+            DescCat = 'BD{:d}/{:d} {}'.format(nBD, int(np.sum(mode['StateHasMaxAtThisMode'])), DescCat)
+        return DescCat
+
+    with open(TxtFilename, 'w') as f:
+        for iOP, CD in enumerate(CampbellData):
+            f.write('------------------------------------------------------------------------\n')
+            f.write('--- OP {:d} - WS {:.1f} - RPM {:.2f} \n'.format(iOP+1, CD.get('WindSpeed', np.nan), CD.get('RotSpeed_rpm', np.nan)))
+            f.write('------------------------------------------------------------------------\n')
+            for i in range(nFreqOut):
+                if i < len(CD['Modes']):
+                    f.write('{:02d} ; {:8.3f} ; {:7.4f} ; {}\n'.format(i+1, CD['NaturalFreq_Hz'][i], CD['DampingRatio'][i], ShortModeDescr(CD['Modes'][i])))
+                else:
+                    f.write('{:02d} ; {:8.3f} ; {:7.4f} ; \n'.format(i+1, 0, 0))
+
+
+def postproLinearization(folder, OP_file_or_dict, outputFormat='csv', prefix='', suffix='', verbose=True, eigOpts=None):
+    """
+    Postprocess a set of linearization outputs, where the operating points are defined in a file, see postproLinearization.m
+    Performs the MBC, the mode identification, and writes a set of csv files:
+        folder + prefix + 'Campbell_OP.csv'
+        folder + prefix + 'Campbell_ModesID.csv'
+        folder + prefix + 'Campbell_PointsXX.csv'
+    and a single binary file with the same content (see modesData2NPZ):
+        folder + prefix + 'Campbell.npz'
+
+    INPUTS:
+      - folder: path to a folder where .lin and .fst files may be found
+      - OP_file_or_dict: path to a csv file that contains information about the Operating points (see readOperatingPoints)
+                   OR dictionary with (depending on simulation) keys: RotorSpeed, WindSpeed, Filename, Fullpath
+    OPTIONAL INPUTS:
+      - outputFormat : 'csv' (csv files and npz file), 'npz' or 'none'
+      - eigOpts: options for a sparse eigenanalysis of the lowest modes only, see getCampbellData
+    OUTPUTS:
+      - ModesData: see identifyModes
+      - outputFiles: list of files written
+    """
+    outbase = os.path.join(folder, prefix+'Campbell').replace('\\','/')
+    # --- Extract operating points to know FAST filenames
+    FastFiles, OP = getFullFilenamesOP(folder, OP_file_or_dict)
+    print('Points:     {:d} operating points'.format(OP['nOP']))
+
+    # --- Get Campbell data (perform MBC on lin files)
+    CampbellData = getCampbellData(FastFiles, OP.get('WindSpeed', None), verbose=verbose, eigOpts=eigOpts)
+    if len(CampbellData)==0:
+        raise Exception('No linearization data found in folder: {}'.format(folder))
+
+    # --- Mode identification and outputs
+    return writeCampbellData(outbase, CampbellData, outputFormat=outputFormat, suffix=suffix)
+
+
+def writeCampbellData(outbase, CampbellData, outputFormat='csv', suffix='', verbose=True):
+    """
+    Identify the modes of a list of CampbellData and write the summary file and the csv tables (see postproLinearization)
+
+    INPUTS:
+      - outbase: base name of output files, e.g. folder + prefix + 'Campbell'
+      - CampbellData: list of dictionaries, see getCampbellData
+    OPTIONAL INPUTS:
+      - outputFormat : 'csv' (csv files and npz file), 'npz' (see modesData2NPZ) or 'none'
+    OUTPUTS:
+      - ModesData: see identifyModes
+      - outputFiles: list of files written
+    """
+    # --- Write summary file
+    if outputFormat.lower()!='none':
+        summaryFile = outbase + '_Summary' + suffix + '.txt'
+        campbellData2TXT(summaryFile, CampbellData)
+        if verbose:
+            print('Written:    {}'.format(summaryFile))
+
+    # --- Match mode names / identify modes
+    ModesData = identifyModes(CampbellData)
+
+    # --- Write tables to csv and/or npz
+    if outputFormat.lower()=='csv':
+        outputFiles = modesData2CSV(outbase, ModesData, suffix)
+        outputFiles.append(modesData2NPZ(outbase, ModesData, suffix))
+        if verbose:
+            print('Written:    {}'.format(outbase+'*'+suffix+'.csv'))
+    elif outputFormat.lower()=='npz':
+        outputFiles = [modesData2NPZ(outbase, ModesData, suffix)]
+        if verbose:
+            print('Written:    {}'.format(outputFiles[0]))
+    elif outputFormat.lower()=='none':
+        outputFiles = []
+    else:
+        raise Exception('Unsupported outputFormat {}'.format(outputFormat))
+    return ModesData, outputFiles
+
+
+# --------------------------------------------------------------------------------}
+# --- Streaming post-processing
+# --------------------------------------------------------------------------------{
+class CampbellDataStream():
+    """
+    Post-process operating points one at a time, as soon as their linearization files are available
+    (e.g. when the simulation of an operating point finishes, see fastJobs.runFASTJobs and linearization.campbell).
+
+    The mode identification and the tables are written once, by finalize(). Optionally (writePartial), the tables of
+    the operating points processed so far (sorted as in the operating point file) are also written during the sweep,
+    at most every `partialInterval` seconds, such that a partial Campbell diagram is available. Each partial write
+    identifies the modes of all the points processed so far, so it should not be done after every point.
+
+    Example:
+        stream = CampbellDataStream(folder, OP_file_or_dict)
+        for fst in stream.FastFiles:
+            stream.add(fst)   # typically called when the simulation of fst is done
+        ModesData, outputFiles = stream.finalize()
+    """
+    def __init__(self, folder, OP_file_or_dict, outputFormat='csv', prefix='', suffix='', writePartial=False, partialInterval=60, verbose=True, eigOpts=None):
+        """
+        INPUTS: see postproLinearization
+          - writePartial: if True, the tables of the points processed so far are written during the sweep
+          - partialInterval: minimum time [s] between two partial writes
+        """
+        self.outbase  = os.path.join(folder, prefix+'Campbell').replace('\\','/')
+        self.folder   = folder
+        self.outputFormat = outputFormat
+        self.suffix   = suffix
+        self.writePartial = writePartial
+        self.partialInterval = partialInterval
+        self._lastWrite = time.time()
+        self.verbose  = verbose
+        self.eigOpts  = eigOpts
+        self.FastFiles, self.OP = getFullFilenamesOP(folder, OP_file_or_dict)
+        self.WindSpeed = self.OP.get('WindSpeed', np.full(len(self.FastFiles), np.nan))
+        self._index   = dict([(os.path.normpath(f), i) for i,f in enumerate(self.FastFiles)])
+        self.CampbellData = dict() # key: index of operating point
+        self.ModesData   = None
+        self.outputFiles = []
+
+    def add(self, fst, *args):
+        """ Perform the MBC of the operating point corresponding to a fst file, and update the tables.
+        Additional arguments are ignored, such that this method can be used as a callback of runFASTJobs """
+        iOP = self._index.get(os.path.normpath(fst), None)
+        if iOP is None:
+            print('warning::{} is not part of the operating points. Skipping.'.format(fst))
+            return
+        CD = getCampbellDataOP(self.FastFiles[iOP], self.WindSpeed[iOP], verbose=self.verbose, eigOpts=self.eigOpts)
+        if CD is None:
+            return
+        self.CampbellData[iOP] = CD
+        if self.verbose:
+            print('Points:     {:d}/{:d} operating points processed'.format(len(self.CampbellData), len(self.FastFiles)))
+        if self.writePartial and time.time()-self._lastWrite>=self.partialInterval:
+            self.write(verbose=False)
+
+    def write(self, verbose=None):
+        """ Identify modes and write the tables of the operating points processed so far """
+        if len(self.CampbellData)==0:
+            return None, []
+        verbose = self.verbose if verbose is None else verbose
+        CampbellData = [self.CampbellData[i] for i in sorted(self.CampbellData.keys())]
+        self.ModesData, self.outputFiles = writeCampbellData(self.outbase, CampbellData, outputFormat=self.outputFormat, suffix=self.suffix, verbose=verbose)
+        self._lastWrite = time.time()
+        return self.ModesData, self.outputFiles
+
+    def finalize(self):
+        """ Process the operating points that were not added yet (e.g. simulations that were up to date), and write the final tables """
+        for iOP, fst in enumerate(self.FastFiles):
+            if iOP not in self.CampbellData:
+                CD = getCampbellDataOP(fst, self.WindSpeed[iOP], verbose=self.verbose, eigOpts=self.eigOpts)
+                if CD is not None:
+                    self.CampbellData[iOP] = CD
+        if len(self.CampbellData)==0:
+            raise Exception('No linearization data found in folder: {}'.format(self.folder))
+        return self.write()
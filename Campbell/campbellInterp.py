@@ -0,0 +1,125 @@
+"""
+Interpolated Campbell diagrams from the azimuth-averaged MBC state matrices of a few operating points
+
+The averaged MBC state matrices of the linearized operating points (see modeTracking.getAveragedMBC) are interpolated
+in the operating point variable (wind speed or rotor speed), entry by entry. The states are ordered the same way at
+all operating points (same model, same MBC ordering), such that the interpolated matrices are consistent.
+The interpolated matrices are solved in batch (see modeTracking.batchEiganalysis), and the modes are tracked along the
+dense set of points (see modeTracking.trackModes), giving smooth Campbell curves without extra simulations.
+
+The accuracy of the interpolation is estimated by leaving out each interior operating point in turn, and comparing the
+modes interpolated from the other points to the modes of the linearization (see holdOutError).
+
+Example:
+    OP, Freq, Damp, Track = interpolatedCampbell('Lin/', 'Lin/Cases.csv', nPoints=200)
+    Err = holdOutError('Lin/', 'Lin/Cases.csv')
+"""
+import numpy as np
+import pandas as pd
+try:
+    from scipy.interpolate import CubicSpline
+except ImportError:
+    CubicSpline = None
+
+try:
+    from .modeTracking import getAveragedMBC, batchEiganalysis, trackModes, trackNames, MAC, _assign
+except ImportError:
+    from modeTracking import getAveragedMBC, batchEiganalysis, trackModes, trackNames, MAC, _assign
+
+
+def interpolateA(x, A, xi, kind='cubic'):
+    """
+    Interpolate a stack of state matrices
+
+    INPUTS:
+      - x: operating point variable (e.g. wind speed) of the matrices, strictly increasing
+      - A: nOP x ns x ns, state matrices
+      - xi: values where the matrices are interpolated (extrapolation is not performed, values are clipped to x)
+      - kind: 'linear' or 'cubic' (cubic spline, requires scipy and at least 3 points, otherwise linear)
+    OUTPUTS:
+      - Ai: len(xi) x ns x ns, interpolated matrices
+    """
+    x  = np.asarray(x, dtype=float)
+    xi = np.clip(np.asarray(xi, dtype=float), x[0], x[-1])
+    if np.any(np.diff(x)<=0):
+        raise Exception('The operating point variable should be strictly increasing for the interpolation.')
+    if kind=='cubic' and CubicSpline is not None and len(x)>=3:
+        return CubicSpline(x, A, axis=0)(xi)
+    # Linear interpolation of all the entries at once
+    i = np.clip(np.searchsorted(x, xi, side='right')-1, 0, len(x)-2)
+    w = ((xi-x[i])/(x[i+1]-x[i]))[:,None,None]
+    return (1-w)*A[i] + w*A[i+1]
+
+
+def _sortedMBC(folder, OP_file_or_dict, x='WS', verbose=False):
+    """ Averaged MBC matrices (see getAveragedMBC), sorted by the operating point variable x ('WS' or 'RPM') """
+    d = getAveragedMBC(folder, OP_file_or_dict, verbose=verbose)
+    I = np.argsort(d[x], kind='stable')
+    for k in ['AvgA','WS','RPM']:
+        d[k] = d[k][I]
+    return d
+
+
+def interpolatedCampbell(folder, OP_file_or_dict, nPoints=200, x='WS', kind='cubic', freqWeight=0.0, verbose=False):
+    """
+    Campbell diagram data at nPoints operating points, interpolated from the averaged MBC matrices
+
+    INPUTS:
+      - folder, OP_file_or_dict: see postproLinearization
+      - nPoints: number of interpolated operating points (equally spaced)
+      - x: operating point variable used for the interpolation, 'WS' (wind speed) or 'RPM' (rotor speed)
+      - kind: see interpolateA
+      - freqWeight: see modeTracking.trackModes
+    OUTPUTS:
+      - OP, Freq, Damp, Track: see modeTracking.trackedCampbell
+    """
+    d  = _sortedMBC(folder, OP_file_or_dict, x=x, verbose=verbose)
+    xi = np.linspace(d[x][0], d[x][-1], nPoints)
+    Ai = interpolateA(d[x], d['AvgA'], xi, kind=kind)
+    eigSol = batchEiganalysis(Ai, d['ndof2'], d['ndof1'])
+    Track  = trackModes(eigSol, freqWeight=freqWeight)
+    Track['DescStates'] = d['DescStates']
+
+    cols = trackNames(Track, d['DescStates'])
+    y    = 'RPM' if x=='WS' else 'WS'
+    OP   = pd.DataFrame({'WS_[m/s]':np.interp(xi, d[x], d['WS']) if x!='WS' else xi,
+                         'RotSpeed_[rpm]':np.interp(xi, d[x], d[y]) if x=='WS' else xi})
+    Freq = pd.DataFrame(Track['NaturalFreqs_Hz'], columns=cols)
+    Damp = pd.DataFrame(Track['DampRatios'], columns=cols)
+    return OP, Freq, Damp, Track
+
+
+def holdOutError(folder, OP_file_or_dict, x='WS', kind='cubic', nModes=15, fmin=0.05, verbose=False):
+    """
+    Error of the interpolation, estimated by leaving out each interior operating point: the matrix at this point is
+    interpolated from the other points, and the modes are compared to the modes of the linearization.
+    The modes are paired by MAC, the lowest nModes modes above fmin [Hz] of the linearization are compared.
+
+    OUTPUTS:
+      - Err: dataframe with one row per interior operating point, columns:
+          x, maximum absolute and relative frequency error, maximum absolute damping ratio error, minimum MAC
+          (NaN when no mode can be compared at a point)
+    """
+    d = _sortedMBC(folder, OP_file_or_dict, x=x, verbose=verbose)
+    xs, A = d[x], d['AvgA']
+    nOP = len(xs)
+    if nOP<3:
+        raise Exception('At least 3 operating points are needed to estimate the interpolation error.')
+    Ai = np.stack([interpolateA(np.delete(xs, k), np.delete(A, k, axis=0), [xs[k]], kind=kind)[0] for k in range(1, nOP-1)])
+    ref = batchEiganalysis(A[1:-1], d['ndof2'], d['ndof1'])
+    itp = batchEiganalysis(Ai,      d['ndof2'], d['ndof1'])
+    rows = []
+    for k in range(nOP-2):
+        V = itp['Valid'][k]
+        # Modes of the linearization, at most as many as the valid interpolated modes such that they are all paired
+        J = np.where(ref['Valid'][k] & (ref['NaturalFreqs_Hz'][k]>=fmin))[0][:min(nModes, np.sum(V))]
+        if len(J)==0:
+            rows.append([xs[k+1]] + [np.nan]*4)
+            continue
+        M = MAC(ref['EigenVects'][k][:,J], itp['EigenVects'][k][:,V])
+        ICol = _assign(1-M)
+        f0, f1 = ref['NaturalFreqs_Hz'][k][J], itp['NaturalFreqs_Hz'][k][V][ICol]
+        z0, z1 = ref['DampRatios'][k][J]     , itp['DampRatios'][k][V][ICol]
+        rows.append([xs[k+1], np.max(np.abs(f1-f0)), np.max(np.abs(f1-f0)/f0), np.max(np.abs(z1-z0)), np.min(M[np.arange(len(J)), ICol])])
+    cols = ['WS_[m/s]' if x=='WS' else 'RotSpeed_[rpm]', 'FreqErr_[Hz]', 'FreqRelErr_[-]', 'DampErr_[-]', 'MinMAC_[-]']
+    return pd.DataFrame(rows, columns=cols)
@@ -0,0 +1,285 @@
+"""
+Generation of many variants of an OpenFAST input deck from one template (e.g. linearization or DLC cases),
+see linearization.writeFASTLinInputs and MATLAB2FAST/Matlab2FAST.m
+
+The template deck is parsed once (see fastInputFile): each line of each file is kept, with the location of its value
+(slot). A case is a dictionary of changes, with the keys used by writeFASTLinInputs, e.g.:
+    {'__name__':'ws08.0', 'TMax':100, 'EDFile|RotSpeed':12.1, 'InflowFile|HWindSpeed':8, 'EDFile|BldFile(1)|AdjBlMs':1.02}
+Only the slots of the changed values, and the references to the sub-files written for the case, are substituted.
+
+Files of a case:
+  - main file: workDir/<name>.fst
+  - modified sub-files (and the files referring to them): <name>_<basename>, in the folder of workDir corresponding to
+    the folder of the template file (in workDir directly for templates outside of the template folder)
+  - the other files of the template folder are copied into workDir (optionally hard-linked, see writeCases), such
+    that the unchanged files and the relative paths (e.g. airfoils, controller) are shared by all the cases.
+Generated sub-files with the same content as a sub-file written before (e.g. the same AeroDyn file for all cases) are
+hard-linked to it instead of being written again. Files are written by a pool of threads.
+
+Limitation: the relative paths of a modified template located outside of the template folder are not updated,
+except the references to sub-files (e.g. airfoil file names of an AeroDyn file in a parent folder).
+"""
+import os
+import shutil
+import hashlib
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from .fastInputFile import readInputDeck
+except ImportError:
+    from fastInputFile import readInputDeck
+
+BATCH_SIZE = 256 # number of cases rendered before their files are written
+
+
+def _formatValue(v, quoted):
+    """ Text of a value in an input file """
+    t = type(v)
+    if t is float or t is int:
+        return str(v)
+    if t is list or t is tuple or isinstance(v, np.ndarray):
+        return ', '.join([_formatValue(x, quoted) for x in v])
+    if isinstance(v, np.generic):
+        v = v.item()
+    if isinstance(v, str):
+        return '"'+v+'"' if quoted and not v.startswith(('"', "'")) else v
+    return str(v)
+
+
+def _parentKey(key):
+    return key.rsplit('|', 1)[0] if '|' in key else ''
+
+
+def _depth(key):
+    return 0 if key=='' else key.count('|')+1
+
+
+def _replace(lines, iLine, s0, s1, text):
+    line = lines[iLine]
+    lines[iLine] = line[:s0] + text + line[s1:]
+
+
+class DeckTemplate():
+    """
+    Parsed template deck, see module documentation
+
+    INPUTS:
+      - fstFile: main file of the template deck
+      - refDir: template folder, copied into workDir. Default: folder of fstFile
+    """
+    def __init__(self, fstFile, refDir=None):
+        deck = readInputDeck(fstFile)
+        self.fstFile = os.path.abspath(fstFile)
+        self.refDir  = os.path.abspath(refDir) if refDir is not None else os.path.dirname(self.fstFile)
+        self.files   = {'':deck.main}
+        self.files.update(deck.files)
+        # References to sub-files: file key -> list of (label, child key)
+        self.children = {key:[] for key in self.files}
+        for key in deck.files:
+            parent = _parentKey(key)
+            self.children[parent].append((key[len(parent)+1 if parent else 0:], key))
+        self._slots  = dict() # key of changes -> (file key, iLine, start, end, quoted)
+        self._layout = None   # (workDir, layout), see _compileLayout
+
+    def slot(self, key):
+        """ Location of the value of a key of a dictionary of changes: (file key, iLine, start, end, quoted) """
+        if key not in self._slots:
+            fileKey, label = _parentKey(key), key.rsplit('|', 1)[-1]
+            if fileKey not in self.files:
+                raise Exception('Sub-file {} (key {}) not found in deck: {}'.format(fileKey, key, self.fstFile))
+            f = self.files[fileKey]
+            if label not in f:
+                raise Exception('Key {} not found in file: {}'.format(label, f.filename))
+            e = f.entry(label)
+            if e['type']!='value':
+                raise Exception('Only values can be changed, not {} of file: {}'.format(label, f.filename))
+            s0, s1 = e['span']
+            self._slots[key] = (fileKey, e['iLine'], s0, s1, f.lines[e['iLine']][s0] in '"\'')
+        return self._slots[key]
+
+    def renderedKeys(self, changes):
+        """ Keys of the files written for a case: the modified files and the files referring to them """
+        keys = {''}
+        for k in changes:
+            if k!='__name__':
+                key = self.slot(k)[0]
+                while key not in keys:
+                    keys.add(key)
+                    key = _parentKey(key)
+        return keys
+
+    def linkedPath(self, templatePath, workDir):
+        """ Path of a template file as seen from workDir (copy in workDir for files of the template folder) """
+        rel = os.path.relpath(templatePath, self.refDir)
+        return templatePath if rel.startswith('..') else os.path.join(workDir, rel)
+
+    def _compileLayout(self, workDir):
+        """
+        Output folders and references to sub-files, which are the same for all the cases:
+          layout[key] = (outDir, suffix, refs), where the files of a case are outDir/<name><suffix>, and
+          refs = list of (child key, iLine, start, end, path of the child folder relative to outDir, text of the
+          reference when the child is not written for the case, None if the template reference is valid)
+        """
+        if self._layout is not None and self._layout[0]==workDir:
+            return self._layout[1]
+        layout = dict()
+        for key, f in self.files.items():
+            rel = os.path.relpath(os.path.dirname(f.filename), self.refDir)
+            outDir = workDir if rel.startswith('..') or key=='' else os.path.normpath(os.path.join(workDir, rel))
+            suffix = os.path.splitext(f.filename)[1] if key=='' else '_'+os.path.basename(f.filename)
+            layout[key] = (outDir, suffix)
+        for key, f in self.files.items():
+            outDir, suffix = layout[key]
+            refs = []
+            for label, childKey in self.children[key]:
+                e = f.entry(label)
+                linked = self.linkedPath(self.files[childKey].filename, workDir)
+                if os.path.normpath(os.path.join(outDir, e['value'].replace('\\', '/')))==os.path.normpath(linked):
+                    unchanged = None
+                else:
+                    unchanged = '"'+os.path.relpath(linked, outDir).replace('\\', '/')+'"'
+                relDir = os.path.relpath(layout[childKey][0], outDir).replace('\\', '/')
+                refs.append((childKey, e['iLine'], e['span'][0], e['span'][1], '' if relDir=='.' else relDir+'/', unchanged))
+            layout[key] = (outDir, suffix, refs)
+        self._layout = (workDir, layout)
+        return layout
+
+    def render(self, changes, workDir):
+        """
+        Files of a case
+
+        OUTPUTS:
+          - files: list of (key, path, text), the main file is last
+        """
+        workDir = os.path.abspath(workDir)
+        layout  = self._compileLayout(workDir)
+        name    = changes['__name__']
+        byFile  = dict()
+        for k, v in changes.items():
+            if k!='__name__':
+                byFile.setdefault(self.slot(k)[0], []).append((self.slot(k), v))
+        paths = dict() # key -> (path, text)
+        used  = dict() # path -> text, files of this case
+        for key in sorted(self.renderedKeys(changes), key=_depth, reverse=True): # sub-files before their parents
+            lines = list(self.files[key].lines)
+            for (fileKey, iLine, s0, s1, quoted), v in byFile.get(key, []):
+                _replace(lines, iLine, s0, s1, _formatValue(v, quoted).rjust(s1-s0))
+            outDir, suffix, refs = layout[key]
+            for childKey, iLine, s0, s1, relDir, unchanged in refs:
+                if childKey in paths:
+                    _replace(lines, iLine, s0, s1, '"'+relDir+os.path.basename(paths[childKey][0])+'"')
+                elif unchanged is not None:
+                    _replace(lines, iLine, s0, s1, unchanged)
+            text = '\n'.join(lines)+'\n'
+            path = os.path.join(outDir, name+suffix)
+            if path in used and used[path]!=text:
+                # Sub-files sharing a template (e.g. ADBlFile(1..3)) with different contents
+                path = os.path.join(outDir, name+'_'+key.replace('|','_').replace('(','').replace(')','')+suffix)
+            used[path] = text
+            paths[key] = (path, text)
+        return [(key, p, t) for key, (p, t) in paths.items()]
+
+
+# --------------------------------------------------------------------------------}
+# --- Writing
+# --------------------------------------------------------------------------------{
+def _write(path, text):
+    # Written to a temporary file and renamed: an existing hard link is replaced, not modified
+    tmp = path+'.tmp{}'.format(os.getpid())
+    with open(tmp, 'w') as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def _copy(src, dst):
+    """ Copy src to dst (with its modification time), unless dst is already an identical copy """
+    if os.path.exists(dst):
+        st0, st1 = os.stat(src), os.stat(dst)
+        if os.path.samestat(st0, st1) or (st0.st_size==st1.st_size and st0.st_mtime_ns==st1.st_mtime_ns and st1.st_nlink==1):
+            return
+    tmp = dst+'.tmp{}'.format(os.getpid())
+    shutil.copy2(src, tmp)
+    os.replace(tmp, dst)
+
+
+def _link(src, dst):
+    """ Hard link dst to src (copy if links are not supported), unless they already are the same file """
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        return
+    tmp = dst+'.tmp{}'.format(os.getpid())
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copy2(src, tmp)
+    os.replace(tmp, dst)
+
+
+def _makeDirs(dirs):
+    for d in sorted(dirs):
+        os.makedirs(d, exist_ok=True)
+
+
+def writeCases(fstFile, PARAMS, workDir, refDir=None, link=False, nThreads=8, batchSize=BATCH_SIZE, verbose=False):
+    """
+    Write the input files of several cases from a template deck (see module documentation)
+
+    INPUTS:
+      - fstFile: main file of the template deck
+      - PARAMS: list of dictionaries of changes, with the key '__name__' (see linearization.writeFASTLinInputs)
+      - workDir: folder where the cases are written (created if needed)
+      - refDir: template folder, copied into workDir. Default: folder of fstFile
+      - link: hard-link the files of the template folder into workDir instead of copying them. The cases then share
+              these files with the template: they must not be modified in place.
+      - nThreads: number of threads writing the files
+      - batchSize: number of cases rendered before their files are written (bounds the memory used)
+    OUTPUTS:
+      - fastfiles: list of main files, one per case
+    """
+    tpl     = fstFile if isinstance(fstFile, DeckTemplate) else DeckTemplate(fstFile, refDir=refDir)
+    workDir = os.path.abspath(workDir)
+    os.makedirs(workDir, exist_ok=True)
+    names = [p['__name__'] for p in PARAMS]
+    if len(set(names))<len(names):
+        raise Exception('Names of the cases (__name__) are not unique')
+
+    # --- Files of the template folder, except the deck files written for all the cases
+    nRendered = dict()
+    for p in PARAMS:
+        for key in tpl.renderedKeys(p):
+            nRendered[tpl.files[key].filename] = nRendered.get(tpl.files[key].filename, 0) + 1
+    always = set([f for f, n in nRendered.items() if n==len(PARAMS)])
+    copies = []
+    for root, dirs, files in os.walk(tpl.refDir):
+        dirs[:] = [d for d in dirs if os.path.abspath(os.path.join(root, d))!=workDir]
+        for fn in files:
+            src = os.path.join(root, fn)
+            if src not in always:
+                copies.append((src, tpl.linkedPath(src, workDir)))
+
+    fastfiles = []
+    written   = dict() # sha1 of content -> path, sub-files written
+    with ThreadPoolExecutor(max_workers=nThreads) as pool:
+        _makeDirs(set([os.path.dirname(dst) for src, dst in copies]))
+        list(pool.map(lambda a: (_link if link else _copy)(*a), copies))
+        for i0 in range(0, len(PARAMS), batchSize):
+            writes, caseLinks = [], []
+            for p in PARAMS[i0:i0+batchSize]:
+                for key, path, text in tpl.render(p, workDir):
+                    if key=='':
+                        # Main files are never linked: they are modified in place by some tools (see fastJobs.setKeys)
+                        writes.append((path, text))
+                        fastfiles.append(path)
+                        continue
+                    h = hashlib.sha1(text.encode()).hexdigest()
+                    if h in written and written[h]!=path:
+                        caseLinks.append((written[h], path))
+                    else:
+                        written[h] = path
+                        writes.append((path, text))
+            _makeDirs(set([os.path.dirname(p) for p, t in writes] + [os.path.dirname(d) for s, d in caseLinks]))
+            list(pool.map(lambda a: _write(*a), writes))
+            list(pool.map(lambda a: _link(*a), caseLinks))
+            if verbose:
+                print('Cases written: {}/{} ({} files written, {} linked)'.format(min(i0+batchSize, len(PARAMS)), len(PARAMS), len(writes), len(caseLinks)))
+    return fastfiles
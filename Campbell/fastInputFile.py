@@ -0,0 +1,457 @@
+"""
+Parser for OpenFAST input files (main .fst file and module input files), see FAST2MATLAB/FAST2Matlab.m
+
+Each file is tokenized in a single pass. Lines of the form `value [,values] label [- description]` give entries
+(label, value), and the tables (e.g. distributed blade properties), lists of files (AFNames) and output lists (OutList)
+are read as one entry each. The lines and the location of each value in its line are kept, such that files can be
+written back with only some values changed.
+
+Parsed files are cached in memory (LRU), keyed on the path, modification time and size of the file. Optionally, they
+are also cached on disk (`diskCache` folder, e.g. inside the working directory), as JSON files, bounded to
+DISK_CACHE_SIZE files. The sub-files of a deck (e.g. EDFile, AeroFile, InflowFile, and the files they refer to) are read
+concurrently, see readInputDeck.
+
+Example:
+    deck = readInputDeck('Main.fst')
+    deck['CompServo'], deck['EDFile|RotSpeed'], deck['EDFile|BldFile(1)|BldProp']
+"""
+import os
+import re
+import json
+import hashlib
+import functools
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+LRU_SIZE        = 512  # number of parsed files kept in memory
+DISK_CACHE_SIZE = 2048 # maximum number of parsed files in a disk cache folder, the oldest ones are removed
+_VERSION        = 2    # version of the parsed structure, stored in the disk cache
+
+# Tables: first column name -> (entry label, label of the number of rows)
+TABLES = {
+    'HtFract'   : ('TowProp' , 'NTwInpSt'),
+    'TwrElev'   : ('TowProp' , 'NumTwrNds'),
+    'BlFract'   : ('BldProp' , 'NBlInpSt'),
+    'BlSpn'     : ('BldNodes', 'NumBlNds'),
+    'RNodes'    : ('BldNodes', 'BldNodes'),
+    'GenSpd_TLU': ('DLLProp' , 'DLL_NumTrq'),
+    'WndSpeed'  : ('Cases'   , 'NumCases'),
+}
+# Lists of files, one per line: label -> label of the number of files
+FILE_LISTS = {'AFNames':'NumAFfiles', 'FoilNm':'NumFoil'}
+# Labels of sub-files, e.g. EDFile, BldFile(1), ADBlFile(3)
+_SUBFILE_LABEL = re.compile(r'^\w*File(\(\d+\))?$')
+# Tokens: quoted strings, commas, or groups of non-blank characters
+_TOKEN = re.compile(r'"[^"]*"?|\'[^\']*\'?|,|[^\s,]+')
+_TRUE_FALSE = {'true':True, 't':True, 'false':False, 'f':False}
+
+
+def _number(tok):
+    """ Value of a numeric token (int or float, Fortran exponents accepted), None if not numeric """
+    try:
+        return int(tok)
+    except ValueError:
+        pass
+    try:
+        v = float(tok.replace('D','E').replace('d','e'))
+    except ValueError:
+        return None
+    return v if np.isfinite(v) else None
+
+
+def _value(tok):
+    """ Value of a token: number, logical, or string (without quotes) """
+    if tok[0] in '"\'':
+        return tok.strip(tok[0])
+    v = _number(tok)
+    if v is not None:
+        return v
+    return _TRUE_FALSE.get(tok.lower(), tok)
+
+
+def _isComment(s):
+    return len(s)==0 or s[0] in '#!=' or s.startswith('--')
+
+
+# --------------------------------------------------------------------------------}
+# --- Input file
+# --------------------------------------------------------------------------------{
+class FASTInputFile():
+    """
+    Parsed OpenFAST input file.
+
+    Attributes:
+      - filename: absolute path of the file
+      - lines: lines of the file (without end of lines)
+      - entries: list of dictionaries with keys:
+          - label, value
+          - type: 'value', 'table', 'list' (files) or 'outlist'
+          - iLine: line of the value (first line for lists, outlists and first row for tables)
+          - span: (start, end) of the value in its line, for type 'value'
+          - headers, units: for type 'table'
+    Values are numbers, logicals, strings (without quotes) or lists of them. Tables are arrays (or lists of rows when
+    some columns are not numeric).
+
+    Parsed files are shared by the caches of readInputFile: they should not be modified (copy them first).
+    """
+    def __init__(self, filename):
+        self.filename = os.path.abspath(filename)
+        with open(self.filename, 'r', errors='replace') as f:
+            self.lines = f.read().splitlines()
+        self.entries = []
+        self._parse()
+        self._buildIndex()
+
+    def _buildIndex(self):
+        self._index = dict()
+        for i, e in enumerate(self.entries):
+            self._index.setdefault(e['label'], i)
+
+    def _add(self, **entry):
+        self.entries.append(entry)
+        self._index = None
+
+    def _count(self, label):
+        """ Value of a label read before, used for the number of rows of tables and lists """
+        for e in reversed(self.entries):
+            if e['label']==label and isinstance(e['value'], int) and not isinstance(e['value'], bool):
+                return e['value']
+        return None
+
+    def _parse(self):
+        lines = self.lines
+        nLines = len(lines)
+        i = 0
+        while i<nLines:
+            line = lines[i]
+            toks = [(m.group(), m.start(), m.end()) for m in _TOKEN.finditer(line)]
+            if len(toks)==0 or _isComment(toks[0][0]):
+                i += 1
+                continue
+            first = toks[0][0]
+            # --- Tables, detected from the name of their first column
+            if first.strip('"') in TABLES:
+                i = self._parseTable(i, [t[0] for t in toks if t[0]!=','])
+                continue
+            # --- Output lists, the line only contains the label
+            if (len(toks)==1 or toks[1][0]=='-') and (first.lower().startswith('outlist') or first.upper()=='OUTPUTS'):
+                i = self._parseOutList(i, first)
+                continue
+            # --- Values: first token, and following numbers or comma separated values, until the label
+            values = [_value(first)]
+            iEnd   = toks[0][2]
+            label  = ''
+            j = 1
+            while j<len(toks):
+                tok = toks[j][0]
+                if tok==',' and j+1<len(toks):
+                    values.append(_value(toks[j+1][0]))
+                    iEnd = toks[j+1][2]
+                    j += 2
+                elif tok[0] in '"\'' or _number(tok) is not None:
+                    values.append(_value(tok))
+                    iEnd = toks[j][2]
+                    j += 1
+                else:
+                    label = tok if tok!='-' else ''
+                    break
+            value = values[0] if len(values)==1 else values
+            self._add(label=label, value=value, type='value', iLine=i, span=(toks[0][1], iEnd))
+            i += 1
+            # --- Lists of files on the following lines
+            if label in FILE_LISTS:
+                n = self._count(FILE_LISTS[label])
+                files = [value]
+                while n is not None and len(files)<n and i<nLines:
+                    sp = lines[i].split()
+                    if len(sp)>0:
+                        files.append(_value(sp[0]))
+                    i += 1
+                self.entries[-1].update(value=files, type='list')
+
+    def _parseTable(self, i, headers):
+        name, countLabel = TABLES[headers[0].strip('"')]
+        headers = [h.strip('"') for h in headers]
+        n = self._count(countLabel)
+        i += 1
+        units = []
+        if i<len(self.lines) and self.lines[i].lstrip().startswith('('):
+            units = self.lines[i].split()
+            i += 1
+        iFirst = i
+        rows = []
+        while i<len(self.lines) and (n is None or len(rows)<n):
+            sp = self.lines[i].split()
+            if len(sp)==0 or _isComment(sp[0]) or (n is None and _number(sp[0]) is None):
+                break
+            rows.append([_value(v) for v in sp[:len(headers)]])
+            i += 1
+        if n is not None and len(rows)<n:
+            print('[WARN] {}: table {} has {} rows instead of {}'.format(self.filename, name, len(rows), n))
+        if all([not isinstance(v, (str, bool)) for r in rows for v in r]) and len(set(map(len, rows)))<=1:
+            table = np.array(rows, dtype=float).reshape(len(rows), len(rows[0]) if len(rows)>0 else len(headers))
+        else:
+            table = rows
+        self._add(label=name, value=table, type='table', iLine=iFirst, headers=headers, units=units)
+        return i
+
+    def _parseOutList(self, i, label):
+        iFirst = i+1
+        out = []
+        i += 1
+        while i<len(self.lines):
+            s = self.lines[i].strip()
+            i += 1
+            if len(s)==0:
+                continue
+            if s.upper().startswith('END') or s.startswith('---'):
+                break
+            m = _TOKEN.match(s)
+            out.append(m.group().strip('"'))
+        self._add(label=label, value=out, type='outlist', iLine=iFirst)
+        return i
+
+    # --------------------------------------------------------------------------------
+    # --- Dictionary interface
+    # --------------------------------------------------------------------------------
+    def keys(self):
+        if self._index is None:
+            self._buildIndex()
+        return self._index.keys()
+
+    def __contains__(self, label):
+        return label in self.keys()
+
+    def __getitem__(self, label):
+        if label not in self:
+            raise KeyError('{} not found in file: {}'.format(label, self.filename))
+        return self.entries[self._index[label]]['value']
+
+    def get(self, label, default=None):
+        return self[label] if label in self else default
+
+    def entry(self, label):
+        """ Entry of a label (see class documentation) """
+        self[label]
+        return self.entries[self._index[label]]
+
+    def __repr__(self):
+        return '<{} {} entries of {}>'.format(type(self).__name__, len(self.entries), self.filename)
+
+    def subFiles(self):
+        """ Existing files referred to by the file (e.g. EDFile, BldFile(1)), dictionary label -> absolute path """
+        baseDir = os.path.dirname(self.filename)
+        files = dict()
+        for e in self.entries:
+            v = e['value']
+            if e['type']=='value' and isinstance(v, str) and _SUBFILE_LABEL.match(e['label']) and v.lower() not in ('unused', 'none', ''):
+                path = os.path.normpath(os.path.join(baseDir, v.replace('\\', '/')))
+                if os.path.isfile(path):
+                    files[e['label']] = path
+        return files
+
+    def referencedFiles(self):
+        """
+        All the existing files referred to by the file: sub-files (see subFiles), lists of files (e.g. AFNames) and
+        other paths (e.g. DLL_FileName, FileName_BTS), list of absolute paths
+        """
+        baseDir = os.path.dirname(self.filename)
+        files = []
+        for e in self.entries:
+            if e['type'] not in ('value', 'list'):
+                continue
+            for v in (e['value'] if isinstance(e['value'], list) else [e['value']]):
+                if isinstance(v, str) and v.lower() not in ('unused', 'none', 'default', ''):
+                    path = os.path.normpath(os.path.join(baseDir, v.replace('\\', '/')))
+                    if path not in files and os.path.isfile(path):
+                        files.append(path)
+        return files
+
+    # --------------------------------------------------------------------------------
+    # --- Serialization (plain data: the module may be imported with different names)
+    # --------------------------------------------------------------------------------
+    def __getstate__(self):
+        return {'filename':self.filename, 'lines':self.lines, 'entries':self.entries}
+
+    def __setstate__(self, d):
+        self.__dict__.update(d)
+        self._buildIndex()
+
+    @classmethod
+    def fromState(cls, d):
+        f = cls.__new__(cls)
+        f.__setstate__(d)
+        return f
+
+
+# --------------------------------------------------------------------------------}
+# --- Caches
+# --------------------------------------------------------------------------------{
+def _stamp(filename):
+    st = os.stat(filename)
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _diskCacheFile(diskCache, filename):
+    return os.path.join(diskCache, hashlib.sha1(filename.encode()).hexdigest()+'.json')
+
+
+def _entryToData(e):
+    """ Entry as plain JSON data: tables are stored as nested lists with their shape """
+    e = dict(e)
+    if isinstance(e['value'], np.ndarray):
+        e['shape'] = list(e['value'].shape)
+        e['value'] = e['value'].tolist()
+    return e
+
+
+def _entryFromData(e):
+    if 'shape' in e:
+        e['value'] = np.array(e['value'], dtype=float).reshape(e.pop('shape'))
+    if 'span' in e:
+        e['span'] = tuple(e['span'])
+    return e
+
+
+def _readDiskCache(diskCache, filename, stamp):
+    try:
+        with open(_diskCacheFile(diskCache, filename), 'r') as f:
+            d = json.load(f)
+        if d['version']==_VERSION and d['filename']==filename and tuple(d['stamp'])==stamp:
+            return FASTInputFile.fromState({'filename':filename, 'lines':d['lines'], 'entries':[_entryFromData(e) for e in d['entries']]})
+    except (OSError, KeyError, ValueError, TypeError):
+        pass
+    return None
+
+
+def _writeDiskCache(diskCache, filename, stamp, f):
+    cacheFile = _diskCacheFile(diskCache, filename)
+    tmp = cacheFile+'.tmp{}'.format(os.getpid())
+    try:
+        os.makedirs(diskCache, exist_ok=True)
+        with open(tmp, 'w') as fid:
+            json.dump({'version':_VERSION, 'filename':filename, 'stamp':stamp, 'lines':f.lines, 'entries':[_entryToData(e) for e in f.entries]}, fid)
+        os.replace(tmp, cacheFile)
+        _trimDiskCache(diskCache)
+    except (OSError, TypeError, ValueError):
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _trimDiskCache(diskCache, maxFiles=None):
+    """ Remove the oldest files of a disk cache folder, such that it contains at most maxFiles files """
+    maxFiles = DISK_CACHE_SIZE if maxFiles is None else maxFiles
+    files = [e for e in os.scandir(diskCache) if e.name.endswith('.json')]
+    if len(files)<=maxFiles:
+        return
+    files.sort(key=lambda e: e.stat().st_mtime_ns)
+    for e in files[:len(files)-maxFiles]:
+        try:
+            os.remove(e.path)
+        except OSError:
+            pass
+
+
+@functools.lru_cache(maxsize=LRU_SIZE)
+def _readCached(filename, stamp, diskCache):
+    f = _readDiskCache(diskCache, filename, stamp) if diskCache is not None else None
+    if f is None:
+        f = FASTInputFile(filename)
+        if diskCache is not None:
+            _writeDiskCache(diskCache, filename, stamp, f)
+    return f
+
+
+def readInputFile(filename, diskCache=None):
+    """
+    Parsed input file (FASTInputFile), from the memory cache (or the disk cache) when the file has not changed.
+    The returned object is shared and should not be modified.
+
+    INPUTS:
+      - filename: input file
+      - diskCache: folder of the disk cache (e.g. a subfolder of the working directory). Default: no disk cache
+    """
+    filename = os.path.abspath(filename)
+    if diskCache is not None:
+        diskCache = os.path.abspath(diskCache)
+    return _readCached(filename, _stamp(filename), diskCache)
+
+
+def clearCache(diskCache=None):
+    """ Clear the memory cache, and optionally a disk cache folder """
+    _readCached.cache_clear()
+    if diskCache is not None and os.path.isdir(diskCache):
+        _trimDiskCache(diskCache, maxFiles=0)
+
+
+# --------------------------------------------------------------------------------}
+# --- Input decks
+# --------------------------------------------------------------------------------{
+class FASTInputDeck():
+    """
+    Main input file and the files it refers to, recursively.
+
+    Attributes:
+      - main: FASTInputFile of the main file
+      - files: dictionary of FASTInputFile, keys are the labels of the sub-files separated with "|",
+               e.g. 'EDFile', 'EDFile|BldFile(1)', 'AeroFile|ADBlFile(1)'
+
+    Values are accessed with the same keys as the dictionaries of changes of linearization.writeFASTLinInputs:
+    deck['TMax'], deck['EDFile|RotSpeed'], deck['EDFile|BldFile(1)|AdjBlMs']
+    """
+    def __init__(self, main, files):
+        self.main  = main
+        self.files = files
+
+    def _split(self, key):
+        sp = key.rsplit('|', 1)
+        if len(sp)==1:
+            return self.main, key
+        if sp[0] not in self.files:
+            raise KeyError('Sub-file {} not found in deck: {}'.format(sp[0], self.main.filename))
+        return self.files[sp[0]], sp[1]
+
+    def __getitem__(self, key):
+        f, label = self._split(key)
+        return f[label]
+
+    def __contains__(self, key):
+        try:
+            f, label = self._split(key)
+        except KeyError:
+            return False
+        return label in f
+
+    def __repr__(self):
+        return '<{} {} with {} sub-files>'.format(type(self).__name__, self.main.filename, len(self.files))
+
+
+def readInputDeck(fstFile, recursive=True, nThreads=8, diskCache=None):
+    """
+    Read a main input file and its sub-files (see FASTInputDeck). The sub-files of each level are read concurrently.
+
+    INPUTS:
+      - fstFile: main input file
+      - recursive: read the sub-files of the sub-files (e.g. blade and tower files of ElastoDyn)
+      - nThreads: number of threads reading the files
+      - diskCache: see readInputFile
+    """
+    main  = readInputFile(fstFile, diskCache)
+    files = dict()
+    level = [('', main)]
+    with ThreadPoolExecutor(max_workers=nThreads) as pool:
+        while len(level)>0:
+            futures = dict() # path -> future, files referred to several times are read once
+            keys    = []
+            for parentKey, f in level:
+                for label, path in f.subFiles().items():
+                    if path not in futures:
+                        futures[path] = pool.submit(readInputFile, path, diskCache)
+                    keys.append((parentKey+label, path))
+            level = []
+            for key, path in keys:
+                files[key] = futures[path].result()
+                level.append((key+'|', files[key]))
+            if not recursive:
+                break
+    return FASTInputDeck(main, files)
@@ -0,0 +1,265 @@
+"""
+Parallel and resumable execution of OpenFAST simulations (e.g. the linearization cases written by writeFASTLinInputs)
+
+ - simulations are run concurrently, by default using all the cores of the machine
+ - simulations whose outputs exist and are newer than their inputs are skipped
+ - failed simulations are retried
+ - the status of each job and a hash of its input files (the main file and all the files it refers to, recursively)
+   are stored in a json file: an interrupted sweep resumes where it stopped, and simulations whose inputs were
+   rewritten with the same content are not rerun
+"""
+import os
+import json
+import hashlib
+import time
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+try:
+    from .fastInputFile import readInputDeck
+    from .inputsCache import fileHash
+except ImportError:
+    from fastInputFile import readInputDeck
+    from inputsCache import fileHash
+
+STATE_FILE = '_RunFAST_jobs.json'
+
+
+# --------------------------------------------------------------------------------}
+# --- Inputs and outputs of a simulation
+# --------------------------------------------------------------------------------{
+def _readKeys(filename, keys):
+    """ Return the values of some keys of an OpenFAST input file (value is the first entry of a line, key the second) """
+    values = dict()
+    with open(filename, 'r', errors='replace') as f:
+        for line in f:
+            sp = line.split()
+            if len(sp)>=2 and sp[1] in keys and sp[1] not in values:
+                values[sp[1]] = sp[0].strip('"').strip("'")
+    return values
+
+
+def setKeys(filename, values):
+    """
+    Set the values of some keys of an OpenFAST input file (value is the first entry of a line, key the second).
+    The file is rewritten only if a value changed, such that its modification time is otherwise preserved.
+
+    OUTPUTS:
+      - changed: True if the file was rewritten
+    """
+    with open(filename, 'r', errors='replace') as f:
+        lines = f.readlines()
+    changed = False
+    done    = set()
+    for i, line in enumerate(lines):
+        sp = line.split()
+        if len(sp)>=2 and sp[1] in values and sp[1] not in done:
+            done.add(sp[1])
+            v = values[sp[1]]
+            sval = str(v) if isinstance(v, (str, bool)) else '{:.6g}'.format(v)
+            if sp[0]!=sval:
+                iv = line.find(sp[0])
+                lines[i] = line[:iv] + sval.rjust(len(sp[0])) + line[iv+len(sp[0]):]
+                changed = True
+    if changed:
+        # Written to a temporary file and renamed, such that files hard-linked to this one are not modified (see deckWriter)
+        tmp = filename+'.tmp'
+        with open(tmp, 'w') as f:
+            f.writelines(lines)
+        os.replace(tmp, filename)
+    return changed
+
+
+def inputFiles(fstFile, recursive=True):
+    """
+    List of input files of a simulation: main file, and the existing files it refers to (e.g. EDFile, AeroFile), see
+    fastInputFile.FASTInputFile.referencedFiles
+
+    INPUTS:
+      - recursive: include the files referred to by the sub-files (e.g. BldFile, ADBlFile, airfoils, controller DLL)
+    """
+    deck  = readInputDeck(fstFile, recursive=recursive)
+    files = [fstFile]
+    seen  = set([os.path.abspath(fstFile)])
+    for f in [deck.main] + (list(deck.files.values()) if recursive else []):
+        for path in f.referencedFiles():
+            if path not in seen:
+                seen.add(path)
+                files.append(path)
+    return files
+
+
+def inputsHash(fstFile):
+    """ Hash of the content of the input files of a simulation (see inputFiles) """
+    h = hashlib.sha1()
+    for f in inputFiles(fstFile):
+        h.update(fileHash(f).encode())
+    return h.hexdigest()
+
+
+def outputFiles(fstFile):
+    """
+    Expected output files of a simulation:
+      - linearization files base.1.lin .. base.N.lin when Linearize is True
+      - otherwise, the .outb or .out file
+    """
+    base = os.path.splitext(fstFile)[0]
+    p = _readKeys(fstFile, ['Linearize','NLinTimes','OutFileFmt'])
+    if p.get('Linearize','false').lower() in ['true','t']:
+        nLin = int(p.get('NLinTimes', 1))
+        return ['{}.{:d}.lin'.format(base, i+1) for i in range(nLin)]
+    if p.get('OutFileFmt','2') in ['1']:
+        return [base+'.out']
+    return [base+'.outb']
+
+
+def isUpToDate(fstFile, job=None):
+    """
+    True if all the outputs of a simulation exist and:
+     - if `job` (entry of the job state, see runFASTJobs) stores the hash of the inputs of the simulation, this hash
+       is the hash of the current inputs (see inputsHash)
+     - otherwise, the outputs are newer than the inputs (all the input files, see inputFiles)
+    """
+    outs = outputFiles(fstFile)
+    if not all([os.path.exists(f) for f in outs]):
+        return False
+    if job is not None and job.get('status',None) in ('done','skipped') and 'inputs' in job:
+        return job['inputs']==inputsHash(fstFile)
+    tIn  = max([os.path.getmtime(f) for f in inputFiles(fstFile)])
+    tOut = min([os.path.getmtime(f) for f in outs])
+    return tOut >= tIn
+
+
+# --------------------------------------------------------------------------------}
+# --- Job state
+# --------------------------------------------------------------------------------{
+def loadJobState(stateFile):
+    """ Read the job state file, returns an empty dictionary if the file does not exist or is corrupted """
+    if stateFile is None or not os.path.exists(stateFile):
+        return dict()
+    try:
+        with open(stateFile, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return dict()
+
+
+def saveJobState(stateFile, state):
+    """ Write the job state file (atomically, such that an interruption does not corrupt it) """
+    if stateFile is None:
+        return
+    tmp = stateFile+'.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(tmp, stateFile)
+
+
+# --------------------------------------------------------------------------------}
+# --- Runner
+# --------------------------------------------------------------------------------{
+def runFASTJob(fstFile, fastExe, flags=None, showOutputs=False):
+    """
+    Run one OpenFAST simulation, from the folder of the input file.
+    When showOutputs is False, the standard output is written to base.log
+
+    OUTPUTS:
+      - returncode: return code of the executable
+    """
+    fastExe = os.path.abspath(fastExe)
+    args    = [fastExe] + (flags if flags is not None else []) + [os.path.basename(fstFile)]
+    cwd     = os.path.dirname(os.path.abspath(fstFile))
+    if showOutputs:
+        p = subprocess.run(args, cwd=cwd)
+    else:
+        with open(os.path.splitext(fstFile)[0]+'.log', 'w') as log:
+            p = subprocess.run(args, cwd=cwd, stdout=log, stderr=subprocess.STDOUT)
+    return p.returncode
+
+
+def runFASTJobs(fastfiles, fastExe, nCores=None, stateFile='default', maxRetries=1, skipUpToDate=True,
+        flags=None, showOutputs=False, callback=None, verbose=True):
+    """
+    Run a set of OpenFAST simulations in parallel, skipping the ones that are up to date, retrying the ones that fail.
+
+    INPUTS:
+      - fastfiles: list of .fst files
+      - fastExe: path to an OpenFAST executable
+      - nCores: number of simulations run concurrently. Default: number of cores of the machine
+      - stateFile: json file where the status of each job and the hash of its inputs are stored.
+                   'default': a file `_RunFAST_jobs.json` in the folder of the first fst file. None: no state file.
+      - maxRetries: number of times a failed simulation is run again
+      - skipUpToDate: skip simulations whose outputs exist and whose inputs did not change (see isUpToDate)
+      - flags: list of additional command line arguments for OpenFAST (e.g. ['-VTKLin'])
+      - showOutputs: print the outputs of the simulations to screen, otherwise they are written to base.log
+      - callback: function called as callback(fst, status) for each simulation that is done or up to date.
+                  It is called from the calling thread while the other simulations keep running,
+                  e.g. to post-process the outputs of a simulation as soon as they are available.
+    OUTPUTS:
+      - state: dictionary with keys fst files, and values dictionaries with keys: status ('done','skipped','failed'),
+               attempts, returncode, elapsed, inputs (hash of the inputs, see inputsHash)
+    """
+    fastfiles = [os.path.normpath(f) for f in fastfiles]
+    if nCores is None:
+        nCores = os.cpu_count() or 1
+    if stateFile=='default':
+        stateFile = os.path.join(os.path.dirname(os.path.abspath(fastfiles[0])), STATE_FILE) if len(fastfiles)>0 else None
+    state = loadJobState(stateFile)
+
+    # --- Selecting jobs to run
+    toRun   = []
+    skipped = []
+    for fst in fastfiles:
+        if skipUpToDate and isUpToDate(fst, state.get(fst,None)):
+            skipped.append(fst)
+            if state.get(fst,{}).get('status',None)!='done' or 'inputs' not in state[fst]:
+                state[fst] = {'status':'skipped', 'attempts':0, 'returncode':0, 'elapsed':0, 'inputs':inputsHash(fst)}
+        else:
+            state[fst] = {'status':'pending', 'attempts':0, 'returncode':None, 'elapsed':0}
+            toRun.append(fst)
+    saveJobState(stateFile, state)
+    if verbose:
+        print('[INFO] Running {} simulations on {} cores ({} up to date)'.format(len(toRun), nCores, len(fastfiles)-len(toRun)))
+
+    def flushSkipped():
+        # Outputs of up to date simulations are processed while the other simulations run
+        if callback is not None:
+            while len(skipped)>0:
+                callback(skipped.pop(0), 'skipped')
+
+    # --- Running, with retries
+    def job(fst):
+        t0 = time.time()
+        inputs = inputsHash(fst) # before the run, inputs modified during the run are detected at the next sweep
+        try:
+            rc = runFASTJob(fst, fastExe, flags=flags, showOutputs=showOutputs)
+        except OSError as e:
+            print('[FAIL] {}: {}'.format(fst, e))
+            rc = -1
+        return fst, rc, time.time()-t0, inputs
+
+    for attempt in range(maxRetries+1):
+        if len(toRun)==0:
+            break
+        failed = []
+        with ThreadPoolExecutor(max_workers=nCores) as pool:
+            futures = [pool.submit(job, fst) for fst in toRun]
+            flushSkipped()
+            for fut in as_completed(futures):
+                fst, rc, elapsed, inputs = fut.result()
+                ok = rc==0 and all([os.path.exists(f) for f in outputFiles(fst)])
+                state[fst] = {'status':'done' if ok else 'failed', 'attempts':attempt+1, 'returncode':rc, 'elapsed':elapsed, 'inputs':inputs}
+                saveJobState(stateFile, state)
+                if verbose:
+                    print('[{}] {} ({:.1f}s)'.format(' OK ' if ok else 'FAIL', fst, elapsed))
+                if not ok:
+                    failed.append(fst)
+                elif callback is not None:
+                    callback(fst, 'done')
+        toRun = failed
+        if len(toRun)>0 and attempt<maxRetries and verbose:
+            print('[WARN] Retrying {} failed simulations'.format(len(toRun)))
+    flushSkipped()
+
+    if len(toRun)>0:
+        print('[WARN] {} simulations failed, see the job state file: {}'.format(len(toRun), stateFile))
+    return {fst:state[fst] for fst in fastfiles}
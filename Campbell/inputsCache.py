@@ -0,0 +1,121 @@
+"""
+Content-addressed cache for the generation of OpenFAST input files from templates (see linearization.writeFASTLinInputs)
+
+Each generated case is identified by a hash of its dictionary of changes (e.g. "linDict") and of the content of the
+template files. A manifest stored in the output folder lists, for each case, its hash and the files that were generated.
+Cases whose hash has not changed and whose files still exist are reused: they are not rewritten, such that their
+modification times are preserved (see fastJobs.isUpToDate).
+
+Hashes of files are memoized in memory, based on the modification time and size of the files.
+"""
+import os
+import json
+import hashlib
+
+MANIFEST_FILE = '_InputsCache.json'
+
+_fileHashes = dict() # key: path, value: ((mtime_ns, size), hash)
+
+
+def _stamp(filename):
+    st = os.stat(filename)
+    return (st.st_mtime_ns, st.st_size)
+
+
+def fileHash(filename):
+    """ sha1 of the content of a file, memoized based on its modification time and size """
+    filename = os.path.abspath(filename)
+    stamp = _stamp(filename)
+    if filename in _fileHashes and _fileHashes[filename][0]==stamp:
+        return _fileHashes[filename][1]
+    h = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(1<<20), b''):
+            h.update(chunk)
+    _fileHashes[filename] = (stamp, h.hexdigest())
+    return _fileHashes[filename][1]
+
+
+def templateHash(templateDir, excludeDir=None):
+    """ Hash of the content of all the files of a template directory (recursive), excluding an optional subdirectory """
+    h = hashlib.sha1()
+    excludeDir = os.path.abspath(excludeDir) if excludeDir is not None else None
+    for root, dirs, files in os.walk(templateDir):
+        dirs[:] = sorted([d for d in dirs if os.path.abspath(os.path.join(root, d))!=excludeDir])
+        for f in sorted(files):
+            path = os.path.join(root, f)
+            h.update(os.path.relpath(path, templateDir).replace('\\','/').encode())
+            h.update(fileHash(path).encode())
+    return h.hexdigest()
+
+
+def caseHash(caseDict, tplHash=''):
+    """ Hash of a dictionary of changes to input files, and of the template hash """
+    s = json.dumps(caseDict, sort_keys=True, default=repr)
+    return hashlib.sha1((tplHash+s).encode()).hexdigest()
+
+
+def snapshotCopies(templateDir, workDir):
+    """ Modification time and hash of the files of workDir that are copies of the files of a template directory """
+    snap = dict()
+    for root, dirs, files in os.walk(templateDir):
+        dirs[:] = [d for d in dirs if os.path.abspath(os.path.join(root, d))!=os.path.abspath(workDir)]
+        for f in files:
+            path = os.path.join(workDir, os.path.relpath(os.path.join(root, f), templateDir))
+            if os.path.isfile(path):
+                st = os.stat(path)
+                snap[path] = (st.st_atime_ns, st.st_mtime_ns, fileHash(path))
+    return snap
+
+
+def restoreTimes(snap):
+    """
+    Restore the modification times of files of a snapshot that were rewritten with the same content.
+    Files with several hard links are skipped: their times are shared with the other links (e.g. template files).
+    """
+    for path, (atime, mtime, h) in snap.items():
+        if not os.path.exists(path):
+            continue
+        st = os.stat(path)
+        if st.st_nlink==1 and st.st_mtime_ns!=mtime and fileHash(path)==h:
+            os.utime(path, ns=(atime, mtime))
+
+
+# --------------------------------------------------------------------------------}
+# --- Manifest
+# --------------------------------------------------------------------------------{
+def loadManifest(workDir, name=MANIFEST_FILE):
+    """ Read the manifest of a folder, returns an empty dictionary if not present or corrupted """
+    filename = os.path.join(workDir, name)
+    if not os.path.exists(filename):
+        return dict()
+    try:
+        with open(filename, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return dict()
+
+
+def saveManifest(workDir, manifest, name=MANIFEST_FILE):
+    """ Write the manifest of a folder """
+    filename = os.path.join(workDir, name)
+    tmp = filename+'.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, filename)
+
+
+def cachedCase(manifest, workDir, name, h):
+    """ Return the main file of a case if it was generated with the same hash and all its files exist, otherwise None """
+    entry = manifest.get(name, None)
+    if entry is None or entry['hash']!=h:
+        return None
+    files = [os.path.join(workDir, f) for f in entry['files']]
+    if not all([os.path.exists(f) for f in files]):
+        return None
+    return files[0]
+
+
+def addCase(manifest, workDir, name, h, files):
+    """ Store the hash and the files (main file first) of a generated case in the manifest """
+    manifest[name] = {'hash':h, 'files':[os.path.relpath(f, workDir).replace('\\','/') for f in files]}
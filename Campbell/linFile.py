@@ -0,0 +1,190 @@
+"""
+Reader for OpenFAST linearization files (.lin), see Utilities/ReadFASTLinear.m
+
+The matrices and the descriptor tables are parsed in bulk with numpy.
+The parsed data is cached in a sidecar file (fileName + '.npz') next to the linearization file.
+The cache is invalidated when the modification time or the size of the linearization file changes.
+"""
+import os
+import numpy as np
+
+CACHE_EXT     = '.npz'
+CACHE_VERSION = 1
+
+_SCALARS = ['t','RotSpeed','Azimuth','WindSpeed','n_x','n_xd','n_z','n_u','n_y','n_x2']
+_TABLES  = ['x','xdot','xd','z','u','y']
+
+
+def ReadFASTLinear(fileName, cache=True):
+    """
+    Read an OpenFAST linearization file (.lin)
+
+    INPUTS:
+      - fileName: path to a .lin file
+      - cache: if True, the data is loaded from/saved to a sidecar cache file (fileName + '.npz')
+    OUTPUTS:
+      - data: dictionary with keys: t, RotSpeed, Azimuth, WindSpeed (if present), n_x, n_xd, n_z, n_u, n_y, n_x2
+              x_op, x_desc, x_rotFrame, x_DerivOrder, xdot_op, xdot_desc, u_*, y_*, and the matrices A, B, C, D (if present)
+    """
+    if cache:
+        data = loadLinCache(fileName)
+        if data is not None:
+            return data
+    data = parseLinFile(fileName)
+    if cache:
+        saveLinCache(fileName, data)
+    return data
+
+
+def parseLinFile(fileName):
+    """ Parse an OpenFAST linearization file (.lin), see ReadFASTLinear """
+    with open(fileName, 'r', errors='replace') as f:
+        lines = f.read().splitlines()
+
+    data = dict()
+    data['ver']  = [lines[1], lines[2]]
+    data['desc'] = lines[4]
+    # --- Simulation information
+    i = 7
+    for key in _SCALARS[:-1]:
+        sp = lines[i].split(':')
+        if key=='WindSpeed' and not sp[0].strip().lower().startswith('wind speed'):
+            continue # older files do not have the wind speed
+        data[key] = float(sp[1].split()[0])
+        i += 1
+    for key in ['n_x','n_xd','n_z','n_u','n_y']:
+        data[key] = int(data[key])
+    SetOfMatrices = 2 if lines[i].split('?')[1].find('Yes')>=0 else 1
+    i += 2
+    data['Azimuth'] = np.mod(data['Azimuth'], 2*np.pi)
+
+    # --- Operating points and row/column order
+    data['n_x2'] = 0
+    if data['n_x']>0:
+        i, data['x_op'], data['x_desc'], data['x_rotFrame'], data['x_DerivOrder'] = _readLinTable(lines, i, data['n_x'])
+        i, data['xdot_op'], data['xdot_desc'], _, _ = _readLinTable(lines, i, data['n_x'])
+        if data['x_DerivOrder'][0]==0: # older file without derivOrder columns
+            data['x_DerivOrder'][:] = 2
+            data['n_x2'] = data['n_x']
+        else:
+            data['n_x2'] = int(np.sum(data['x_DerivOrder']==2))
+    if data['n_xd']>0:
+        i, data['xd_op'], data['xd_desc'], _, _ = _readLinTable(lines, i, data['n_xd'])
+    if data['n_z']>0:
+        i, data['z_op'], data['z_desc'], _, _ = _readLinTable(lines, i, data['n_z'])
+    if data['n_u']>0:
+        i, data['u_op'], data['u_desc'], data['u_rotFrame'], _ = _readLinTable(lines, i, data['n_u'])
+    if data['n_y']>0:
+        i, data['y_op'], data['y_desc'], data['y_rotFrame'], _ = _readLinTable(lines, i, data['n_y'])
+
+    # --- Matrices, each block is converted in one call
+    i += 1
+    for iSet in range(SetOfMatrices):
+        i += 2 # matrices description line, and blank line
+        while i<len(lines) and len(lines[i].strip())>0:
+            sp = lines[i].split(':')
+            if len(sp)<2:
+                break
+            name = sp[0].strip()
+            m, n = [int(s) for s in sp[1].lower().split('x')]
+            data[name] = np.array(' '.join(lines[i+1:i+1+m]).split(), dtype=float).reshape(m, n)
+            i += m+1
+        i += 1
+    return data
+
+
+def _readLinTable(lines, i, n):
+    """ Read a table of operating points and descriptions, starting at line i """
+    hasDerivOrder = lines[i+1].find('Derivative Order')>=0
+    rows = lines[i+3:i+3+n]
+    nSplit = 4 if hasDerivOrder else 3
+    sp = [l.split(None, nSplit) for l in rows]
+    # Orientation lines have three comma separated operating point values
+    IOrient = [k for k,s in enumerate(sp) if s[1].endswith(',')]
+    for k in IOrient:
+        sp[k] = rows[k].split(None, nSplit+2)
+    op = [float(s[1]) for s in sp]
+    for k in IOrient:
+        op[k] = np.array([float(sp[k][1][:-1]), float(sp[k][2][:-1]), float(sp[k][3])])
+        sp[k] = sp[k][2:]
+    RF   = np.array([s[2]=='T' for s in sp], dtype=bool)
+    desc = [s[-1].strip() if len(s)>nSplit else '' for s in sp]
+    if hasDerivOrder:
+        DerivOrd = np.array([s[3] for s in sp], dtype=int)
+    else:
+        DerivOrd = np.zeros(n, dtype=int) # older files don't have the DerivOrd column
+    return i+3+n+1, op, desc, RF, DerivOrd
+
+
+# --------------------------------------------------------------------------------}
+# --- Cache
+# --------------------------------------------------------------------------------{
+def cacheFileName(fileName):
+    return fileName + CACHE_EXT
+
+
+def _fileKey(fileName):
+    """ Cache key: cache version, modification time and size of the linearization file """
+    st = os.stat(fileName)
+    return np.array([CACHE_VERSION, st.st_mtime_ns, st.st_size], dtype=np.int64)
+
+
+def saveLinCache(fileName, data):
+    """ Save linearization data to the sidecar cache file. Failures (e.g. read-only folder) are ignored. """
+    # NOTE: scalars and header strings are packed, since each member of the npz file has an overhead on loading
+    arrays = dict()
+    arrays['_key']    = _fileKey(fileName)
+    arrays['text']    = np.array(data['ver']+[data['desc']], dtype=str)
+    arrays['scalars'] = np.array([data.get(k, np.nan) for k in _SCALARS], dtype=float)
+    for t in _TABLES:
+        if t+'_op' not in data:
+            continue
+        op = data[t+'_op']
+        # Operating points are stored as (n x 3) with a flag for orientation rows
+        arrays[t+'_op']        = np.array([np.resize(np.atleast_1d(v).astype(float),3) for v in op]).reshape(-1,3)
+        arrays[t+'_op_orient'] = np.array([np.size(v)>1 for v in op], dtype=bool)
+        arrays[t+'_desc']      = np.array(data[t+'_desc'], dtype=str)
+        for k in ['_rotFrame','_DerivOrder']:
+            if t+k in data:
+                arrays[t+k] = np.asarray(data[t+k])
+    for k,v in data.items():
+        if isinstance(v, np.ndarray) and v.ndim==2 and not k.endswith('_op'):
+            arrays['M_'+k] = v # matrices
+    try:
+        np.savez(cacheFileName(fileName), **arrays)
+    except OSError:
+        pass
+
+
+def loadLinCache(fileName):
+    """ Load linearization data from the sidecar cache file, returns None if the cache is missing or outdated. """
+    cacheFile = cacheFileName(fileName)
+    if not os.path.exists(cacheFile):
+        return None
+    try:
+        with np.load(cacheFile) as npz:
+            if not np.array_equal(npz['_key'], _fileKey(fileName)):
+                return None
+            arrays = {k:npz[k] for k in npz.files}
+    except (OSError, ValueError, KeyError):
+        return None
+    data = dict()
+    text = arrays['text'].tolist()
+    data['ver']  = text[:2]
+    data['desc'] = text[2]
+    for k, v in zip(_SCALARS, arrays['scalars']):
+        if not np.isnan(v):
+            data[k] = int(v) if k.startswith('n_') else float(v)
+    for t in _TABLES:
+        if t+'_op' not in arrays:
+            continue
+        op, orient = arrays[t+'_op'], arrays[t+'_op_orient']
+        data[t+'_op']   = [op[j].copy() if orient[j] else op[j,0] for j in range(len(op))]
+        data[t+'_desc'] = arrays[t+'_desc'].tolist()
+        for k in ['_rotFrame','_DerivOrder']:
+            if t+k in arrays:
+                data[t+k] = arrays[t+k]
+    for k in arrays.keys():
+        if k.startswith('M_'):
+            data[k[2:]] = arrays[k]
+    return data
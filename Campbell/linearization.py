@@ -1,5 +1,6 @@
 
 import os
+import glob
 import pandas as pd
 import numpy as np
 from pandas import ExcelFile
@@ -12,12 +13,68 @@ except:
         from welib.fastlib import fastlib
     except:
         pass
+# Python MBC and Campbell data
+try:
+    from .campbellData import postproLinearization, CampbellDataStream, readCampbellNPZ, extractModes, findLinFiles
+except ImportError:
+    from campbellData import postproLinearization, CampbellDataStream, readCampbellNPZ, extractModes, findLinFiles
+# Parallel and resumable execution of the simulations
+try:
+    from .fastJobs import runFASTJobs, outputFiles, _readKeys
+except ImportError:
+    from fastJobs import runFASTJobs, outputFiles, _readKeys
+# Warm-started sweep
+try:
+    from .warmStart import sweepChains, sweepStartTimes, runWarmStartSweep
+except ImportError:
+    from warmStart import sweepChains, sweepStartTimes, runWarmStartSweep
+# Adaptive start times from pilot simulations
+try:
+    from .steadyState import adaptiveStartTimes
+except ImportError:
+    from steadyState import adaptiveStartTimes
+# Adaptive azimuth sampling
+try:
+    from .azimuthSampling import azimuthLevels, newPhases, azimuthConvergence, appendLinFiles, trimLinFiles
+except ImportError:
+    from azimuthSampling import azimuthLevels, newPhases, azimuthConvergence, appendLinFiles, trimLinFiles
+# Adaptive refinement of the operating points
+try:
+    from .opRefinement import refineIntervals, refinedCases
+    from .modeTracking import trackedCampbell
+except ImportError:
+    from opRefinement import refineIntervals, refinedCases
+    from modeTracking import trackedCampbell
+# Eigenvalue sensitivities
+try:
+    from .sensitivity import operatingPointsSensitivity
+except ImportError:
+    from sensitivity import operatingPointsSensitivity
+# Participation-based mode identification
+try:
+    from .modeIdentification import autoIdentifyModes
+except ImportError:
+    from modeIdentification import autoIdentifyModes
+# Cache of generated input files
+try:
+    from . import inputsCache
+    from .fastJobs import inputFiles
+    from .fastInputFile import readInputFile
+    from .deckWriter import writeCases
+except ImportError:
+    import inputsCache
+    from fastJobs import inputFiles
+    from fastInputFile import readInputFile
+    from deckWriter import writeCases
 
 def campbell(caseFile, mainFst, tStart, nPerPeriod, workDir, toolboxDir, matlabExe, fastExe,  
-             baseDict=None, generateInputs=True, runFast=True, runMBC=True, prefix='',sortedSuffix=None, ylim=None):
+             baseDict=None, generateInputs=True, runFast=True, runMBC=True, prefix='',sortedSuffix=None, ylim=None,
+             mbcEngine='python', nCores=None, streaming=False, writePartial=True, partialInterval=60, identification='regex', eigOpts=None,
+             warmStart=False, tStartWarm=None, adaptiveTStart=False, steadyTol=0.01,
+             adaptiveAzimuth=False, azimuthTol=1e-3, refineOP=False, refineIter=3):
     """ 
     Wrapper function to perform a Campbell diagram study
-       see: writeFASTLinInputs, matlabMBC, and postproMBC for more description of inputs.
+       see: writeFASTLinInputs, pythonMBC, matlabMBC, and postproMBC for more description of inputs.
 
     INPUTS:
       - caseFile     pandas DataFrame with WS, RPM, Pitch, and potentially gen torque and tower top FA
@@ -30,9 +87,40 @@ def campbell(caseFile, mainFst, tStart, nPerPeriod, workDir, toolboxDir, matlabE
       - matlabExe    path the matlab or octave exe
       - prefix:     strings such that the output files will looked like: [folder prefix ]
       - sortedSuffix use a separate file where IDs have been sorted
-      - runFast      Logical to specify whether to run the simulations or not
+      - runFast      Logical to specify whether to run the simulations or not.
+                     Simulations whose linearization files are up to date are skipped, failed ones are retried (see fastJobs.runFASTJobs)
+      - nCores       Number of simulations run concurrently. Default: number of cores of the machine
+      - mbcEngine    'python' (MBC performed in this process) or 'matlab' (uses matlabExe and toolboxDir)
+      - streaming    If True (python mbcEngine only), the MBC of each operating point is performed as soon as its
+                     simulation is done, while the other simulations run. The final tables are written once all the
+                     operating points are processed.
+      - writePartial If True (streaming only), the tables of the operating points processed so far are also written during
+                     the sweep, at most every partialInterval seconds (see campbellData.CampbellDataStream)
+      - identification  'regex' (modes identified from state descriptions, see identifyModes, and read from csv files)
+                     or 'participation' (modes identified from the participation of the states, see modeIdentification,
+                     no csv files are written, mbcEngine and streaming are ignored)
+      - eigOpts      Options for a sparse eigenanalysis of the lowest modes only (python mbcEngine, regex identification),
+                     e.g. {'nModes':20} or {'fmax':5}, see mbc3.eiganalysisSparse. Useful for large models (e.g. with BeamDyn)
+      - warmStart    If True, the cases are sorted by wind speed and run in chains (nCores chains at most), each case
+                     starting from the state of the previous case of its chain, see warmStart.py
+      - tStartWarm   tStart of the warm-started cases (default: tStart/4), the first case of each chain uses tStart
+      - adaptiveTStart If True, a pilot simulation of each case is run (in workDir/_pilot) up to tStart, and the
+                     linearization starts as soon as the outputs are periodic within steadyTol, see steadyState.py.
+                     tStart is then the maximum start time (tStartWarm is ignored).
+      - adaptiveAzimuth If True, nPerPeriod is the maximum number of azimuths, the azimuths are refined from 6 per
+                     revolution until the averaged MBC matrix converges within azimuthTol, see adaptiveAzimuthLinearization
+                     (warmStart is ignored, the simulations are run even if runFast is False).
+      - refineOP     If True, operating points are added to the case file where modes cross, vary quickly or are lost
+                     (at most refineIter refinements), see refineCampbellCases. The refined case file is written to workDir.
     """
+    if refineOP:
+        caseFile, _ = refineCampbellCases(caseFile, mainFst, workDir, fastExe, nIter=refineIter, nCores=nCores,
+                prefix=prefix, nPerPeriod=nPerPeriod, baseDict=baseDict, tStart=tStart)
     Cases=pd.read_csv(caseFile); Cases.rename(columns=lambda x: x.strip(), inplace=True)
+    fastfiles=None
+    chains=None
+    if warmStart:
+        chains = sweepChains(Cases['WindSpeed_[m/s]'].values, nChains=nCores)
 
     # --- Generating input files
     if generateInputs:
@@ -43,18 +131,53 @@ def campbell(caseFile, mainFst, tStart, nPerPeriod, workDir, toolboxDir, matlabE
             TT = None
         #GenTorq = Cases['GenTrq_[kNm]'] # TODO
         # Generate input files
-        fastfiles= writeFASTLinInputs(mainFst, workDir, WS, RPM, Pitch, TT=TT, nPerPeriod=nPerPeriod, baseDict=baseDict, tStart=tStart, prefix=prefix)
+        if adaptiveTStart:
+            pilots = writeFASTLinInputs(mainFst, os.path.join(workDir,'_pilot'), WS, RPM, Pitch, TT=TT, nPerPeriod=1, baseDict=baseDict, tStart=tStart, prefix=prefix)
+            tStart = adaptiveStartTimes(pilots, RPM, fastExe, tMax=tStart, tol=steadyTol, nCores=nCores)
+        elif warmStart:
+            tStart = sweepStartTimes(chains, tStart, tStartWarm)
+        if adaptiveAzimuth:
+            fastfiles, _ = adaptiveAzimuthLinearization(mainFst, workDir, WS, RPM, Pitch, fastExe, TT=TT, nPerPeriod=nPerPeriod,
+                    tol=azimuthTol, nCores=nCores, baseDict=baseDict, tStart=tStart, prefix=prefix)
+            chains = None
+        else:
+            fastfiles= writeFASTLinInputs(mainFst, workDir, WS, RPM, Pitch, TT=TT, nPerPeriod=nPerPeriod, baseDict=baseDict, tStart=tStart, prefix=prefix)
         # Create a batch script (optional)
         fastlib.writeBatch(os.path.join(workDir,'_RUN_ALL.bat'),fastfiles,fastExe=fastExe)
 
     # --- Run the simulations
+    participation = identification.lower()=='participation'
+    streaming = streaming and runFast and runMBC and mbcEngine.lower()=='python' and not participation
     if runFast:
-        fastlib.run_fastfiles(fastfiles, fastExe=fastExe, parallel=True, showOutputs=True, nCores=3)
+        if fastfiles is None:
+            fastfiles = sorted(glob.glob(os.path.join(workDir, prefix+'*.fst')))
+        if warmStart and len(fastfiles)!=len(Cases):
+            print('[WARN] The number of fst files does not match the case file, the cases are not warm-started.')
+            chains = None
+        def runJobs(callback=None):
+            if chains is not None:
+                runWarmStartSweep(fastfiles, chains, fastExe, callback=callback)
+            else:
+                runFASTJobs(fastfiles, fastExe, nCores=nCores, callback=callback)
+        if streaming:
+            stream = CampbellDataStream(workDir, _operatingPoints(caseFile, fastfiles), prefix=prefix, eigOpts=eigOpts,
+                    writePartial=writePartial, partialInterval=partialInterval)
+            runJobs(callback=stream.add)
+            stream.finalize()
+            print('[ OK ] Python MBC ran successfully')
+        else:
+            runJobs()
 
     # --- Postprocess linearization outputs (MBC + modes ID)
-    if runMBC:
-        outBase = matlabMBC(caseFile, workDir, toolboxDir, matlabExe, prefix=prefix)
-    OP, Freq, Damp, UnMapped, _ = postproMBC(csvBase=os.path.join(workDir,prefix), sortedSuffix=sortedSuffix)
+    if participation:
+        OP, Freq, Damp, UnMapped, _ = autoIdentifyModes(workDir, _operatingPoints(caseFile, fastfiles))
+    else:
+        if runMBC and not streaming:
+            if mbcEngine.lower()=='matlab':
+                outBase = matlabMBC(caseFile, workDir, toolboxDir, matlabExe, prefix=prefix)
+            else:
+                outBase = pythonMBC(caseFile, workDir, prefix=prefix, fastfiles=fastfiles, eigOpts=eigOpts)
+        OP, Freq, Damp, UnMapped, _ = postproMBC(csvBase=os.path.join(workDir,prefix), sortedSuffix=sortedSuffix)
 
     # ---  Plot Campbell
     fig, axes = plotCampbell(OP, Freq, Damp, sx='WS_[m/s]', UnMapped=UnMapped, ylim=ylim)
@@ -66,7 +189,7 @@ def campbell(caseFile, mainFst, tStart, nPerPeriod, workDir, toolboxDir, matlabE
 def writeFASTLinInputs(main_fst, workDir, WS, RPM, Pitch, TT=None, 
         nPerPeriod=36, baseDict=None, tStart=100,
         LinInputs=0, LinOutputs=0,
-        prefix='', suffix=''):
+        prefix='', suffix='', cache=True, linPhases=None):
     """
     Write FAST inputs files for linearization, to a given directory `workDir`.
 
@@ -75,7 +198,7 @@ def writeFASTLinInputs(main_fst, workDir, WS, RPM, Pitch, TT=None,
       - main_fst: path to an existing  .fst file
                   This file (and the ones it refers to) will be used as templates.
                   Values of the templates can be modified using `baseDict`.
-                  The parent directory of the main fst file will be copied to `workDir`.
+                  The parent directory of the main fst file will be copied to `workDir` (see deckWriter).
       - workDir: directory (will be created) where the simulation files will be generated
 
       - operating conditions: (1d arrays, all of the same size)
@@ -87,12 +210,16 @@ def writeFASTLinInputs(main_fst, workDir, WS, RPM, Pitch, TT=None,
       - baseDict : a dictionary of inputs files keys to be applied to all simulations
                    Ignored if not provided.
                    e.g. baseDict={'DT':0.01, 'EDFile|ShftTilt':-5, 'InflowFile|PLexp':0.0}
-                   see templateReplaceGeneral.
-      - tStart: time at which the linearization will start. 
+                   see deckWriter.
+      - tStart: time at which the linearization will start (scalar, or array with one value per case).
                 When triming option is not available, this needs to be sufficiently large for
                 the rotor to reach an equilibrium
       - LinInputs:  linearize wrt. inputs (see OpenFAST documentation). {0,1,2, default:1}
       - LinOutputs: linearize wrt. outputs (see OpenFAST documentation). {0,1, default:0}
+      - linPhases: fractions of a revolution (in [0,1)) at which the linearizations are done, e.g. [0.25, 0.75].
+                   If provided, overrides nPerPeriod.
+      - cache: if True, cases whose parameters and template files have not changed since the last call are not
+               rewritten (their modification times are preserved), see inputsCache.
 
     OUTPUTS:
        - list of fst files created
@@ -102,9 +229,10 @@ def writeFASTLinInputs(main_fst, workDir, WS, RPM, Pitch, TT=None,
         TT= [0]*len(WS)
     if baseDict is None:
         baseDict=dict()
+    tStarts = np.broadcast_to(np.asarray(tStart, dtype=float), (len(WS),))
 
     # --- Checking main fst file
-    fst = fastlib.FASTInFile(main_fst)
+    fst = readInputFile(main_fst)
     hasTrim = 'TrimCase' in fst.keys()
     if fst['CompServo']==1:
         print('[WARN] For now linearization is done without controller.')
@@ -112,7 +240,7 @@ def writeFASTLinInputs(main_fst, workDir, WS, RPM, Pitch, TT=None,
 
     # --- Generating list of parameters that vary based on the operating conditions provided
     PARAMS     = []
-    for i,(ws,rpm,pitch,tt) in enumerate(zip(WS,RPM,Pitch,TT)):
+    for i,(ws,rpm,pitch,tt,tStart) in enumerate(zip(WS,RPM,Pitch,TT,tStarts)):
         # Determine linearization times based on RPM and nPerPeriod
         Omega = rpm/60*2*np.pi
         if abs(Omega)<0.001:
@@ -120,7 +248,10 @@ def writeFASTLinInputs(main_fst, workDir, WS, RPM, Pitch, TT=None,
             Tmax     = tStart+1
         else:
             T = 2*np.pi/Omega
-            LinTimes = np.linspace(tStart,tStart+T,nPerPeriod+1)[:-1]
+            if linPhases is not None:
+                LinTimes = tStart + np.asarray(linPhases)*T
+            else:
+                LinTimes = np.linspace(tStart,tStart+T,nPerPeriod+1)[:-1]
             Tmax       = tStart+1.01*T
         # --- Creating "linDict", dictionary of changes to fast input files for linearization
         linDict=dict()
@@ -177,11 +308,213 @@ def writeFASTLinInputs(main_fst, workDir, WS, RPM, Pitch, TT=None,
 
     # --- Generating all files in a workDir
     refDir   = os.path.dirname(main_fst)
-    main_file = os.path.basename(main_fst)
-    fastfiles = fastlib.templateReplace(PARAMS,refDir,workDir=workDir,RemoveRefSubFiles=True,main_file=main_file)
-
+    if not cache:
+        return writeCases(main_fst, PARAMS, workDir)
+
+    # --- Reusing unchanged cases, only the new or modified ones are written
+    tplHash  = inputsCache.templateHash(refDir, excludeDir=workDir)
+    manifest = inputsCache.loadManifest(workDir)
+    hashes    = [inputsCache.caseHash(p, tplHash) for p in PARAMS]
+    fastfiles = [inputsCache.cachedCase(manifest, workDir, p['__name__'], h) for p,h in zip(PARAMS,hashes)]
+    IWrite    = [i for i,f in enumerate(fastfiles) if f is None]
+    print('Input files: {} cases unchanged, {} cases written'.format(len(PARAMS)-len(IWrite), len(IWrite)))
+    if len(IWrite)>0:
+        # The template folder is copied again to workDir, the times of files rewritten with the same content are restored
+        snap = inputsCache.snapshotCopies(refDir, workDir)
+        newfiles = writeCases(main_fst, [PARAMS[i] for i in IWrite], workDir)
+        inputsCache.restoreTimes(snap)
+        for i,f in zip(IWrite, newfiles):
+            fastfiles[i] = f
+            inputsCache.addCase(manifest, workDir, PARAMS[i]['__name__'], hashes[i], inputFiles(f, recursive=False))
+        inputsCache.saveManifest(workDir, manifest)
     return fastfiles
 
+def adaptiveAzimuthLinearization(main_fst, workDir, WS, RPM, Pitch, fastExe, TT=None, nPerPeriod=36, n0=6, tol=1e-3,
+        nCores=None, prefix='', **kwargs):
+    """
+    Linearizations with adaptive azimuth sampling, see azimuthSampling.py.
+    The cases are linearized at n0 azimuths, then the azimuths are refined on nested grids up to nPerPeriod, for the
+    cases whose azimuth-averaged MBC state matrix or eigenvalues change by more than `tol` between two grids.
+    The extra linearizations of each grid are run in a subfolder of workDir (e.g. `_az12`).
+
+    Each extra grid is a new simulation of the cases that have not converged, including the spin-up from 0 to tStart:
+    the refinement saves linearizations, not simulated time. For a case refined up to the last grid, the simulated
+    time is about (number of grids) x tStart instead of tStart, so the adaptive sampling is only worth it when
+    tStart is short compared to the cost of the linearizations (e.g. start times from steadyState.adaptiveStartTimes).
+    The spin-up is not restarted from an OpenFAST checkpoint since a restart keeps the linearization times of the
+    checkpointed simulation. The simulated times are printed at the end.
+
+    The linearization files of the extra grids are numbered after the ones of the previous grids (see
+    azimuthSampling.appendLinFiles), so base.<k>.lin are not in azimuth order. The MBC uses the azimuth stored in
+    each file, so the azimuth averages are not affected.
+
+    INPUTS:
+      - main_fst, workDir, WS, RPM, Pitch, TT, prefix: see writeFASTLinInputs
+      - fastExe, nCores: see fastJobs.runFASTJobs
+      - nPerPeriod: maximum number of azimuths (a multiple of n0)
+      - n0: initial number of azimuths
+      - tol: tolerance on the relative changes of the averaged matrix and of the eigenvalues
+      - kwargs: other arguments of writeFASTLinInputs (e.g. baseDict, tStart)
+    OUTPUTS:
+      - fastfiles: list of fst files created (the linearization files of all the azimuths are base.*.lin)
+      - nAzimuth: number of azimuths of each case
+    """
+    WS, RPM, Pitch = np.asarray(WS), np.asarray(RPM), np.asarray(Pitch)
+    TT = np.zeros(len(WS)) if TT is None else np.asarray(TT)
+    kwargs = dict(kwargs)
+    tStarts = np.broadcast_to(np.asarray(kwargs.pop('tStart', 100), dtype=float), (len(WS),))
+    levels = azimuthLevels(nPerPeriod, n0)
+    fastfiles = writeFASTLinInputs(main_fst, workDir, WS, RPM, Pitch, TT=TT, nPerPeriod=levels[0], tStart=tStarts, prefix=prefix, **kwargs)
+    runFASTJobs(fastfiles, fastExe, nCores=nCores)
+    tSim = [_simulatedTime(fastfiles), 0, 0] # total, of the extra grids, spin-up of the extra grids
+    nAzimuth = np.array([levels[0] if abs(rpm)>0.001 else 1 for rpm in RPM])
+    active   = [i for i,rpm in enumerate(RPM) if abs(rpm)>0.001] # a case at standstill has one linearization
+    for nPrev, n in zip(levels[:-1], levels[1:]):
+        if len(active)==0:
+            break
+        levelDir   = os.path.join(workDir, '_az{:02d}'.format(n))
+        levelFiles = writeFASTLinInputs(main_fst, levelDir, WS[active], RPM[active], Pitch[active], TT=TT[active],
+                tStart=tStarts[active], prefix=prefix, linPhases=newPhases(n, nPrev), **kwargs)
+        runFASTJobs(levelFiles, fastExe, nCores=nCores)
+        tLevel = _simulatedTime(levelFiles)
+        tSim = [tSim[0]+tLevel, tSim[1]+tLevel, tSim[2]+np.sum(tStarts[active])]
+        converged = []
+        for i, f in zip(active, levelFiles):
+            if not all([os.path.exists(lf) for lf in outputFiles(f)]):
+                print('[WARN] Linearizations with {} azimuths failed for case: {}'.format(n, fastfiles[i]))
+                converged.append(i)
+                continue
+            nAzimuth[i] = appendLinFiles(fastfiles[i], f, nPrev)
+            dA, dEig = azimuthConvergence(_linFiles(fastfiles[i], nAzimuth[i]), nPrev)
+            print('Azimuths: {:3d} dA={:.1e} dEig={:.1e} {}'.format(n, dA, dEig, os.path.basename(fastfiles[i])))
+            if dA<tol and dEig<tol:
+                converged.append(i)
+        active = [i for i in active if i not in converged]
+    for f, n in zip(fastfiles, nAzimuth):
+        trimLinFiles(f, n)
+    print('Azimuths per case: {}'.format(', '.join([str(n) for n in nAzimuth])))
+    print('Simulated time: {:.0f}s, extra grids: {:.0f}s, including {:.0f}s of spin-up'.format(*tSim))
+    return fastfiles, nAzimuth
+
+def _simulatedTime(fastfiles):
+    """ Sum of the simulation lengths (TMax) of fst files """
+    return np.sum([float(_readKeys(f, ['TMax']).get('TMax', 0)) for f in fastfiles])
+
+def refineCampbellCases(caseFile, mainFst, workDir, fastExe, nIter=3, nCores=None, prefix='', refineOpts=None, **kwargs):
+    """
+    Adaptive refinement of the operating points, see opRefinement.py.
+    The cases are linearized and the modes are tracked between operating points, then operating points are added
+    in the wind speed intervals where modes cross, vary quickly or are lost. This is repeated at most nIter times.
+
+    INPUTS:
+      - caseFile: initial (coarse) case file, see campbell
+      - mainFst, workDir, prefix, kwargs (e.g. tStart, nPerPeriod, baseDict): see writeFASTLinInputs
+      - fastExe, nCores: see fastJobs.runFASTJobs
+      - refineOpts: dictionary of options for opRefinement.refineIntervals (e.g. {'gradTol':0.1, 'minDWS':0.5})
+    OUTPUTS:
+      - refinedFile: case file with all the operating points, written in workDir.
+                     Cases without linearization files before the last iteration (failed simulations) are removed.
+      - fastfiles: fst files of all the operating points (sorted by wind speed)
+    """
+    refineOpts = dict() if refineOpts is None else refineOpts
+    wsCol = 'WindSpeed_[m/s]'
+    Cases = pd.read_csv(caseFile); Cases.rename(columns=lambda x: x.strip(), inplace=True)
+    Cases = Cases.sort_values(wsCol, kind='stable').reset_index(drop=True)
+    for it in range(nIter+1):
+        WS, RPM, Pitch = Cases[wsCol].values, Cases['Omega_[RPM]'].values, Cases['Pitch_[deg]'].values
+        TT = Cases['TTDispFA_[m]'].values if 'TTDispFA_[m]' in Cases.columns else None
+        fastfiles = writeFASTLinInputs(mainFst, workDir, WS, RPM, Pitch, TT=TT, prefix=prefix, **kwargs)
+        runFASTJobs(fastfiles, fastExe, nCores=nCores)
+        if it==nIter:
+            break
+        # Failed cases are skipped by trackedCampbell: they are removed such that WS and Track are aligned
+        ok = np.array([len(findLinFiles(os.path.splitext(f)[0].replace('\\','/'), verbose=False))>0 for f in fastfiles], dtype=bool)
+        for f in np.asarray(fastfiles)[~ok]:
+            print('[WARN] No linearization files, case removed from the refinement: {}'.format(f))
+        Cases     = Cases[ok].reset_index(drop=True)
+        fastfiles = [f for f, b in zip(fastfiles, ok) if b]
+        WS        = WS[ok]
+        _, _, _, Track = trackedCampbell(workDir, {'Fullpath':fastfiles, 'WindSpeed':WS})
+        I, reasons = refineIntervals(WS, Track, **refineOpts)
+        for i, r in zip(I, reasons):
+            print('Refining: WS {:5.2f} - {:5.2f} ({})'.format(WS[i], WS[i+1], r))
+        Cases, nNew = refinedCases(Cases, I, wsCol=wsCol)
+        if nNew==0:
+            break
+        print('[INFO] Refinement {}: {} operating points added, {} in total'.format(it+1, nNew, len(Cases)))
+    refinedFile = os.path.join(workDir, prefix+'Cases_refined.csv')
+    Cases.to_csv(refinedFile, index=False)
+    return refinedFile, fastfiles
+
+def sensitivityCampbell(caseFile, mainFst, workDir, fastExe, params, baseDict=None, central=False, nCores=None, prefix='', **kwargs):
+    """
+    Sensitivities of the Campbell diagram to model parameters, see sensitivity.py.
+    The baseline cases are linearized in workDir, and the cases with perturbed parameters in subfolders of workDir
+    (`_sens01p`, `_sens01m`, ...). Use sensitivity.predictCampbell or sensitivity.parameterSweep for predictions.
+
+    INPUTS:
+      - caseFile, mainFst, workDir, prefix, kwargs (e.g. tStart, nPerPeriod): see campbell and writeFASTLinInputs
+      - fastExe, nCores: see fastJobs.runFASTJobs
+      - params: dictionary {key: (baseline value, step)}, keys as in baseDict, e.g. {'EDFile|ShftTilt':(-5, 0.5)}
+      - baseDict: baseline changes to the input files, see writeFASTLinInputs
+      - central: if True, central differences are used (two perturbed runs per parameter instead of one)
+    OUTPUTS:
+      - Sens: see sensitivity.operatingPointsSensitivity (includes the baseline OP, Freq and Damp dataframes)
+    """
+    baseDict = dict() if baseDict is None else dict(baseDict)
+    Cases = pd.read_csv(caseFile); Cases.rename(columns=lambda x: x.strip(), inplace=True)
+    Cases = Cases.sort_values('WindSpeed_[m/s]', kind='stable').reset_index(drop=True)
+    WS, RPM, Pitch = Cases['WindSpeed_[m/s]'].values, Cases['Omega_[RPM]'].values, Cases['Pitch_[deg]'].values
+    TT = Cases['TTDispFA_[m]'].values if 'TTDispFA_[m]' in Cases.columns else None
+    def linearize(folder, bd):
+        fastfiles = writeFASTLinInputs(mainFst, folder, WS, RPM, Pitch, TT=TT, baseDict=bd, prefix=prefix, **kwargs)
+        runFASTJobs(fastfiles, fastExe, nCores=nCores)
+        return fastfiles
+    for k, (v0, _) in params.items():
+        baseDict[k] = v0
+    fastfiles0 = linearize(workDir, baseDict)
+    fastfilesP, fastfilesM, steps = dict(), dict(), dict()
+    for j, (k, (v0, step)) in enumerate(params.items()):
+        steps[k] = step
+        fastfilesP[k] = linearize(os.path.join(workDir, '_sens{:02d}p'.format(j+1)), dict(baseDict, **{k:v0+step}))
+        if central:
+            fastfilesM[k] = linearize(os.path.join(workDir, '_sens{:02d}m'.format(j+1)), dict(baseDict, **{k:v0-step}))
+    return operatingPointsSensitivity(fastfiles0, fastfilesP, steps, fastfilesM, WS=WS)
+
+def _linFiles(fstFile, n):
+    """ Linearization files base.1.lin .. base.n.lin """
+    base = os.path.splitext(fstFile)[0]
+    return ['{}.{:d}.lin'.format(base, k) for k in range(1, n+1)]
+
+def pythonMBC(caseFile, workDir, outputFormat='csv', prefix='', fastfiles=None, eigOpts=None):
+    """ 
+    Perform the MBC and the mode identification in python (see campbellData.py), without calling matlab.
+    Generates the same set of csv files as `matlabMBC`.
+
+    INPUTS:
+      - caseFile  : operating point files, with columns such as WindSpeed RotorSpeed and Filename
+      - workDir   : directory where .lin files are to be found
+      - prefix:     strings such that the output files will looked like: [folder prefix ]
+      - fastfiles : list of fst files (e.g. as returned by writeFASTLinInputs). 
+                    If provided, the filenames are not determined from the caseFile.
+      - eigOpts   : options for a sparse eigenanalysis of the lowest modes only, see campbellData.getCampbellData
+    """
+    OP = _operatingPoints(caseFile, fastfiles)
+    postproLinearization(workDir, OP, outputFormat=outputFormat, prefix=prefix, eigOpts=eigOpts)
+    outBase = os.path.join(workDir,prefix+'Campbell_')
+    print('[ OK ] Python MBC ran successfully')
+    return outBase
+
+def _operatingPoints(caseFile, fastfiles=None):
+    """ Operating points for postproLinearization: the caseFile, or a dictionary if the fst files are known """
+    if fastfiles is None:
+        return caseFile
+    OP = {'Fullpath':fastfiles}
+    Cases=pd.read_csv(caseFile); Cases.rename(columns=lambda x: x.strip(), inplace=True)
+    if 'WindSpeed_[m/s]' in Cases.columns and len(Cases)==len(fastfiles):
+        OP['WindSpeed'] = Cases['WindSpeed_[m/s]'].values
+    return OP
+
 def matlabMBC(caseFile, workDir, toolboxDir, matlabExe, outputFormat='csv', prefix=''):
     """ 
     Run the matlab script `campbellFolderPostPro` located in the matlab-toolbox.
@@ -223,7 +556,7 @@ def matlabMBC(caseFile, workDir, toolboxDir, matlabExe, outputFormat='csv', pref
     print('[ OK ] Matlab command ran successfully')
     return outBase
 
-def postproMBC(xlsFile=None, csvBase=None, sortedSuffix=None, csvModesID=None, xlssheet=None):
+def postproMBC(xlsFile=None, csvBase=None, sortedSuffix=None, csvModesID=None, xlssheet=None, npzFile=None):
     """ 
     Generate Cambell diagram data from an xls file, or a set of csv files
     INPUTS:
@@ -235,6 +568,10 @@ def postproMBC(xlsFile=None, csvBase=None, sortedSuffix=None, csvModesID=None, x
              - csvBase + 'CampbellPointI.csv' I=1..n_Op
       - sortedSuffix: when present, the following file will be read instead of the 'ModesID' mentioned above
              - csvBase + 'CampbellModesID' + sortedSuffix + '.csv'
+            If the file csvBase + 'Campbell.npz' exists and is not older than the csv files, it is read instead
+            of the OP and Point csv files (see npzFile)
+      - npzFile: path to a single file containing all the Campbell data (see campbellData.modesData2NPZ).
+            The modes identification is read from this file, unless sortedSuffix or csvModesID is provided.
     OUTPUTS:
         - Freq: dataframe with columns [WS, RPM, Freq_Mode1,.., Freq_ModeN] for the N identified modes
         - Damp: dataframe with columns [WS, RPM, Damp_Mode1,.., Damp_ModeN] (damping ratios), for the N identified modes
@@ -245,6 +582,16 @@ def postproMBC(xlsFile=None, csvBase=None, sortedSuffix=None, csvModesID=None, x
     if sortedSuffix is None:
         sortedSuffix=''
 
+    ModeData=None
+    if xlsFile is None and npzFile is None and csvBase is not None:
+        # --- Use the single binary file when it is up to date
+        npzFile = csvBase+'Campbell.npz'
+        OPFileName = csvBase+'Campbell_OP.csv'
+        if not os.path.exists(npzFile):
+            npzFile = None
+        elif os.path.exists(OPFileName) and os.path.getmtime(OPFileName)>os.path.getmtime(npzFile):
+            npzFile = None
+
     if xlsFile is not None:
         # --- Excel file reading
         OPFileName=xlsFile;
@@ -286,6 +633,21 @@ def postproMBC(xlsFile=None, csvBase=None, sortedSuffix=None, csvModesID=None, x
                     pass
             if i not in Points.keys():
                 raise Exception('Couldnf find sheet for operating point {:d}'.format(i))
+    elif npzFile is not None:
+        # --- Single binary file reading, all operating points in one go
+        R   = readCampbellNPZ(npzFile)
+        WS  = R['WS']
+        RPM = R['RPM']
+        ModeData = [{'Fnat':R['Fnat'][i,:n], 'Fdmp':R['Fdmp'][i,:n], 'Damps':R['Damps'][i,:n]} for i,n in enumerate(R['nModes'])]
+        OPFileName = npzFile
+        IDFileName = npzFile
+        if csvModesID is not None or len(sortedSuffix)>0:
+            IDFileName = csvModesID if csvModesID is not None else npzFile[:-len('Campbell.npz')]+'Campbell_ModesID'+sortedSuffix+'.csv'
+            ID = pd.read_csv(IDFileName, sep = ',',header=None)
+        else:
+            ID        = None
+            ModeNames = np.array([n if len(n)>0 else 'Unknown' for n in R['ModeNames']], dtype=object)
+            ModeIDs   = R['ModeIDs']
     else:
         # --- csv file reading
         if csvModesID is not None:
@@ -309,9 +671,10 @@ def postproMBC(xlsFile=None, csvBase=None, sortedSuffix=None, csvModesID=None, x
             #print(OPFile, WS[i], RPM[i])
             Points[i] = pd.read_csv(OPFile, sep = ',', header=None)
     # --- Mode Identification
-    ID.iloc[:,0].fillna('Unknown', inplace=True) # replace nan
-    ModeNames = ID.iloc[2: ,0].values
-    ModeIDs   = ID.iloc[2: ,1:].values
+    if ID is not None:
+        ID.iloc[:,0].fillna('Unknown', inplace=True) # replace nan
+        ModeNames = ID.iloc[2: ,0].values
+        ModeIDs   = ID.iloc[2: ,1:].values
     nModesIDd = len(ModeNames) 
 
     if ModeIDs.shape[1]!=len(WS):
@@ -319,16 +682,17 @@ def postproMBC(xlsFile=None, csvBase=None, sortedSuffix=None, csvModesID=None, x
         raise Exception('Inconsistent number of operating points between OP ({} points) and ID ({} points) data.\nOP filename: {}\nID filename: {}\n'.format(ModeIDs.shape[1], len(WS), OPFileName, IDFileName))
 
     # --- Extract Frequencies and Damping from Point table
-    ModeData=[]
-    ioff=0
-    coff=0
-    for i,ws in enumerate(WS):
-        P = Points[i]
-        opData = dict()
-        opData['Fnat']  = P.iloc[1+ioff, 1::5+coff].values[:].astype(float) # natural frequencies
-        opData['Fdmp']  = P.iloc[2+ioff, 1::5+coff].values[:].astype(float) # damped frequencies
-        opData['Damps'] = P.iloc[3+ioff, 1::5+coff].values[:].astype(float) # Damping values
-        ModeData.append(opData)
+    if ModeData is None:
+        ModeData=[]
+        ioff=0
+        coff=0
+        for i,ws in enumerate(WS):
+            P = Points[i]
+            opData = dict()
+            opData['Fnat']  = P.iloc[1+ioff, 1::5+coff].values[:].astype(float) # natural frequencies
+            opData['Fdmp']  = P.iloc[2+ioff, 1::5+coff].values[:].astype(float) # damped frequencies
+            opData['Damps'] = P.iloc[3+ioff, 1::5+coff].values[:].astype(float) # Damping values
+            ModeData.append(opData)
 
     # --- Creating a cleaner table of operating points
     OP = pd.DataFrame(np.nan, index=np.arange(len(WS)), columns=['WS_[m/s]', 'RotSpeed_[rpm]'])
@@ -338,72 +702,8 @@ def postproMBC(xlsFile=None, csvBase=None, sortedSuffix=None, csvModesID=None, x
     #print(RPM)
     #print(OP.shape)
 
-    UnMapped_WS   = []
-    UnMapped_RPM  = []
-    UnMapped_Freq = []
-    UnMapped_Damp = []
-    # --- Unidentified modes, before "nModes"
-    for iOP,(ws,rpm) in enumerate(zip(WS,RPM)):
-        m = ModeData[iOP]
-        nModesMax = len(m['Fnat'])
-        nModes = min(nModesMax, nModesIDd) # somehow sometimes we have 15 modes IDd but only 14 in the ModeData..
-        Indices = (np.asarray(ModeIDs[:,iOP])-1).astype(int)
-        IndicesMissing = [i for i in np.arange(nModes) if i not in Indices]
-        f   = np.asarray([m['Fnat'] [iiMode] for iiMode in IndicesMissing])
-        d   = np.asarray([m['Damps'][iiMode] for iiMode in IndicesMissing])
-        ws  = np.asarray([ws]*len(f))
-        rpm = np.asarray([rpm]*len(f))
-        UnMapped_Freq = np.concatenate((UnMapped_Freq, f))
-        UnMapped_Damp = np.concatenate((UnMapped_Damp, d))
-        UnMapped_WS   = np.concatenate((UnMapped_WS, ws))
-        UnMapped_RPM  = np.concatenate((UnMapped_RPM, rpm))
-    # --- Unidentified modes, beyond "nModes"
-    for m,ws,rpm in zip(ModeData,WS,RPM):
-        f   = m['Fnat'][nModesIDd:]
-        d   = m['Damps'][nModesIDd:]
-        ws  = np.asarray([ws]*len(f))
-        rpm = np.asarray([rpm]*len(f))
-        UnMapped_Freq = np.concatenate((UnMapped_Freq, f))
-        UnMapped_Damp = np.concatenate((UnMapped_Damp, d))
-        UnMapped_WS   = np.concatenate((UnMapped_WS, ws))
-        UnMapped_RPM  = np.concatenate((UnMapped_RPM, rpm))
-
-    # --- Put identified modes into a more convenient form
-    cols=[ m.split('-')[0].strip().replace(' ','_') for m in ModeNames]
-    cols=[v + str(cols[:i].count(v) + 1) if cols.count(v) > 1 else v for i, v in enumerate(cols)]
-    Freq = pd.DataFrame(np.nan, index=np.arange(len(WS)), columns=cols)
-    Damp = pd.DataFrame(np.nan, index=np.arange(len(WS)), columns=cols)
-    for iMode in np.arange(nModesIDd):
-        ModeIndices = (np.asarray(ModeIDs[iMode,:])-1).astype(int)
-        ModeName= ModeNames[iMode].replace('_',' ')
-        if ModeName.find('(not shown)')>0:
-            f   = np.asarray([m['Fnat'][iiMode]  for m,iiMode in zip(ModeData,ModeIndices) if iiMode>=0 ])
-            d   = np.asarray([m['Damps'][iiMode] for m,iiMode in zip(ModeData,ModeIndices) if iiMode>=0 ])
-            ws  = np.asarray([ws  for ws,iiMode in zip(WS,ModeIndices)   if iiMode>=0 ])
-            rpm = np.asarray([rpm for rpm,iiMode in zip(RPM,ModeIndices) if iiMode>=0 ])
-            UnMapped_Freq = np.concatenate((UnMapped_Freq, f))
-            UnMapped_Damp = np.concatenate((UnMapped_Damp, d))
-            UnMapped_WS   = np.concatenate((UnMapped_WS, ws))
-            UnMapped_RPM  = np.concatenate((UnMapped_RPM, rpm))
-        else:
-            if all(ModeIndices==-1):
-                print('Skipping mode number ',iMode)
-            else:
-                f=np.asarray([m['Fnat'] [iiMode] if iiMode>=0 else np.nan for m,iiMode in zip(ModeData,ModeIndices)])
-                d=np.asarray([m['Damps'][iiMode] if iiMode>=0 else np.nan for m,iiMode in zip(ModeData,ModeIndices)])
-                Freq.iloc[:, iMode]=f
-                Damp.iloc[:, iMode]=d
-    #  Removing modes that are full nan (not_shown ones)
-    # NOTE: damgerous since OP is not part of it anymore
-    # Freq.dropna(how='all',axis=0,inplace=True)
-    # Freq.dropna(how='all',axis=1,inplace=True)
-    # Damp.dropna(how='all',axis=0,inplace=True)
-    # Damp.dropna(how='all',axis=1,inplace=True)
-
-    # --- UnMapped modes into a dataframe
-    M = np.column_stack((UnMapped_WS, UnMapped_RPM, UnMapped_Freq, UnMapped_Damp))
-    UnMapped = pd.DataFrame(data=M, columns=['WS_[m/s]','RotSpeed_[rpm]','Freq_[Hz]','Damping_[-]'])
-
+    # --- Identified and unidentified modes
+    Freq, Damp, UnMapped = extractModes(ModeData, ModeIDs, ModeNames, WS, RPM)
     return OP, Freq, Damp, UnMapped, ModeData
 
 def plotCampbell(OP, Freq, Damp, sx='WS_[m/s]', UnMapped=None, fig=None, axes=None, ylim=None):
@@ -0,0 +1,620 @@
+"""
+Multi-Blade Coordinate transformation (MBC3) and eigenanalysis of OpenFAST linearization files.
+
+Python port of the MATLAB functions:
+   MBC/Source/fx_getMats.m, MBC/Source/fx_mbc3.m, MBC/Source/eiganalysis.m, MBC/Source/findBladeTriplets.m
+
+The linearization files are read with linFile.ReadFASTLinear (see Utilities/ReadFASTLinear.m).
+The MATLAB structures are returned as dictionaries with the same field names.
+Indices are 0-based.
+
+Equation numbers are from this document: https://nwtc.nrel.gov/system/files/MBC3.pdf
+"""
+import re
+import numpy as np
+
+try:
+    from .linFile import ReadFASTLinear
+except ImportError:
+    from linFile import ReadFASTLinear
+
+
+# --------------------------------------------------------------------------------}
+# --- Matrices from linearization files (fx_getMats)
+# --------------------------------------------------------------------------------{
+def findBladeTriplets(rotFrame, Desc, verbose=True):
+    """
+    Find the number of, and indices for, triplets in the rotating frame, see MBC/Source/findBladeTriplets.m
+
+    OUTPUTS:
+      - Triplets: (NTriplets x 3) array of 0-based indices
+      - NTriplets: number of triplets
+    """
+    chkStr = [r'[Bb]lade \d', r'[Bb]lade [Rr]oot \d', r'BD_\d', r'[Bb]\d', r'[Bb]lade\d', r'PitchBearing\d', r'\d']
+    rotFrame = np.array(rotFrame, dtype=bool).copy()
+    Desc     = list(Desc)
+    # hack for ElastoDyn state names (remove unnecessary text in parenthesis)
+    for i in range(len(rotFrame)):
+        ix = Desc[i].find('(internal DOF index = ')
+        if ix>=0:
+            ix2 = Desc[i].find('))')
+            Desc[i] = Desc[i][:ix] + Desc[i][ix2+2:]
+
+    Triplets = []
+    for i in range(len(rotFrame)):
+        if not rotFrame[i]:
+            continue
+        Tmp = -np.ones(3, dtype=int)
+        foundTriplet     = False
+        foundBladeNumber = False
+        for chk in chkStr:
+            match = re.search(chk, Desc[i])
+            if match is None:
+                continue
+            BldNo = match.group(0)
+            k     = int(BldNo[-1])
+            if k<1 or k>3:
+                continue
+            foundBladeNumber = True
+            # create another regular expression to find the exact match on a different blade
+            sp = re.split(re.escape(BldNo), Desc[i])
+            FirstStr     = re.escape(sp[0] + BldNo[:-1]) + '.'
+            checkThisStr = FirstStr + re.escape(sp[1])
+            Tmp[k-1] = i
+            break
+
+        if not foundBladeNumber:
+            raise Exception('Could not find blade number in rotating channel "{}".'.format(Desc[i]))
+
+        # find the other match values
+        for j in range(i+1, len(rotFrame)):
+            if rotFrame[j] and re.search(checkThisStr, Desc[j]) is not None:
+                Num = re.search(FirstStr, Desc[j]).group(0)
+                k = int(Num[-1])
+                Tmp[k-1] = j  # save the indices for the remaining blades
+                if all(Tmp>=0):
+                    foundTriplet = True
+                    Triplets.append(Tmp)
+                    # we'll set rotFrame to false so that we don't have to check the found channels again
+                    rotFrame[Tmp] = False
+                    break
+        if not foundTriplet and verbose:
+            print('Rotating channel "{}" does not form a unique blade triplet. Blade(s) not found: {}'.format(Desc[i], np.where(Tmp<0)[0]+1))
+
+    Triplets = np.array(Triplets, dtype=int).reshape(-1,3)
+    return Triplets, len(Triplets)
+
+
+def getStateOrderingIndx(matData):
+    """
+    Reorder state matrices so that all the second-order module's displacements
+    are first, followed by all the modules' velocities, followed by all of
+    the first-order states.
+    """
+    NumStates  = matData['NumStates']
+    StateOrderingIndx = np.arange(NumStates)
+    lastModName = ''
+    lastModOrd  = 0
+    mod_nDOFs   = 0  # number of DOFs in each module
+    sum_nDOFs2  = 0  # running total of second-order DOFs
+    sum_nDOFs1  = 0  # running total of first-order DOFs
+    indx_start  = 0  # starting index of the modules
+
+    def setIndices(iEnd):
+        nonlocal sum_nDOFs2, sum_nDOFs1
+        if lastModOrd == 2:
+            n = mod_nDOFs//2
+            StateOrderingIndx[indx_start  :indx_start+n] = sum_nDOFs2                    + np.arange(n) # q2 starts at 0
+            StateOrderingIndx[indx_start+n:iEnd        ] = sum_nDOFs2 + matData['ndof2'] + np.arange(n) # q2_dot starts at ndof2
+            sum_nDOFs2 += n
+        else:
+            StateOrderingIndx[indx_start:indx_start+mod_nDOFs] = sum_nDOFs1 + matData['NumStates2'] + np.arange(mod_nDOFs) # q1 starts at NumStates2
+            sum_nDOFs1 += mod_nDOFs
+
+    for i in range(NumStates):
+        modName = matData['DescStates'][i].split()[0] # name of the module whose states we are looking at
+        ModOrd  = matData['StateDerivOrder'][i]
+        if lastModName!=modName or lastModOrd!=ModOrd:
+            # this is the start of a new set of DOFs, so we'll set the indices for the last matrix
+            setIndices(i)
+            # reset for a new module (or new 1st-order states in the same module)
+            mod_nDOFs   = 0
+            indx_start  = i
+            lastModName = modName
+            lastModOrd  = ModOrd
+        mod_nDOFs += 1
+    # repeat for the last module found
+    setIndices(NumStates)
+    return StateOrderingIndx
+
+
+def fx_getMats(FileNames, verbose=True, cache=True):
+    """
+    Read the data written to multiple FAST linear output files (.lin), and
+    concatenate the data from different azimuths into matrices, see MBC/Source/fx_getMats.m
+
+    INPUTS:
+      - FileNames: list of linearization files (one per azimuth)
+      - cache: if True, the linearization files are read from/cached to binary sidecar files (see linFile.py)
+    OUTPUTS:
+      - matData: dictionary containing computations of FAST linear data (matrices are n x n x NAzimStep)
+      - data   : list of raw data read from the FAST linearization files
+    """
+    if isinstance(FileNames, str):
+        FileNames = [FileNames]
+    data = [ReadFASTLinear(f, cache=cache) for f in FileNames]
+    return _getMats(data, verbose=verbose)
+
+
+def _getMats(data, verbose=True):
+    """ Assemble matData from a list of linearization file data (see fx_getMats) """
+    d0 = data[-1]
+    matData = dict()
+    matData['NAzimStep']  = len(data)
+    matData['NumStates']  = d0['n_x']
+    matData['NumStates2'] = d0['n_x2']
+    matData['ndof1']      = matData['NumStates'] - matData['NumStates2'] # number of first-order states = number of first-order DOFs
+    matData['ndof2']      = d0['n_x2']//2 # half the number of second-order states = number of second-order DOFs
+    matData['NumInputs']  = d0['n_u']
+    matData['NumOutputs'] = d0['n_y']
+    nAz = matData['NAzimStep']
+    nx, nu, ny = matData['NumStates'], matData['NumInputs'], matData['NumOutputs']
+
+    # --- Reorder state matrices so that they follow the {q2, q2_dot, q1} format that is assumed in the MBC3 equations.
+    if nx>0:
+        matData['DescStates']      = list(d0['x_desc'])
+        matData['StateDerivOrder'] = np.asarray(d0['x_DerivOrder'])
+        I = getStateOrderingIndx(matData)
+        # keep StateOrderingIndx for applying inverse of MBC3 later (to visualize mode shapes)
+        matData['StateOrderingIndx'] = I
+        x_rotFrame = np.zeros(nx, dtype=bool)
+        x_rotFrame[I] = d0['x_rotFrame']
+        DescStates = ['']*nx
+        for i,j in enumerate(I):
+            DescStates[j] = d0['x_desc'][i]
+        matData['DescStates'] = DescStates
+        StateDerivOrder = np.zeros(nx, dtype=int)
+        StateDerivOrder[I] = d0['x_DerivOrder']
+        matData['StateDerivOrder'] = StateDerivOrder
+    if nu>0:
+        matData['DescCntrlInpt'] = list(d0['u_desc'])
+    if ny>0:
+        matData['DescOutput'] = list(d0['y_desc'])
+
+    # --- Concatenate data from different azimuths into matrices
+    matData['Omega']    = np.array([d['RotSpeed'] for d in data], dtype=float)
+    matData['Azimuth']  = np.array([d['Azimuth'] for d in data], dtype=float)*180/np.pi
+    matData['OmegaDot'] = np.zeros(nAz)
+    if all(['WindSpeed' in d for d in data]):
+        matData['WindSpeed'] = np.array([d['WindSpeed'] for d in data])
+    if nx>0:
+        I = matData['StateOrderingIndx']
+        matData['A']    = np.zeros((nx, nx, nAz))
+        matData['xop']  = np.zeros((nx, nAz))
+        matData['xdop'] = np.zeros((nx, nAz))
+        if nu>0:
+            matData['B'] = np.zeros((nx, nu, nAz))
+        if ny>0:
+            matData['C'] = np.zeros((ny, nx, nAz))
+    if nu>0 and ny>0:
+        matData['D'] = np.zeros((ny, nu, nAz))
+    for iaz, d in enumerate(data):
+        if 'A' in d:
+            matData['A'][np.ix_(I,I,[iaz])] = d['A'][:,:,None]
+        if 'B' in d and 'B' in matData:
+            matData['B'][I,:,iaz] = d['B']
+        if 'C' in d and 'C' in matData:
+            matData['C'][:,I,iaz] = d['C']
+        if 'D' in d and 'D' in matData:
+            matData['D'][:,:,iaz] = d['D']
+        if 'x_op' in d:
+            matData['xop'][I,iaz]  = [np.atleast_1d(v)[0] for v in d['x_op']]
+        if 'xdot_op' in d:
+            matData['xdop'][I,iaz] = [np.atleast_1d(v)[0] for v in d['xdot_op']]
+
+    # --- Find the azimuth-averaged linearized 1st order state matrices
+    for k in ['A','B','C','D']:
+        if k in matData:
+            matData['Avg'+k] = np.mean(matData[k], axis=2)
+    if 'A' in matData:
+        matData['Avgxdop'] = np.mean(matData['xdop'], axis=1)
+        matData['Avgxop']  = np.mean(matData['xop'] , axis=1)
+
+    # --- Rotor speed and acceleration from the states
+    ndof2 = matData['ndof2']
+    foundED = True
+    for i in range(ndof2):
+        if matData['DescStates'][i].find('DOF_GeAz')>=0:
+            matData['Omega']    = matData['xdop'][i,:].copy()
+            matData['OmegaDot'] = matData['xdop'][i+ndof2,:].copy()
+            foundED = True
+            break
+    for i in range(ndof2):
+        if matData['DescStates'][i].find('DOF_DrTr')>=0:
+            # This always comes after DOF_GeAz so let's just add it here
+            matData['Omega']    += matData['xdop'][i,:]
+            matData['OmegaDot'] += matData['xdop'][i+ndof2,:]
+            foundED = True
+            break
+    if not foundED:
+        for i in range(ndof2):
+            if matData['DescStates'][i].find('MBD Gearbox_Rot')>=0:
+                matData['Omega']    = matData['xdop'][i,:].copy()
+                matData['OmegaDot'] = matData['xdop'][i+ndof2,:].copy()
+                break
+
+    # --- Find multi-blade coordinate (MBC) transformation indices
+    # Find the indices for state triplets in the rotating frame (note that we avoid the "first time derivative" states)
+    if ndof2>0:
+        matData['RotTripletIndicesStates2'], matData['n_RotTripletStates2'] = findBladeTriplets(x_rotFrame[:ndof2], matData['DescStates'][:ndof2], verbose=verbose)
+    else:
+        matData['RotTripletIndicesStates2'], matData['n_RotTripletStates2'] = np.zeros((0,3),dtype=int), 0
+    if matData['ndof1']>0:
+        n2 = matData['NumStates2']
+        matData['RotTripletIndicesStates1'], matData['n_RotTripletStates1'] = findBladeTriplets(x_rotFrame[n2:], matData['DescStates'][n2:], verbose=verbose)
+    else:
+        matData['RotTripletIndicesStates1'], matData['n_RotTripletStates1'] = np.zeros((0,3),dtype=int), 0
+    # Find the indices for control input triplets in the rotating frame
+    if nu>0:
+        matData['RotTripletIndicesCntrlInpt'], matData['n_RotTripletInputs'] = findBladeTriplets(data[0]['u_rotFrame'], matData['DescCntrlInpt'], verbose=verbose)
+    else:
+        matData['RotTripletIndicesCntrlInpt'], matData['n_RotTripletInputs'] = np.zeros((0,3),dtype=int), 0
+    # Find the indices for output measurement triplets in the rotating frame
+    if ny>0:
+        matData['RotTripletIndicesOutput'], matData['n_RotTripletOutputs'] = findBladeTriplets(data[0]['y_rotFrame'], matData['DescOutput'], verbose=verbose)
+    else:
+        matData['RotTripletIndicesOutput'], matData['n_RotTripletOutputs'] = np.zeros((0,3),dtype=int), 0
+
+    return matData, data
+
+
+# --------------------------------------------------------------------------------}
+# --- MBC3
+# --------------------------------------------------------------------------------{
+def blkdiag(*Ms):
+    """ Block diagonal matrix from a list of 2d arrays (equivalent of MATLAB blkdiag) """
+    Ms = [np.atleast_2d(M) for M in Ms]
+    n = sum([M.shape[0] for M in Ms])
+    m = sum([M.shape[1] for M in Ms])
+    B = np.zeros((n, m), dtype=np.result_type(*Ms))
+    i = 0; j = 0
+    for M in Ms:
+        B[i:i+M.shape[0], j:j+M.shape[1]] = M
+        i += M.shape[0]; j += M.shape[1]
+    return B
+
+
+def get_tt_inverse(sin_col, cos_col):
+    """ compute the inverse of tt = [ones(3,1), cos_col, sin_col] """
+    c1, c2, c3 = cos_col
+    s1, s2, s3 = sin_col
+    ttv = np.array([[ c2*s3 - s2*c3,  c3*s1 - s3*c1, c1*s2 - s1*c2],
+                    [ s2 - s3      ,  s3 - s1      , s1 - s2      ],
+                    [ c3 - c2      ,  c1 - c3      , c2 - c1      ]]) / (1.5*np.sqrt(3))
+    return ttv
+
+
+def get_new_seq(rot_triplet, ntot):
+    """
+    Create a sequence where the non-rotating values are first, and are then
+    followed by the rotating series with b1, b2, b3 triplets
+    """
+    rot_triplet = np.asarray(rot_triplet, dtype=int).reshape(-1,3)
+    nRotTriplets, nb = rot_triplet.shape
+    if nRotTriplets==0:
+        nb = 0
+    non_rotating = np.ones(ntot, dtype=bool)
+    non_rotating[rot_triplet.ravel()] = False # if they are rotating, set them false
+    new_seq = np.concatenate((np.where(non_rotating)[0], rot_triplet.ravel()))
+    return new_seq, nRotTriplets, nb
+
+
+def fx_mbc3(FileNames, verbose=True, ModeVizFileName=None, eigen=True, eigOpts=None):
+    """
+    Multi-Blade Coordinate Transformation for a turbine with 3-blade rotor, see MBC/Source/fx_mbc3.m
+
+    INPUTS:
+      - FileNames: list of linearization files (one per azimuth)
+      - ModeVizFileName: optional, if provided, the eigenvectors are written to this binary file
+                         for visualization with OpenFAST (.postmbc file)
+      - eigen: if False, the eigenanalysis is not performed (e.g. when done for several operating points at once, see modeTracking)
+      - eigOpts: dictionary of options for a sparse eigenanalysis of the lowest modes only (e.g. {'nModes':20} or {'fmax':5}),
+                 see eiganalysisSparse. If None, all the modes are computed (see eiganalysis)
+    OUTPUTS:
+      - MBC: dictionary with the MBC transformed matrices (A,B,C,D), their azimuth averages, and the eigen solution (eigSol)
+      - matData: data from fx_getMats
+      - FAST_linData: raw data stored in the OpenFAST linearization files
+    """
+    matData, FAST_linData = fx_getMats(FileNames, verbose=verbose)
+    return _mbc3(matData, FAST_linData, verbose=verbose, ModeVizFileName=ModeVizFileName, eigen=eigen, eigOpts=eigOpts)
+
+
+def _mbc3(matData, FAST_linData, verbose=True, ModeVizFileName=None, eigen=True, eigOpts=None):
+    """ MBC3 transformation and eigenanalysis of matData, see fx_mbc3 """
+    MBC = dict()
+    MBC['DescStates']   = matData['DescStates'] # save this for possible campbell_diagram processing later
+    MBC['ndof2']        = matData['ndof2']
+    MBC['ndof1']        = matData['ndof1']
+    MBC['RotSpeed_rpm'] = np.mean(matData['Omega'])*(30/np.pi) # rad/s to rpm
+    if 'WindSpeed' in matData:
+        MBC['WindSpeed'] = np.mean(matData['WindSpeed'])
+
+    ndof2, ndof1 = matData['ndof2'], matData['ndof1']
+    # ---------- Multi-Blade-Coordinate transformation
+    new_seq_dof2, _, nb  = get_new_seq(matData['RotTripletIndicesStates2'], ndof2)
+    new_seq_dof1, _, nb2 = get_new_seq(matData['RotTripletIndicesStates1'], ndof1)
+    new_seq_states = np.concatenate((new_seq_dof2, new_seq_dof2+ndof2, new_seq_dof1+matData['NumStates2']))
+    nb = max(nb, nb2)
+    if nb==0 and verbose:
+        print('*** fx_mbc3: no states were found. Setting number of blades to 0. Skipping MBC3 ***')
+
+    if nb==3:
+        MBC['performedTransformation'] = True
+        nRot2 = matData['n_RotTripletStates2']
+        nRot1 = matData['n_RotTripletStates1']
+        if nRot2*nb > ndof2:
+            raise Exception('**ERROR: the rotating second-order dof exceeds the total num of second-order dof')
+        elif nRot1*nb > ndof1:
+            raise Exception('**ERROR: the rotating first-order dof exceeds the total num of first-order dof')
+        new_seq_inp, _, _ = get_new_seq(matData['RotTripletIndicesCntrlInpt'], matData['NumInputs'])
+        new_seq_out, _, _ = get_new_seq(matData['RotTripletIndicesOutput']   , matData['NumOutputs'])
+
+        n_FixFrameStates2 = ndof2                 - nRot2*nb                           # fixed-frame second-order dof
+        n_FixFrameStates1 = ndof1                 - nRot1*nb                           # fixed-frame first-order dof
+        n_FixFrameInputs  = matData['NumInputs']  - matData['n_RotTripletInputs']*nb   # fixed-frame control inputs
+        n_FixFrameOutputs = matData['NumOutputs'] - matData['n_RotTripletOutputs']*nb  # fixed-frame outputs
+
+        for k in ['A','B','C','D']:
+            if k in matData:
+                MBC[k] = np.zeros(matData[k].shape)
+        Z22 = np.zeros((ndof2, ndof2))
+        Z21 = np.zeros((ndof2, ndof1))
+        Z12 = np.zeros((ndof1, ndof2))
+        for iaz in range(matData['NAzimStep']):
+            # compute azimuth positions of blades
+            az = matData['Azimuth'][iaz]*np.pi/180.0 + 2*np.pi/nb*np.arange(nb) # Eq. 1, azimuth in radians
+            Omega    = matData['Omega'][iaz]
+            OmegaDot = matData['OmegaDot'][iaz]
+            # compute transformation matrices
+            cos_col = np.cos(az)
+            sin_col = np.sin(az)
+            tt  = np.column_stack((np.ones(3), cos_col, sin_col))        # Eq. 9, t_tilde
+            ttv = get_tt_inverse(sin_col, cos_col)                       # inverse of tt
+            tt2 = np.column_stack((np.zeros(3), -sin_col,  cos_col))     # Eq. 16 a, t_tilde_2
+            tt3 = np.column_stack((np.zeros(3), -cos_col, -sin_col))     # Eq. 16 b, t_tilde_3
+
+            T1   = blkdiag(np.eye(n_FixFrameStates2)        , np.kron(np.eye(nRot2), tt )) # Eq. 11 for second-order states only
+            T1v  = blkdiag(np.eye(n_FixFrameStates2)        , np.kron(np.eye(nRot2), ttv)) # inverse of T1
+            T2   = blkdiag(np.zeros((n_FixFrameStates2,)*2) , np.kron(np.eye(nRot2), tt2)) # Eq. 14  for second-order states only
+            T1q  = blkdiag(np.eye(n_FixFrameStates1)        , np.kron(np.eye(nRot1), tt )) # Eq. 11 for first-order states
+            T1qv = blkdiag(np.eye(n_FixFrameStates1)        , np.kron(np.eye(nRot1), ttv)) # inverse of T1q
+            T2q  = blkdiag(np.zeros((n_FixFrameStates1,)*2) , np.kron(np.eye(nRot1), tt2)) # Eq. 14 for first-order states
+            T3   = blkdiag(np.zeros((n_FixFrameStates2,)*2) , np.kron(np.eye(nRot2), tt3)) # Eq. 15
+            T1c  = blkdiag(np.eye(n_FixFrameInputs)         , np.kron(np.eye(matData['n_RotTripletInputs']) , tt )) # Eq. 21
+            T1ov = blkdiag(np.eye(n_FixFrameOutputs)        , np.kron(np.eye(matData['n_RotTripletOutputs']), ttv)) # inverse of Tlo (Eq. 23)
+
+            TT = np.block([[T1         , Z22, Z21],
+                           [Omega*T2   , T1 , Z21],
+                           [Z12        , Z12, T1q]])
+            if 'A' in matData:
+                # Eq. 29
+                TTdot = np.block([[Omega*T2                   , Z22       , Z21       ],
+                                  [Omega**2*T3 + OmegaDot*T2  , 2*Omega*T2, Z21       ],
+                                  [Z12                        , Z12       , Omega*T2q ]])
+                A = matData['A'][np.ix_(new_seq_states, new_seq_states, [iaz])][:,:,0]
+                MBC['A'][np.ix_(new_seq_states, new_seq_states, [iaz])] = (blkdiag(T1v, T1v, T1qv) @ (A @ TT - TTdot))[:,:,None]
+            if 'B' in matData:
+                # Eq. 30
+                B = matData['B'][np.ix_(new_seq_states, new_seq_inp, [iaz])][:,:,0]
+                MBC['B'][np.ix_(new_seq_states, new_seq_inp, [iaz])] = (blkdiag(T1v, T1v, T1qv) @ B @ T1c)[:,:,None]
+            if 'C' in matData:
+                # Eq. 31
+                C = matData['C'][np.ix_(new_seq_out, new_seq_states, [iaz])][:,:,0]
+                MBC['C'][np.ix_(new_seq_out, new_seq_states, [iaz])] = (T1ov @ C @ TT)[:,:,None]
+            if 'D' in matData:
+                # Eq. 32
+                D = matData['D'][np.ix_(new_seq_out, new_seq_inp, [iaz])][:,:,0]
+                MBC['D'][np.ix_(new_seq_out, new_seq_inp, [iaz])] = (T1ov @ D @ T1c)[:,:,None]
+    else:
+        if verbose:
+            print(' fx_mbc3 WARNING: Number of blades is {}, not 3. MBC transformation was not performed.'.format(nb))
+        MBC['performedTransformation'] = False
+        for k in ['A','B','C','D']:
+            if k in matData:
+                MBC[k] = matData[k].copy()
+
+    # ------------- Eigensolution and Azimuth Averages
+    if 'A' in MBC:
+        MBC['AvgA'] = np.mean(MBC['A'], axis=2) # azimuth-average of azimuth-dependent MBC.A matrices
+    if 'A' in MBC and eigen:
+        if eigOpts is not None:
+            MBC['eigSol'], EigenVects_save = eiganalysisSparse(MBC['AvgA'], ndof2, ndof1, verbose=verbose, **eigOpts)
+        else:
+            MBC['eigSol'], EigenVects_save = eiganalysis(MBC['AvgA'], ndof2, ndof1)
+        MBC['EigenVects_save'] = EigenVects_save
+        if ModeVizFileName is not None and len(ModeVizFileName)>0:
+            VTK = formatModesForViz(MBC, matData, nb, EigenVects_save)
+            writeModesForViz(VTK, ModeVizFileName)
+    for k in ['B','C','D']:
+        if k in MBC:
+            MBC['Avg'+k] = np.mean(MBC[k], axis=2)
+
+    return MBC, matData, FAST_linData
+
+
+def eiganalysis(A, ndof2=None, ndof1=None):
+    """
+    Compute eigenvalues and eigenvectors of A, see MBC/Source/eiganalysis.m
+    Only the eigenvalues with positive imaginary part are kept.
+
+    INPUTS:
+      - A: ns x ns matrix (ns = 2*ndof2 + ndof1), the states are assumed to be in order of {q2, q2_dot, q1}
+    OUTPUTS:
+      - mbc: dictionary with keys: Evals, EigenVects, NaturalFrequencies, DampRatios, DampedFrequencies,
+             NumRigidBodyModes, NaturalFreqs_Hz, DampedFreqs_Hz, MagnitudeModes, PhaseModes_deg
+      - EigenVects_save: (ns x nPos), eigenvectors saved for mode-shape visualization
+    """
+    m, ns = A.shape
+    if m!=ns:
+        raise Exception('**ERROR: the state-space matrix is not a square matrix.')
+    if ndof2 is None:
+        ndof1 = 0
+        ndof2 = ns//2
+        if np.mod(ns,2)!=0:
+            raise Exception('**ERROR: the input matrix is not of even order.')
+    elif ndof1 is None:
+        ndof1 = ns - 2*ndof2
+        if ndof1<0:
+            raise Exception('**ERROR: ndof2 must be no larger than half the dimension of the state-space matrix.')
+    elif ns != 2*ndof2 + ndof1:
+        raise Exception('**ERROR: the dimension of the state-space matrix must equal 2*ndof2 + ndof1.')
+    ndof = ndof2 + ndof1
+
+    origEvals, origEigenVects = np.linalg.eig(A)
+    return _eigSol(origEvals, origEigenVects, ndof2, ndof1)
+
+
+def eiganalysisSparse(A, ndof2, ndof1=0, nModes=None, fmax=None, fmin=0, sigma=-0.01, verbose=False):
+    """
+    Compute the lowest eigenvalues and eigenvectors of A with shift-invert ARPACK (scipy.sparse.linalg.eigs),
+    instead of all of them as done by eiganalysis. Intended for large systems (e.g. BeamDyn or SubDyn models).
+    The eigenvalues closest to the shift `sigma` (i.e. the lowest natural frequencies) are computed, and the number of
+    computed eigenvalues is increased until `nModes` modes are found, or until all the modes below `fmax` are found.
+    Falls back to a dense eigenanalysis if scipy is not available, if ARPACK does not converge, or when most eigenvalues
+    are needed.
+
+    INPUTS:
+      - A: ns x ns matrix (ns = 2*ndof2 + ndof1), the states are assumed to be in order of {q2, q2_dot, q1}
+      - nModes: number of modes (eigenvalues with positive imaginary part) to compute
+      - fmax: compute all the modes with a natural frequency below fmax [Hz]
+      - fmin: modes with a natural frequency below fmin [Hz] are discarded
+      - sigma: shift, should not be an eigenvalue of A (A is often singular due to rigid body modes)
+    OUTPUTS:
+      - mbc, EigenVects_save: see eiganalysis
+    """
+    ns = A.shape[0]
+    if nModes is None and fmax is None:
+        raise Exception('**ERROR: nModes or fmax needs to be provided for the sparse eigenanalysis.')
+    try:
+        import scipy.sparse as sp
+        from scipy.sparse.linalg import eigs, ArpackNoConvergence
+    except ImportError:
+        print('[WARN] scipy not available, using dense eigenanalysis.')
+        eigs = None
+    nReq = 2*nModes+4 if nModes is not None else min(40, ns-2)
+    while eigs is not None and nReq < ns-2 and nReq < 0.5*ns:
+        # A sparse matrix is used for the factorization when A is mostly zeros
+        As = sp.csc_matrix(A) if np.count_nonzero(A) < 0.3*A.size else A
+        try:
+            origEvals, origEigenVects = eigs(As, k=nReq, sigma=sigma)
+        except ArpackNoConvergence:
+            print('[WARN] Sparse eigenanalysis did not converge, using dense eigenanalysis.')
+            eigs = None
+            continue
+        wn   = np.abs(origEvals)
+        bPos = (np.imag(origEvals)>0) & (wn>=2*np.pi*fmin)
+        if nModes is not None and np.sum(bPos)>=nModes:
+            break
+        if fmax is not None and np.max(wn) > 2*np.pi*fmax:
+            break
+        nReq = 2*nReq
+    else:
+        if verbose:
+            print('Sparse eigenanalysis: number of eigenvalues requested too large, using dense eigenanalysis.')
+        origEvals, origEigenVects = np.linalg.eig(A)
+        wn = np.abs(origEvals)
+
+    # --- Selecting lowest modes within [fmin, fmax]
+    b = wn >= 2*np.pi*fmin
+    if fmax is not None:
+        b &= wn <= 2*np.pi*fmax
+    if nModes is not None:
+        IPos = np.where(b & (np.imag(origEvals)>0))[0]
+        IPos = IPos[np.argsort(wn[IPos], kind='stable')][nModes:] # modes beyond nModes are discarded
+        b[IPos] = False
+    return _eigSol(origEvals[b], origEigenVects[:,b], ndof2, ndof1)
+
+
+def _eigSol(origEvals, origEigenVects, ndof2, ndof1):
+    """ Eigen solution dictionary from unsorted eigenvalues and eigenvectors, see eiganalysis """
+    ns   = 2*ndof2 + ndof1
+    ndof = ndof2 + ndof1
+    # these eigenvalues aren't sorted, so we just take the ones with
+    # positive imaginary parts to get the pairs for modes with damping < 1:
+    positiveImagEvals = np.where(np.imag(origEvals)>0)[0]
+    IStates = np.concatenate((np.arange(ndof2), np.arange(2*ndof2, ns))) # save q2 and q1, throw away q2_dot
+
+    mbc = dict()
+    mbc['Evals']       = origEvals[positiveImagEvals]
+    mbc['EigenVects']  = origEigenVects[np.ix_(IStates, positiveImagEvals)]
+    EigenVects_save    = origEigenVects[:, positiveImagEvals] # save these for VTK visualization
+
+    real_Evals = np.real(mbc['Evals'])
+    imag_Evals = np.imag(mbc['Evals'])
+    mbc['NaturalFrequencies'] = np.sqrt(real_Evals**2 + imag_Evals**2)
+    mbc['DampRatios']         = -real_Evals / mbc['NaturalFrequencies']
+    mbc['DampedFrequencies']  = imag_Evals
+    mbc['NumRigidBodyModes']  = ndof - len(positiveImagEvals)
+    mbc['NaturalFreqs_Hz']    = mbc['NaturalFrequencies']/(2*np.pi)
+    mbc['DampedFreqs_Hz']     = mbc['DampedFrequencies'] /(2*np.pi)
+    mbc['MagnitudeModes']     = np.abs(mbc['EigenVects'])
+    mbc['PhaseModes_deg']     = np.angle(mbc['EigenVects'])*180/np.pi
+    return mbc, EigenVects_save
+
+
+# --------------------------------------------------------------------------------}
+# --- Mode shapes for visualization
+# --------------------------------------------------------------------------------{
+def formatModesForViz(MBC, matData, nb, EigenVects_save):
+    """ Get data required for VTK visualization (inverse MBC3 of the eigenvectors) """
+    nAzimuth = len(matData['Azimuth'])
+    SortedFreqIndx = np.argsort(MBC['eigSol']['NaturalFreqs_Hz'], kind='stable')
+    # put these in order of natural frequency
+    VTK = dict()
+    VTK['NaturalFreq_Hz'] = MBC['eigSol']['NaturalFreqs_Hz'][SortedFreqIndx]
+    VTK['DampedFreq_Hz']  = MBC['eigSol']['DampedFreqs_Hz'][SortedFreqIndx]
+    VTK['DampingRatio']   = MBC['eigSol']['DampRatios'][SortedFreqIndx]
+    x_eig = EigenVects_save[:, SortedFreqIndx] # nStates x nModes
+    # Adopt a convention such that the real part of the first state is positive (arbitrary)
+    S = np.sign(np.real(x_eig[0,:]))
+    x_eig = S * x_eig
+    VTK['x_eig'] = np.repeat(x_eig[:,:,None], nAzimuth, axis=2)
+
+    if MBC['performedTransformation']:
+        # inverse MBC3 (Eq. 4, to move from collective, sine, cosine back to blade 1, blade 2, blade 3)
+        dof1_offset = MBC['ndof2']*2
+        for iaz in range(nAzimuth):
+            az = matData['Azimuth'][iaz]*np.pi/180.0 + 2*np.pi/nb*np.arange(nb) # Eq. 1, azimuth in radians
+            tt = np.column_stack((np.ones(3), np.cos(az), np.sin(az)))          # Eq. 9, t_tilde
+            # MBC on second order states
+            for i3x in matData['RotTripletIndicesStates2']:
+                i3xdot = i3x + MBC['ndof2']
+                VTK['x_eig'][i3x   , :, iaz] = tt @ x_eig[i3x   , :]
+                VTK['x_eig'][i3xdot, :, iaz] = tt @ x_eig[i3xdot, :]
+            # MBC on first order states
+            for i3 in matData['RotTripletIndicesStates1']:
+                i3x = i3 + dof1_offset
+                VTK['x_eig'][i3x, :, iaz] = tt @ x_eig[i3x, :]
+    # put this in order states are stored in FAST
+    I = matData['StateOrderingIndx']
+    VTK['x_desc']          = [MBC['DescStates'][i] for i in I]
+    VTK['x_eig']           = VTK['x_eig'][I,:,:]        # nStates x nModes x nAzimuth
+    VTK['x_eig_magnitude'] = np.abs(VTK['x_eig'])       # nStates x nModes x nAzimuth
+    VTK['x_eig_phase']     = np.angle(VTK['x_eig'])     # nStates x nModes x nAzimuth
+    return VTK
+
+
+def writeModesForViz(VTK, ModeVizFileName):
+    """ Write binary file that will be read by OpenFAST to export modes to VTK (.postmbc file) """
+    nStates, nModes, nLinTimes = VTK['x_eig_magnitude'].shape
+    with open(ModeVizFileName, 'wb') as f:
+        np.array([1, nModes, nStates, nLinTimes], dtype=np.int32).tofile(f) # file identifier, number of modes, states and azimuths
+        # Freq and damping (not used in the FAST visualization algorithm)
+        np.asarray(VTK['NaturalFreq_Hz'], dtype=np.float64).tofile(f)
+        np.asarray(VTK['DampingRatio']  , dtype=np.float64).tofile(f)
+        np.asarray(VTK['DampedFreq_Hz'] , dtype=np.float64).tofile(f)
+        # Writing data mode by mode (column-major, as done by MATLAB)
+        for iMode in range(nModes):
+            VTK['x_eig_magnitude'][:,iMode,:].astype(np.float64).ravel(order='F').tofile(f)
+            VTK['x_eig_phase'][:,iMode,:].astype(np.float64).ravel(order='F').tofile(f)
+    print('Written:    {}'.format(ModeVizFileName))
@@ -0,0 +1,141 @@
+"""
+Automatic mode identification based on the participation of groups of degrees of freedom in the eigenvectors
+
+Alternative to the regular-expression matching of identifyModes (campbellData.py, identifyModes.m):
+  - the state descriptions are matched once against the patterns of `modesDesc`, giving a (nGroups x nStates) matrix
+  - the participation of each group of states in each mode is computed for all operating points at once
+  - at each operating point, groups are assigned to modes maximizing the total participation
+
+The frequencies and damping of the identified and unidentified modes are returned directly, in the same format as
+postproMBC (linearization.py), without writing intermediate csv files.
+
+Example:
+    OP, Freq, Damp, UnMapped, ModeIDs = autoIdentifyModes('Lin/', 'Lin/Cases.csv')
+    plotCampbell(OP, Freq, Damp, UnMapped=UnMapped)
+"""
+import re
+import numpy as np
+import pandas as pd
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:
+    linear_sum_assignment = None
+
+try:
+    from .campbellData import modesDesc, extractModes
+    from .modeTracking import getAveragedMBC, batchEiganalysis
+except ImportError:
+    from campbellData import modesDesc, extractModes
+    from modeTracking import getAveragedMBC, batchEiganalysis
+
+
+def stateGroups(DescStates, modesDesc=modesDesc):
+    """
+    Boolean matrix (nGroups x nStates), True when a state description matches one of the patterns of a group.
+    The first group (generator DOF) and groups without patterns are left empty, as in identifyModes.
+    """
+    G = np.zeros((len(modesDesc), len(DescStates)), dtype=bool)
+    for g, MD in enumerate(modesDesc):
+        if g==0 or len(MD[1].strip())==0:
+            continue
+        G[g,:] = [any([re.search(exp, desc) is not None for exp in MD[1:]]) for desc in DescStates]
+    return G
+
+
+def groupParticipation(EigenVects, G):
+    """
+    Participation of groups of states in the modes of all operating points.
+    The magnitude of each mode is normalized by its maximum, and the magnitude of each state by its maximum over the
+    modes (the states that "have their max at a mode" in identifyModes contribute the most), such that states
+    of different units (m, rad) are comparable.
+
+    INPUTS:
+      - EigenVects: nOP x nStates x nModes, eigenvectors (NaN for padded modes), see batchEiganalysis
+      - G: nGroups x nStates, see stateGroups
+    OUTPUTS:
+      - Part: nOP x nGroups x nModes, fraction of each mode in each group of states
+    """
+    def normalize(M, axis):
+        Max = np.max(M, axis=axis, keepdims=True)
+        return np.divide(M, Max, out=np.zeros_like(M), where=Max>0)
+    Mag = np.abs(np.nan_to_num(EigenVects))
+    Mag = normalize(normalize(Mag, axis=1), axis=2)**2
+    Tot = np.sum(Mag, axis=1, keepdims=True)
+    W   = np.divide(Mag, Tot, out=np.zeros_like(Mag), where=Tot>0)
+    return np.einsum('gs,osm->ogm', G.astype(float), W)
+
+
+def assignModes(Part, Freqs, minPart=0.1, minFreq=0.1, freqPenalty=0.05):
+    """
+    Assign groups to modes at each operating point, maximizing the total participation.
+    When groups have the same participation (e.g. regressive and progressive modes), the first group is
+    assigned to the lowest frequency, as in identifyModes.
+
+    INPUTS:
+      - Part: nOP x nGroups x nModes, see groupParticipation
+      - Freqs: nOP x nModes, natural frequencies [Hz], sorted for each operating point (NaN for padded modes)
+      - minPart: minimum participation for a group to be assigned to a mode
+      - minFreq: modes below this frequency [Hz] are not identified
+      - freqPenalty: penalty on the participation of a mode, proportional to its frequency rank (0 for the first mode,
+                     freqPenalty for the last one), favoring low frequency modes when participations are close
+    OUTPUTS:
+      - ModeIDs: nGroups x nOP, index (1-based) of the mode of each group (0 when not identified)
+    """
+    nOP, nGroups, nModes = Part.shape
+    P = np.where((Freqs>=minFreq)[:,None,:], Part, 0)
+    P[P<minPart] = 0
+    # Preference for low frequency modes (as identifyModes, which looks for modes by increasing frequency),
+    # and, for equal participations, for assigning groups and modes in the same order
+    eps  = 1e-6
+    cost = -P + freqPenalty*np.arange(nModes)[None,None,:]/max(nModes,1)
+    cost -= eps*np.outer(np.arange(nGroups), np.arange(nModes))[None,:,:]/max(nGroups*nModes,1)
+    ModeIDs = np.zeros((nGroups, nOP), dtype=int)
+    for iOP in range(nOP):
+        if linear_sum_assignment is not None:
+            IG, IM = linear_sum_assignment(cost[iOP])
+        else:
+            IG, IM = _greedyAssign(cost[iOP])
+        b = P[iOP, IG, IM]>0
+        ModeIDs[IG[b], iOP] = IM[b]+1
+    return ModeIDs
+
+
+def _greedyAssign(cost):
+    """ Greedy assignment minimizing the cost, when scipy is not available """
+    cost = cost.copy()
+    IG, IM = [], []
+    for k in range(min(cost.shape)):
+        i, j = np.unravel_index(np.argmin(cost), cost.shape)
+        IG.append(i)
+        IM.append(j)
+        cost[i,:] = np.inf
+        cost[:,j] = np.inf
+    return np.array(IG, dtype=int), np.array(IM, dtype=int)
+
+
+def autoIdentifyModes(folder, OP_file_or_dict, minPart=0.1, minFreq=0.1, verbose=False):
+    """
+    MBC, eigenanalysis and participation-based mode identification for a set of operating points
+
+    INPUTS:
+      - folder, OP_file_or_dict: see postproLinearization
+      - minPart, minFreq: see assignModes
+    OUTPUTS:
+      - OP, Freq, Damp, UnMapped: see postproMBC
+      - ModeIDs: nGroups x nOP, see assignModes (groups are the entries of modesDesc)
+    """
+    d = getAveragedMBC(folder, OP_file_or_dict, verbose=verbose)
+    eigSol = batchEiganalysis(d['AvgA'], d['ndof2'], d['ndof1'])
+    G       = stateGroups(d['DescStates'])
+    Part    = groupParticipation(eigSol['EigenVects'], G)
+    ModeIDs = assignModes(Part, eigSol['NaturalFreqs_Hz'], minPart=minPart, minFreq=minFreq)
+
+    # --- Frequencies and damping, same format as postproMBC
+    nValid   = np.sum(eigSol['Valid'], axis=1)
+    ModeData = [{'Fnat' :eigSol['NaturalFreqs_Hz'][i,:n],
+                 'Fdmp' :eigSol['DampedFreqs_Hz'][i,:n],
+                 'Damps':eigSol['DampRatios'][i,:n]} for i,n in enumerate(nValid)]
+    ModeNames = np.array([MD[0] for MD in modesDesc], dtype=object)
+    Freq, Damp, UnMapped = extractModes(ModeData, ModeIDs, ModeNames, d['WS'], d['RPM'])
+    OP = pd.DataFrame({'WS_[m/s]':d['WS'], 'RotSpeed_[rpm]':d['RPM']})
+    return OP, Freq, Damp, UnMapped, ModeIDs
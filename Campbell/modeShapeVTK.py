@@ -0,0 +1,414 @@
+"""
+Mode shape animations (.vtp) written directly from the eigenvectors, without rerunning OpenFAST
+(alternative to writeVizualizationFiles.m and runFASTForVisualization.m)
+
+The eigenvectors of the averaged MBC state matrix (EigenVects_save, see mbc3.eiganalysis) are transformed back to the
+blade coordinates at the azimuth of a linearization (see mbc3.formatModesForViz). The displacement states of the
+ElastoDyn degrees of freedom (recognized from the state descriptions, "internal DOF index = DOF_...") are mapped to
+displacements of the points of reference meshes using a linear kinematic model:
+ - platform DOFs:  rigid translation/rotation of all the meshes about the platform reference point
+ - tower modes:    tower points move with the tower mode shapes, the meshes above the tower top translate and rotate
+                   with the tower top
+ - nacelle yaw:    rotation of the nacelle, hub and blades about the vertical axis through the tower top
+ - generator azimuth and drivetrain torsion: rotation of the hub and blades about the rotor axis
+ - blade modes:    blade points move with the blade mode shapes, out of plane (flap) or in the rotor plane (edge)
+The mode shapes are the polynomials of the ElastoDyn blade and tower files (see edShapes). The displacement field of
+each mesh is computed for all the modes and all the phases with a single matrix product, and each frame is written as
+a binary (appended raw) vtp file, named as the files written by OpenFAST: root.Mode<i>.LinTime1.<mesh>.<frame>.vtp
+such that they can be rendered with the mode shape scripts (see renderModeShapes.py).
+
+The reference meshes are ASCII vtp files written by OpenFAST (e.g. with WrVTK=1, or any frame of a simulation), at the
+azimuth of the first linearization. Only the geometry (points and cells) is kept.
+"""
+import os
+import re
+import numpy as np
+import xml.etree.ElementTree as ET
+
+try:
+    from .mbc3 import fx_mbc3, formatModesForViz
+    from .fastJobs import _readKeys
+    from .campbellData import findLinFiles
+except ImportError:
+    from mbc3 import fx_mbc3, formatModesForViz
+    from fastJobs import _readKeys
+    from campbellData import findLinFiles
+
+# Mode shapes of the NREL 5-MW blade and onshore tower, coefficients of x^2 to x^6, used when no ElastoDyn file is given
+DEFAULT_SHAPES = {
+    'BldFl1Sh': [ 0.0622,   1.7254,  -3.2452,   4.7131,  -2.2555],
+    'BldFl2Sh': [-0.5809,   1.2067, -15.5349,  29.7347, -13.8255],
+    'BldEdgSh': [ 0.3627,   2.5337,  -3.5772,   2.376 ,  -0.6952],
+    'TwFAM1Sh': [ 0.7004,   2.1963,  -5.6202,   6.2275,  -2.504 ],
+    'TwFAM2Sh': [-70.5319, -63.7623, 289.737, -176.513,  22.0706],
+    'TwSSM1Sh': [ 1.385,   -1.7684,   3.0871,  -2.2395,   0.5357],
+    'TwSSM2Sh': [-121.21,  184.415, -224.904,  298.536, -135.838],
+}
+
+_CELL_TYPES = ['Verts', 'Lines', 'Strips', 'Polys']
+
+
+# --------------------------------------------------------------------------------}
+# --- VTK PolyData files
+# --------------------------------------------------------------------------------{
+def readVTP(filename):
+    """
+    Read the geometry of an ASCII vtk PolyData file (as written by OpenFAST)
+
+    OUTPUTS:
+      - mesh: dictionary with keys:
+          points: (nPoints x 3) array
+          cells: dictionary, keys among Verts, Lines, Strips, Polys, values (connectivity, offsets)
+    """
+    piece = ET.parse(filename).getroot().find('PolyData/Piece')
+    if piece is None:
+        raise Exception('Not a vtk PolyData file: {}'.format(filename))
+
+    def data(node):
+        if node.get('format', 'ascii')!='ascii':
+            raise Exception('Only ascii vtp files are supported for the reference meshes: {}'.format(filename))
+        return np.array((node.text or '').split(), dtype=float)
+
+    points = data(piece.find('Points/DataArray')).reshape(-1, 3)
+    cells  = dict()
+    for ct in _CELL_TYPES:
+        node = piece.find(ct)
+        if node is None or int(piece.get('NumberOf'+ct, 0))==0:
+            continue
+        arrays = {a.get('Name'):a for a in node.findall('DataArray')}
+        cells[ct] = (data(arrays['connectivity']).astype(np.int64), data(arrays['offsets']).astype(np.int64))
+    return {'points':points, 'cells':cells}
+
+
+class VTPWriter():
+    """
+    Writer of binary vtk PolyData files (appended raw data) for a mesh with a fixed connectivity.
+    The header and the cells are encoded once, only the points are encoded for each frame.
+    """
+    def __init__(self, nPoints, cells):
+        self.nPoints = nPoints
+        blocks  = []
+        offset  = 3*4*nPoints + 8 # points (Float32), preceded by their size (UInt64)
+        xmlCells = []
+        counts   = []
+        for ct in _CELL_TYPES:
+            if ct not in cells:
+                counts.append('NumberOf{}="0"'.format(ct))
+                continue
+            conn, offs = cells[ct]
+            counts.append('NumberOf{}="{:d}"'.format(ct, len(offs)))
+            arrs = ''
+            for name, a in [('connectivity', conn), ('offsets', offs)]:
+                b = np.asarray(a, dtype='<i8').tobytes()
+                arrs += '        <DataArray type="Int64" Name="{}" format="appended" offset="{:d}"/>\n'.format(name, offset)
+                blocks.append(np.uint64(len(b)).tobytes() + b)
+                offset += 8 + len(b)
+            xmlCells.append('      <{}>\n{}      </{}>\n'.format(ct, arrs, ct))
+        self.header = ('<?xml version="1.0"?>\n'
+            '<VTKFile type="PolyData" version="1.0" byte_order="LittleEndian" header_type="UInt64">\n'
+            '  <PolyData>\n'
+            '    <Piece NumberOfPoints="{:d}" {}>\n'
+            '      <Points>\n'
+            '        <DataArray type="Float32" NumberOfComponents="3" format="appended" offset="0"/>\n'
+            '      </Points>\n'
+            '{}'
+            '    </Piece>\n'
+            '  </PolyData>\n'
+            '  <AppendedData encoding="raw">\n   _').format(nPoints, ' '.join(counts), ''.join(xmlCells)).encode()
+        self.cells  = b''.join(blocks)
+        self.footer = b'\n  </AppendedData>\n</VTKFile>\n'
+
+    def write(self, filename, points):
+        p = np.ascontiguousarray(points, dtype='<f4')
+        with open(filename, 'wb') as f:
+            f.write(self.header)
+            f.write(np.uint64(p.nbytes).tobytes())
+            f.write(p.tobytes())
+            f.write(self.cells)
+            f.write(self.footer)
+
+
+def referenceMeshes(vtkDir, root):
+    """
+    Reference meshes written by OpenFAST in a vtk directory: first frame of each mesh root.<mesh>.<frame>.vtp
+    (the frame may be a number or t<number>). Mode shape files are ignored.
+    OUTPUTS:
+      - refMeshes: dictionary mesh name -> vtp file
+    """
+    pattern = re.compile(r'^' + re.escape(root) + r'\.(?P<mesh>[^.]+)\.t?(?P<frame>\d+)\.vtp$')
+    found = dict()
+    with os.scandir(vtkDir) as it:
+        for entry in it:
+            m = pattern.match(entry.name)
+            if m is None or m.group('mesh').find('DebugError')>=0:
+                continue
+            frame = int(m.group('frame'))
+            if m.group('mesh') not in found or frame<found[m.group('mesh')][0]:
+                found[m.group('mesh')] = (frame, entry.path)
+    if len(found)==0:
+        raise Exception('No reference mesh found with pattern: {}'.format(os.path.join(vtkDir, root+'.<mesh>.<frame>.vtp')))
+    return {mesh:f for mesh, (_, f) in found.items()}
+
+
+# --------------------------------------------------------------------------------}
+# --- Kinematics
+# --------------------------------------------------------------------------------{
+def edShapes(EDFile):
+    """ Mode shape coefficients (x^2 to x^6) of the blade (first blade file) and tower files of an ElastoDyn input file """
+    EDDir = os.path.dirname(os.path.abspath(EDFile))
+    files = _readKeys(EDFile, ['BldFile(1)', 'BldFile1', 'TwrFile'])
+    shapes = dict()
+    for key, names in [('BldFile', ['BldFl1Sh', 'BldFl2Sh', 'BldEdgSh']), ('TwrFile', ['TwFAM1Sh', 'TwFAM2Sh', 'TwSSM1Sh', 'TwSSM2Sh'])]:
+        f = files.get(key, files.get(key+'(1)', files.get(key+'1', None)))
+        if f is None:
+            print('[WARN] {} not found in {}, using default mode shapes'.format(key, EDFile))
+            continue
+        keys = ['{}({:d})'.format(n, i) for n in names for i in range(2,7)]
+        v = _readKeys(os.path.join(EDDir, f), keys)
+        for n in names:
+            try:
+                shapes[n] = [float(v['{}({:d})'.format(n, i)]) for i in range(2,7)]
+            except (KeyError, ValueError):
+                print('[WARN] {} not found in {}, using default mode shape'.format(n, f))
+    return shapes
+
+
+def _poly(c, x):
+    """ Mode shape sum_k c_k x^(k+2), and its derivative """
+    c = np.asarray(c, dtype=float)
+    k = np.arange(2, 7)
+    return (x[:,None]**k) @ c, (k*x[:,None]**(k-1)) @ c
+
+
+def stateDOFs(DescStates):
+    """
+    ElastoDyn degrees of freedom of the displacement states (first time derivatives are excluded)
+    OUTPUTS:
+      - dofs: list of (state index, DOF name), e.g. (5, 'DOF_BF(1,1)')
+    """
+    dofs = []
+    for i, d in enumerate(DescStates):
+        m = re.search(r'internal DOF index = (DOF_[A-Za-z0-9]+(?:\(\d+,\d+\))?)', d)
+        if m is not None and d.find('time derivative')<0:
+            dofs.append((i, m.group(1)))
+    return dofs
+
+
+def _classify(mesh):
+    """ Body of a mesh, from its name: ('blade', b) (b starting at 0), 'tower', 'nacelle', 'hub', 'platform' or None """
+    m = re.search(r'(?:Blade|Bld)\D*(\d+)', mesh)
+    if m is not None:
+        return ('blade', int(m.group(1))-1)
+    for key, body in [('Tower','tower'), ('Twr','tower'), ('Nacelle','nacelle'), ('Hub','hub'), ('Platform','platform'), ('Ptfm','platform')]:
+        if mesh.find(key)>=0:
+            return body
+    return None
+
+
+def _cross(w, r):
+    """ Displacement (nPoints x 3) of points r (nPoints x 3) for a small rotation w (3) """
+    return np.cross(w[None,:], r)
+
+
+def displacementMatrices(meshes, dofs, shapes=None, ptfmRef=(0,0,0)):
+    """
+    Displacement of the points of each mesh for a unit value of each degree of freedom (linear kinematics,
+    see module documentation). The rotor center is the centroid of the hub (or of the blades), the rotor axis is
+    normal to the plane of the blades.
+
+    INPUTS:
+      - meshes: dictionary mesh name -> mesh (see readVTP)
+      - dofs: list of (state index, DOF name), see stateDOFs
+      - shapes: mode shape coefficients, see edShapes. Missing shapes are taken from DEFAULT_SHAPES
+      - ptfmRef: platform reference point (rotations of the platform DOFs)
+    OUTPUTS:
+      - Phi: dictionary mesh name -> (nPoints*3 x nDOFs) array
+    """
+    S = dict(DEFAULT_SHAPES)
+    S.update(shapes or dict())
+    body = {name:_classify(name) for name in meshes.keys()}
+    for name, b in body.items():
+        if b is None:
+            print('[WARN] Unknown body for mesh {}, the mesh will not move'.format(name))
+    P = {name:m['points'] for name, m in meshes.items()}
+    def allPoints(cond):
+        L = [P[n] for n in P.keys() if cond(body[n])]
+        return np.vstack(L) if len(L)>0 else np.zeros((0,3))
+    bladePts = allPoints(lambda b: isinstance(b, tuple))
+    towerPts = allPoints(lambda b: b=='tower')
+    hubPts   = allPoints(lambda b: b=='hub')
+    # --- Geometry
+    if len(towerPts)>0:
+        zBase, zTop = np.min(towerPts[:,2]), np.max(towerPts[:,2])
+        towerTop = np.array([np.mean(towerPts[:,0]), np.mean(towerPts[:,1]), zTop])
+    else:
+        zBase, zTop = 0, 1
+        towerTop = np.zeros(3)
+    center = np.mean(hubPts, axis=0) if len(hubPts)>0 else (np.mean(bladePts, axis=0) if len(bladePts)>0 else towerTop)
+    bladeDir = dict()
+    for name, b in body.items():
+        if isinstance(b, tuple):
+            r = P[name]-center
+            tip = r[np.argmax(np.linalg.norm(r, axis=1))]
+            bladeDir[b[1]] = tip/max(np.linalg.norm(tip), 1e-12)
+    axis = np.array([1.,0.,0.])
+    if len(bladeDir)>=2:
+        u = [bladeDir[k] for k in sorted(bladeDir.keys())]
+        n = np.cross(u[0], u[1])
+        if np.linalg.norm(n)>1e-6:
+            axis = n/np.linalg.norm(n)*np.sign(n[0] if abs(n[0])>1e-12 else 1)
+
+    ex, ey, ez = np.eye(3)
+    Phi = dict()
+    for name, mesh in meshes.items():
+        p  = P[name]
+        b  = body[name]
+        nP = len(p)
+        M  = np.zeros((nP, 3, len(dofs)))
+        Phi[name] = M.reshape(nP*3, len(dofs)) # view of M, filled below
+        if b is None:
+            continue
+        above = b in ['nacelle', 'hub'] or isinstance(b, tuple)
+        rotor = b=='hub' or isinstance(b, tuple)
+        for j, (_, dof) in enumerate(dofs):
+            # --- Platform
+            if dof in ['DOF_Sg','DOF_Sw','DOF_Hv']:
+                M[:,:,j] = {'DOF_Sg':ex, 'DOF_Sw':ey, 'DOF_Hv':ez}[dof]
+            elif dof in ['DOF_R','DOF_P','DOF_Y']:
+                M[:,:,j] = _cross({'DOF_R':ex, 'DOF_P':ey, 'DOF_Y':ez}[dof], p-np.asarray(ptfmRef))
+            # --- Tower
+            elif dof in ['DOF_TFA1','DOF_TFA2','DOF_TSS1','DOF_TSS2']:
+                sh = S[{'DOF_TFA1':'TwFAM1Sh', 'DOF_TFA2':'TwFAM2Sh', 'DOF_TSS1':'TwSSM1Sh', 'DOF_TSS2':'TwSSM2Sh'}[dof]]
+                e  = ex if dof.startswith('DOF_TFA') else ey
+                H  = max(zTop-zBase, 1e-12)
+                if b=='tower':
+                    phi, _ = _poly(sh, np.clip((p[:,2]-zBase)/H, 0, 1))
+                    M[:,:,j] = phi[:,None]*e[None,:]
+                elif above:
+                    phi, dphi = _poly(sh, np.array([1.]))
+                    w = (ey if dof.startswith('DOF_TFA') else -ex)*dphi[0]/H # slope of the tower top
+                    M[:,:,j] = phi[0]*e[None,:] + _cross(w, p-towerTop)
+            # --- Nacelle yaw
+            elif dof=='DOF_Yaw':
+                if above:
+                    M[:,:,j] = _cross(ez, p-towerTop)
+            # --- Rotor azimuth
+            elif dof in ['DOF_GeAz','DOF_DrTr']:
+                if rotor:
+                    M[:,:,j] = _cross(axis, p-center)
+            # --- Blades
+            elif dof.startswith('DOF_BF') or dof.startswith('DOF_BE'):
+                ib, im = [int(s)-1 for s in dof[7:-1].split(',')]
+                if isinstance(b, tuple) and b[1]==ib:
+                    u   = bladeDir[ib]
+                    r   = (p-center) @ u
+                    x   = np.clip((r-np.min(r))/max(np.max(r)-np.min(r), 1e-12), 0, 1)
+                    if dof.startswith('DOF_BF'):
+                        phi, _ = _poly(S['BldFl1Sh'] if im==0 else S['BldFl2Sh'], x)
+                        e = axis
+                    else:
+                        phi, _ = _poly(S['BldEdgSh'], x)
+                        e = np.cross(axis, u)
+                    M[:,:,j] = phi[:,None]*e[None,:]
+            else:
+                print('[WARN] Degree of freedom {} not supported for visualization'.format(dof))
+    return Phi
+
+
+def modeShapeFrames(meshes, DescStates, x_eig, nPhases=24, scale=0.1, shapes=None, ptfmRef=(0,0,0)):
+    """
+    Point positions of the meshes for all the modes and phases
+
+    INPUTS:
+      - meshes: dictionary mesh name -> mesh (see readVTP)
+      - DescStates: description of the states, in the order of the rows of x_eig
+      - x_eig: (nStates x nModes) complex eigenvectors, in blade coordinates (see mbc3.formatModesForViz)
+      - nPhases: number of frames over one period
+      - scale: maximum displacement of each mode, relative to the size of the model
+      - shapes, ptfmRef: see displacementMatrices
+    OUTPUTS:
+      - frames: dictionary mesh name -> (nModes x nPhases x nPoints x 3) array
+    """
+    dofs = stateDOFs(DescStates)
+    if len(dofs)==0:
+        raise Exception('No ElastoDyn degree of freedom found in the state descriptions')
+    Phi  = displacementMatrices(meshes, dofs, shapes=shapes, ptfmRef=ptfmRef)
+    nModes = x_eig.shape[1]
+    # --- All the modes and phases at once: Q (nDOFs x nModes*nPhases)
+    phase = np.exp(1j*2*np.pi*np.arange(nPhases)/nPhases)
+    Xq    = x_eig[[i for i,_ in dofs], :]                                   # nDOFs x nModes
+    Q     = np.real(Xq[:,:,None]*phase[None,None,:]).reshape(len(dofs), -1) # nDOFs x (nModes*nPhases)
+    D     = {name:(Phi[name] @ Q).reshape(-1, 3, nModes, nPhases) for name in meshes.keys()} # nPoints x 3 x nModes x nPhases
+    # --- Scaling: maximum displacement of each mode relative to the size of the model
+    allPts = np.vstack([m['points'] for m in meshes.values()])
+    size   = np.max(np.ptp(allPts, axis=0))
+    dmax   = np.max(np.stack([np.max(np.linalg.norm(d, axis=1), axis=(0,2)) for d in D.values()]), axis=0) # nModes
+    fact   = scale*size/np.where(dmax>0, dmax, 1)
+    return {name:meshes[name]['points'][None,None,:,:] + np.transpose(d*fact[None,None,:,None], (2,3,0,1)) for name, d in D.items()}
+
+
+# --------------------------------------------------------------------------------}
+# --- Driver
+# --------------------------------------------------------------------------------{
+def writeModeShapesVTK(fstFile, refMeshes=None, outDir=None, nModes=15, nPhases=24, scale=0.1, fmin=None, EDFile=None,
+        eigOpts=None, verbose=True):
+    """
+    Write the mode shape animations of a linearized case, from its linearization files
+
+    INPUTS:
+      - fstFile: main OpenFAST file of the case (the files base.1.lin, base.2.lin, ... are used)
+      - refMeshes: dictionary mesh name -> ascii vtp file, or (vtkDir, root), see referenceMeshes.
+                   Default: ('dirname(fstFile)/vtk', base)
+      - outDir: directory of the vtp files. Default: dirname(fstFile)/vtk
+      - nModes: number of modes written (lowest frequencies, above fmin [Hz] if provided)
+      - nPhases, scale: see modeShapeFrames
+      - EDFile: ElastoDyn input file, used for the mode shapes (see edShapes). Default: EDFile of fstFile.
+                DEFAULT_SHAPES are used if the file cannot be read.
+    OUTPUTS:
+      - files: list of vtp files written, modes are numbered as in the MBC (e.g. Mode3 is the third mode, even if
+               the lower modes are not written because of fmin)
+    """
+    base  = os.path.splitext(fstFile)[0]
+    root  = os.path.basename(base)
+    if outDir is None:
+        outDir = os.path.join(os.path.dirname(os.path.abspath(fstFile)), 'vtk')
+    if refMeshes is None:
+        refMeshes = (os.path.join(os.path.dirname(os.path.abspath(fstFile)), 'vtk'), root)
+    if isinstance(refMeshes, tuple):
+        refMeshes = referenceMeshes(*refMeshes)
+    meshes = {name:readVTP(f) for name, f in refMeshes.items()}
+    if EDFile is None:
+        EDFile = _readKeys(fstFile, ['EDFile']).get('EDFile', None)
+        if EDFile is not None:
+            EDFile = os.path.join(os.path.dirname(os.path.abspath(fstFile)), EDFile.replace('\\','/'))
+    try:
+        shapes = edShapes(EDFile) if EDFile is not None else None
+    except OSError:
+        shapes = None
+    if shapes is None:
+        print('[WARN] ElastoDyn file of {} cannot be read, using default mode shapes'.format(fstFile))
+
+    FileNames = findLinFiles(base, verbose=verbose)
+    if len(FileNames)==0:
+        raise Exception('No linearization files found for {}'.format(fstFile))
+    MBC, matData, _ = fx_mbc3(FileNames, verbose=False, eigOpts=eigOpts)
+    VTK = formatModesForViz(MBC, matData, 3, MBC['EigenVects_save']) # 3 blades (only used when the MBC was performed)
+    I   = np.arange(len(VTK['NaturalFreq_Hz']))
+    if fmin is not None:
+        I = I[VTK['NaturalFreq_Hz']>=fmin]
+    I   = I[:nModes]
+    x_eig = VTK['x_eig'][:, I, 0] # modes at the azimuth of the first linearization
+
+    frames = modeShapeFrames(meshes, VTK['x_desc'], x_eig, nPhases=nPhases, scale=scale, shapes=shapes)
+    os.makedirs(outDir, exist_ok=True)
+    files = []
+    for name, F in frames.items():
+        writer = VTPWriter(len(meshes[name]['points']), meshes[name]['cells'])
+        for iMode in range(len(I)):
+            for iPhase in range(nPhases):
+                f = os.path.join(outDir, '{}.Mode{:d}.LinTime1.{}.{:03d}.vtp'.format(root, I[iMode]+1, name, iPhase+1))
+                writer.write(f, F[iMode, iPhase])
+                files.append(f)
+    if verbose:
+        print('Written:    {} mode shape files ({} modes, {} meshes) in {}'.format(len(files), len(I), len(frames), outDir))
+    return files
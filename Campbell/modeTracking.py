@@ -0,0 +1,247 @@
+"""
+Batched eigenanalysis of several operating points and mode tracking based on eigenvectors similarity (MAC)
+
+The azimuth-averaged MBC matrices of all operating points are stacked into one (nOP x n x n) array and solved at once.
+The modes are then followed from one operating point to the next by matching the eigenvectors with the
+Modal Assurance Criterion (MAC), which gives continuous curves for the Campbell diagram, including at mode crossings.
+
+Example:
+    OP, Freq, Damp, Track = trackedCampbell('Lin/', 'Lin/Cases.csv')
+    plotCampbell(OP, Freq, Damp)
+"""
+import os
+import numpy as np
+import pandas as pd
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:
+    linear_sum_assignment = None
+
+try:
+    from .mbc3 import fx_mbc3
+    from .campbellData import getFullFilenamesOP, findLinFiles, PrettyStateDescriptions, replaceModeDescription, _readFASTPar
+except ImportError:
+    from mbc3 import fx_mbc3
+    from campbellData import getFullFilenamesOP, findLinFiles, PrettyStateDescriptions, replaceModeDescription, _readFASTPar
+
+
+# --------------------------------------------------------------------------------}
+# --- Batched eigenanalysis
+# --------------------------------------------------------------------------------{
+def batchEiganalysis(A, ndof2, ndof1=0):
+    """
+    Eigenanalysis of a stack of state matrices, see mbc3.eiganalysis
+    Only the eigenvalues with positive imaginary part are kept. Since their number may differ between operating points,
+    the outputs are padded with NaN, and the modes of each operating point are sorted by natural frequency.
+
+    INPUTS:
+      - A: nOP x ns x ns array (ns = 2*ndof2 + ndof1), the states are assumed to be in order of {q2, q2_dot, q1}
+    OUTPUTS:
+      - eigSol: dictionary with keys (arrays of shape nOP x nModes, except EigenVects nOP x ndof x nModes):
+          Evals, EigenVects, NaturalFreqs_Hz, DampedFreqs_Hz, DampRatios, Valid (False for padded values)
+    """
+    A = np.asarray(A)
+    nOP, m, ns = A.shape
+    if m!=ns:
+        raise Exception('**ERROR: the state-space matrices are not square matrices.')
+    if ns != 2*ndof2 + ndof1:
+        raise Exception('**ERROR: the dimension of the state-space matrices must equal 2*ndof2 + ndof1.')
+    IStates = np.concatenate((np.arange(ndof2), np.arange(2*ndof2, ns))) # save q2 and q1, throw away q2_dot
+
+    origEvals, origEigenVects = np.linalg.eig(A)
+    # --- Keep eigenvalues with positive imaginary parts (moved first, then padded)
+    bPos   = np.imag(origEvals)>0
+    nPos   = np.sum(bPos, axis=1)
+    nModes = np.max(nPos) if nOP>0 else 0
+    IPos   = np.argsort(~bPos, axis=1, kind='stable')[:,:nModes]
+    Valid  = np.arange(nModes)[None,:] < nPos[:,None]
+    Evals  = np.take_along_axis(origEvals, IPos, axis=1)
+    Vects  = np.take_along_axis(origEigenVects, IPos[:,None,:], axis=2)[:,IStates,:]
+    Evals[~Valid] = np.nan
+    Vects[np.broadcast_to(~Valid[:,None,:], Vects.shape)] = np.nan
+    # --- Sort modes by natural frequency
+    Freqs = np.abs(Evals)
+    ISort = np.argsort(np.where(Valid, Freqs, np.inf), axis=1, kind='stable')
+    Evals = np.take_along_axis(Evals, ISort, axis=1)
+    Vects = np.take_along_axis(Vects, ISort[:,None,:], axis=2)
+    Valid = np.take_along_axis(Valid, ISort, axis=1)
+
+    eigSol = dict()
+    eigSol['Evals']           = Evals
+    eigSol['EigenVects']      = Vects
+    eigSol['Valid']           = Valid
+    eigSol['NaturalFreqs_Hz'] = np.abs(Evals)/(2*np.pi)
+    eigSol['DampedFreqs_Hz']  = np.imag(Evals)/(2*np.pi)
+    eigSol['DampRatios']      = -np.real(Evals)/np.abs(Evals)
+    return eigSol
+
+
+# --------------------------------------------------------------------------------}
+# --- Mode tracking
+# --------------------------------------------------------------------------------{
+def MAC(Phi1, Phi2):
+    """
+    Modal Assurance Criterion between the columns of two sets of (complex) mode shapes
+    INPUTS:
+      - Phi1: ndof x n1, Phi2: ndof x n2
+    OUTPUTS:
+      - n1 x n2 matrix, with values between 0 (orthogonal modes) and 1 (colinear modes). NaN modes give 0
+    """
+    Phi1 = np.nan_to_num(Phi1)
+    Phi2 = np.nan_to_num(Phi2)
+    num  = np.abs(Phi1.conj().T @ Phi2)**2
+    n1   = np.sum(np.abs(Phi1)**2, axis=0)
+    n2   = np.sum(np.abs(Phi2)**2, axis=0)
+    den  = n1[:,None]*n2[None,:]
+    return np.divide(num, den, out=np.zeros_like(num), where=den>0)
+
+
+def _assign(cost):
+    """ Assignment of rows to columns minimizing the total cost (nRows <= nCols), returns the column of each row """
+    if linear_sum_assignment is not None:
+        _, ICol = linear_sum_assignment(cost)
+        return ICol
+    # Greedy assignment, when scipy is not available
+    cost = cost.copy()
+    ICol = np.zeros(cost.shape[0], dtype=int)
+    for k in range(cost.shape[0]):
+        i, j = np.unravel_index(np.argmin(cost), cost.shape)
+        ICol[i] = j
+        cost[i,:] = np.inf
+        cost[:,j] = np.inf
+    return ICol
+
+
+def trackModes(eigSol, freqWeight=0.0):
+    """
+    Follow the modes from one operating point to the next based on the MAC of their eigenvectors.
+    The modes of the first operating point define the tracks (sorted by frequency). At each operating point, the modes are
+    assigned to the tracks maximizing the total MAC with the last valid eigenvectors of the tracks.
+
+    INPUTS:
+      - eigSol: see batchEiganalysis (operating points are assumed to be sorted, e.g. by wind speed)
+      - freqWeight: weight of the relative frequency difference added to (1-MAC) in the assignment cost
+    OUTPUTS:
+      - Track: dictionary with keys:
+          - IMode: nOP x nTracks, index of the mode of eigSol of each track at each operating point
+          - MAC: nOP x nTracks, MAC between the mode and the track at the previous operating point (1 at the first one)
+          - NaturalFreqs_Hz, DampedFreqs_Hz, DampRatios, Valid: nOP x nTracks
+          - EigenVects: nOP x ndof x nTracks
+    """
+    Vects = eigSol['EigenVects']
+    Freqs = eigSol['NaturalFreqs_Hz']
+    Valid = eigSol['Valid']
+    nOP, ndof, nModes = Vects.shape
+    IMode = np.zeros((nOP, nModes), dtype=int)
+    MACs  = np.ones((nOP, nModes))
+    IMode[0,:] = np.arange(nModes)
+    RefVects = Vects[0].copy() # last valid eigenvectors of each track
+    RefFreqs = Freqs[0].copy()
+    for iOP in range(1, nOP):
+        M = MAC(RefVects, Vects[iOP])
+        cost = 1-M
+        if freqWeight>0:
+            df = np.abs(RefFreqs[:,None]-Freqs[iOP][None,:])/np.fmax(RefFreqs[:,None], Freqs[iOP][None,:])
+            cost += freqWeight*np.nan_to_num(df, nan=1)
+        ICol = _assign(cost)
+        IMode[iOP,:] = ICol
+        MACs [iOP,:] = M[np.arange(nModes), ICol]
+        bValid = Valid[iOP, ICol]
+        RefVects[:,bValid] = Vects[iOP][:,ICol[bValid]]
+        RefFreqs[bValid]   = Freqs[iOP][ICol[bValid]]
+
+    Track = dict()
+    Track['IMode'] = IMode
+    Track['MAC']   = MACs
+    for k in ['NaturalFreqs_Hz','DampedFreqs_Hz','DampRatios','Valid']:
+        Track[k] = np.take_along_axis(eigSol[k], IMode, axis=1)
+    Track['EigenVects'] = np.take_along_axis(Vects, IMode[:,None,:], axis=2)
+    return Track
+
+
+# --------------------------------------------------------------------------------}
+# --- Campbell diagram with tracked modes
+# --------------------------------------------------------------------------------{
+def getAveragedMBC(folder, OP_file_or_dict, verbose=False):
+    """
+    MBC of each operating point, without eigenanalysis, see mbc3.fx_mbc3
+
+    INPUTS:
+      - folder, OP_file_or_dict: see postproLinearization
+    OUTPUTS:
+      - dictionary with keys:
+          - AvgA: nOP x ns x ns, azimuth-averaged MBC state matrices
+          - WS, RPM: wind speed and rotor speed of each operating point
+          - DescStates: state descriptions (q2 and q1 states), see PrettyStateDescriptions.
+                        The states of all the operating points are the same, in the same order (an exception is raised otherwise)
+          - ndof2, ndof1: number of second and first order states
+          - BladeLen, TowerLen: blade and tower length of the first operating point
+    """
+    FastFiles, OPs = getFullFilenamesOP(folder, OP_file_or_dict)
+    AvgA, WS, RPM, DescStates, ndof, desc0 = [], [], [], None, None, None
+    for iOP, fst in enumerate(FastFiles):
+        FileNames = findLinFiles(os.path.splitext(fst)[0].replace('\\','/'), verbose=verbose)
+        if len(FileNames)==0:
+            print('warning::No linearization data for base {}.  Skipping operating point.'.format(os.path.basename(fst)))
+            continue
+        MBC, _, _ = fx_mbc3(FileNames, verbose=verbose, eigen=False)
+        if ndof is None:
+            ndof  = (MBC['ndof2'], MBC['ndof1'])
+            desc0 = list(MBC['DescStates'])
+            DescStates = PrettyStateDescriptions(MBC['DescStates'], MBC['ndof2'], MBC['performedTransformation'])
+            FP = _readFASTPar(fst, ['EDFile'])
+            EP = _readFASTPar(os.path.join(os.path.dirname(fst), FP['EDFile']), ['TipRad','HubRad','TowerHt'])
+        elif ndof!=(MBC['ndof2'], MBC['ndof1']):
+            raise Exception('Number of states of {} differs from the first operating point.'.format(fst))
+        elif list(MBC['DescStates'])!=desc0:
+            # The matrices are compared (e.g. tracked, interpolated) entry by entry, the states must be in the same order
+            raise Exception('States of {} differ from the first operating point (descriptions or order).'.format(fst))
+        AvgA.append(MBC['AvgA'])
+        WS.append(MBC.get('WindSpeed', OPs['WindSpeed'][iOP] if 'WindSpeed' in OPs else np.nan))
+        RPM.append(MBC['RotSpeed_rpm'])
+    if len(AvgA)==0:
+        raise Exception('No linearization data found in folder: {}'.format(folder))
+    d = dict()
+    d['AvgA']       = np.stack(AvgA)
+    d['WS']         = np.asarray(WS, dtype=float)
+    d['RPM']        = np.asarray(RPM, dtype=float)
+    d['DescStates'] = DescStates
+    d['ndof2']      = ndof[0]
+    d['ndof1']      = ndof[1]
+    d['BladeLen']   = EP['TipRad'] - EP['HubRad']
+    d['TowerLen']   = EP['TowerHt']
+    return d
+
+
+def trackNames(Track, DescStates):
+    """ Name of the tracks, based on their dominant state at the middle operating point """
+    iRef = max(int(np.floor(Track['EigenVects'].shape[0]/2+0.5))-1, 0)
+    IMax = np.argmax(np.nan_to_num(np.abs(Track['EigenVects'][iRef])), axis=0)
+    cols = [replaceModeDescription(DescStates[i]).strip().replace(' ','_') for i in IMax]
+    return [v + str(cols[:i].count(v) + 1) if cols.count(v) > 1 else v for i, v in enumerate(cols)]
+
+
+def trackedCampbell(folder, OP_file_or_dict, freqWeight=0.0, verbose=False):
+    """
+    Campbell diagram data with modes tracked between operating points:
+     MBC of each operating point, batched eigenanalysis of the averaged MBC matrices, and MAC-based mode tracking.
+
+    INPUTS:
+      - folder, OP_file_or_dict: see postproLinearization
+      - freqWeight: see trackModes
+    OUTPUTS:
+      - OP: dataframe with columns [WS_[m/s], RotSpeed_[rpm]]
+      - Freq: dataframe of natural frequencies [Hz], one column per tracked mode, named after its dominant state
+      - Damp: dataframe of damping ratios [-], same columns as Freq
+      - Track: see trackModes, with additional key DescStates
+    """
+    d = getAveragedMBC(folder, OP_file_or_dict, verbose=verbose)
+    eigSol = batchEiganalysis(d['AvgA'], d['ndof2'], d['ndof1'])
+    Track  = trackModes(eigSol, freqWeight=freqWeight)
+    Track['DescStates'] = d['DescStates']
+
+    cols = trackNames(Track, d['DescStates'])
+    OP   = pd.DataFrame({'WS_[m/s]':d['WS'], 'RotSpeed_[rpm]':d['RPM']})
+    Freq = pd.DataFrame(Track['NaturalFreqs_Hz'], columns=cols)
+    Damp = pd.DataFrame(Track['DampRatios'], columns=cols)
+    return OP, Freq, Damp, Track
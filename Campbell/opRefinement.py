@@ -0,0 +1,84 @@
+"""
+Adaptive refinement of the operating points of a Campbell diagram (see linearization.refineCampbellCases)
+
+Starting from a coarse set of operating points, the modes are tracked between operating points (see modeTracking),
+and new operating points are added in the middle of the wind speed intervals where:
+ - two tracked modes swap order (mode crossing)
+ - the frequency of a tracked mode changes more than a tolerance (large gradient)
+ - a mode loses its identity (low MAC with the previous operating point, or mode not found)
+The rotor speed, pitch (and other columns) of the new operating points are interpolated from the case table.
+"""
+import numpy as np
+import pandas as pd
+
+
+def refineIntervals(WS, Track, nModes=15, fmin=0.05, gradTol=0.2, macTol=0.8, minDWS=0.2):
+    """
+    Wind speed intervals that need refinement
+
+    INPUTS:
+      - WS: wind speeds of the operating points, sorted
+      - Track: tracked modes, see modeTracking.trackModes
+      - nModes: number of tracks considered (lowest frequencies at the first operating point, above fmin [Hz])
+      - gradTol: maximum relative change of frequency of a track over an interval
+      - macTol: minimum MAC of a track between two operating points
+      - minDWS: intervals smaller than minDWS are not refined
+    OUTPUTS:
+      - I: indices of the intervals to refine (interval i is between operating point i and i+1)
+      - reasons: list of strings, reason of the refinement of each interval
+    """
+    WS    = np.asarray(WS, dtype=float)
+    F     = Track['NaturalFreqs_Hz']
+    Valid = Track['Valid'] & ~np.isnan(F)
+    # --- Tracks considered
+    F0 = np.where(Valid[0] & (F[0]>=fmin), F[0], np.inf)
+    J  = np.argsort(F0, kind='stable')[:nModes]
+    J  = J[np.isfinite(F0[J])]
+    F, Valid, MAC = F[:,J], Valid[:,J], Track['MAC'][:,J]
+
+    I, reasons = [], []
+    for i in range(len(WS)-1):
+        if WS[i+1]-WS[i] < minDWS:
+            continue
+        r = []
+        b = Valid[i] & Valid[i+1]
+        if np.any(Valid[i]!=Valid[i+1]) or np.any(MAC[i+1,Valid[i+1]] < macTol):
+            r.append('mode lost')
+        fa, fb = F[i,b], F[i+1,b]
+        if np.any(np.sign(fa[:,None]-fa[None,:]) * np.sign(fb[:,None]-fb[None,:]) < 0):
+            r.append('crossing')
+        if np.any(np.abs(fb-fa)/np.maximum(np.abs(fa), np.abs(fb)) > gradTol):
+            r.append('gradient')
+        if len(r)>0:
+            I.append(i)
+            reasons.append(', '.join(r))
+    return I, reasons
+
+
+def refinedCases(Cases, I, wsCol='WindSpeed_[m/s]', resolution=0.1):
+    """
+    Case table with new operating points in the middle of the intervals I (see refineIntervals).
+    The other numerical columns (e.g. rotor speed, pitch) are interpolated linearly from the case table.
+    New wind speeds are rounded to `resolution`, and skipped if already present.
+
+    INPUTS:
+      - Cases: dataframe sorted by wind speed
+    OUTPUTS:
+      - Cases: new dataframe, sorted by wind speed
+      - nNew: number of operating points added
+    """
+    WS  = Cases[wsCol].values.astype(float)
+    new = []
+    for i in I:
+        ws = np.round((WS[i]+WS[i+1])/2/resolution)*resolution
+        if np.any(np.abs(np.concatenate((WS, new))-ws) < resolution/2):
+            continue
+        new.append(ws)
+    if len(new)==0:
+        return Cases, 0
+    New = pd.DataFrame({wsCol:new})
+    for c in Cases.columns:
+        if c!=wsCol and pd.api.types.is_numeric_dtype(Cases[c]):
+            New[c] = np.interp(new, WS, Cases[c].values.astype(float))
+    Cases = pd.concat((Cases, New), ignore_index=True).sort_values(wsCol, kind='stable').reset_index(drop=True)
+    return Cases, len(new)
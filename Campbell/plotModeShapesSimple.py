@@ -1,8 +1,11 @@
 from paraview.simple import * 
 import os 
 import sys
-import glob
 import numpy as np
+try:
+    from .vtkIndex import extractModeNumbers, extractModeInfo
+except ImportError:
+    from vtkIndex import extractModeNumbers, extractModeInfo
 paraview.simple._DisableFirstRenderCameraReset()
 
 if len(sys.argv) not in [2,3]:
@@ -52,72 +55,7 @@ print('OutputDir       : {}'.format(OutputDir))
 # --------------------------------------------------------------------------------}
 # --- Helper functions 
 # --------------------------------------------------------------------------------{
-def extractModeNumbers(rootPath):
-    """ Extract mode numbers based on a simulation directory and simulation basename """
-    rootSim = os.path.basename(rootPath)
-    dirName = os.path.dirname(os.path.abspath(rootPath))
-    absrootMode = os.path.join(dirName, rootSim+'.Mode')
-    pattern = absrootMode+'*.*.vtp'
-    files = glob.glob(pattern)
-    if len(files)==0:
-        raise Exception('No file found with pattern: ',pattern)
-    filesNoRoot=[f[len(absrootMode):] for f in files if f.find('DebugError')<0]
-    modeNumbers=np.sort(np.unique(np.array([f.split('.')[0] for f in filesNoRoot]).astype(int)))
-    return modeNumbers
-
-
-def extractModeInfo(rootPath, iMode):
-    """ 
-
-    dirName/rootSim.Mode5.LinTime1.AD_Blade1.001.vtp
-
-    return 
-     - meshes: list of meshes available
-     - nZeros: number of zeros before extension
-     - nTimes: number of time steps
-     - Suffix: number of time steps
-    """
-    rootSim = os.path.basename(rootPath)
-    dirName = os.path.dirname(os.path.abspath(rootPath))
-    rootMode    = rootSim+'.Mode{:d}.'.format(iMode)           # +Suffix
-    absrootMode = os.path.join(dirName, rootMode)
-    pattern     = absrootMode +'*.vtp'                       ;
-    files       = glob.glob(pattern)
-    print(pattern+' ({})'.format(len(files)))
-    # if len(files)==0:
-    #     continue # Should be an exception really...
-
-    # --- Detect Suffix. If VTKLinTim=2, Suffix='LinTime1.', else Suffix=''
-    filesNoRoot=[f[len(absrootMode):] for f in files if f.find('DebugError')<0]
-    Suffix=''
-    if filesNoRoot[0].startswith('LinTime1'):
-        Suffix='.LinTime1' # TODO consider what to do if we have more lintimes
-        filesNoRoot=[f[9:] for f in filesNoRoot]
-    absrootMode += Suffix
-    rootMode   += Suffix
-
-    # --- Detect Meshes names and number of leading zeros
-    #  Filename has the following structure   Root . MeshName . ZEROS . vtp
-    #  Example:                               Beam . HubSurface . 003 . vtp
-    meshes = set()
-    nZeros = []  # Number of 
-    timeStamps = []  # Numebr of 
-    for f in filesNoRoot:
-        sp = f.split('.')
-        ts = sp[1]
-        timeStamps.append(int(ts))
-        meshes.add(sp[0])
-        nZeros.append(len(sp[1]))
-    nZerosUnique, counts = np.unique(nZeros, return_counts=True)
-    index = np.argmax(counts)
-    nZeros = nZeros[index]
-    nTimes = np.max(timeStamps) # ...
-    if len(nZerosUnique)>1:
-        print('[WARN] Files have different number of leading zeros {}, choosing: {}'.format(nZerosUnique, nZeros))
-    #txt = '{:0' + str(nZeros) + 'd}'
-    #fileLeadingZeros = txt.format(1)
-
-    return meshes, nZeros, nTimes, Suffix
+# extractModeNumbers and extractModeInfo: see vtkIndex.py (index of the VTK directory, cached)
 
 
 def createSplitLayout():
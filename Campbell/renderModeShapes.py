@@ -0,0 +1,291 @@
+"""
+Headless parallel rendering of the mode shape animations of a set of operating points
+
+The VTK outputs of the visualization simulations (see writeVizualizationFiles.m) are indexed once (see vtkIndex),
+giving one series per (case, mode, LinTime): `vtkDir/root.Mode<i>.LinTime<j>.<mesh>.<frame>.vtp`.
+Each series is a rendering job.
+The jobs are distributed to a pool of `pvbatch` workers (see renderModeShapesWorker.py). Each worker loads the
+ParaView state file once, and then only changes the file names of the sources of the state for each job, instead
+of loading the state for each mode as done by plotModeShapes.py. Jobs are sent to the workers as they become free.
+
+Example:
+    renderModeShapes(['Lin/vtk'], 'ED_Surfaces.pvsm', outputDir='Anim', nWorkers=8)
+
+Command line:
+    python renderModeShapes.py STATEFILE VTKDIR [VTKDIR ...] [-o OUTPUTDIR] [-n NWORKERS] [--pvbatch PVBATCH]
+"""
+import os
+import sys
+import json
+import time
+import queue
+import threading
+import subprocess
+
+try:
+    from .vtkIndex import modeShapeIndex, modeShapeFiles
+except ImportError:
+    from vtkIndex import modeShapeIndex, modeShapeFiles
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'renderModeShapesWorker.py')
+
+
+# --------------------------------------------------------------------------------}
+# --- Index of the mode shape series
+# --------------------------------------------------------------------------------{
+def indexModeShapes(vtkDirs):
+    """
+    Index the mode shape series of one or several VTK directories (see vtkIndex.modeShapeIndex)
+
+    INPUTS:
+      - vtkDirs: directory or list of directories containing the vtp files
+    OUTPUTS:
+      - series: list of dictionaries (sorted by directory, root, mode and LinTime), with keys:
+          dir, root, mode, linTime (None if not in the file names), meshes (dictionary mesh -> sorted list of frames)
+    """
+    if isinstance(vtkDirs, str):
+        vtkDirs = [vtkDirs]
+    series = []
+    for vtkDir in sorted([os.path.abspath(d) for d in vtkDirs]):
+        index = modeShapeIndex(vtkDir)
+        for root in sorted(index.keys()):
+            for mode in sorted(index[root].keys()):
+                lins = index[root][mode]
+                for lin in sorted(lins.keys(), key=lambda l: -1 if l is None else l):
+                    meshes = {mesh: modeShapeFiles(vtkDir, root, mode, lin, mesh, frames) for mesh, frames in lins[lin].items()}
+                    series.append({'dir':vtkDir, 'root':root, 'mode':mode, 'linTime':lin, 'meshes':meshes})
+    return series
+
+
+def stateSources(stateFile):
+    """
+    Names of the sources of a ParaView state file
+    Look for: <ProxyCollection name="sources"> and extract source names, e.g.:
+        <Item id="11771" name="Blade1Surface" logname="Root.Mode5.LinTime1.Blade1Surface.00*"/>
+    """
+    names = []
+    with open(stateFile, 'r') as f:
+        inSources = False
+        for line in f:
+            if line.find('ProxyCollection name="sources"')>=0:
+                inSources = True
+            elif inSources and line.find('/ProxyCollection')>=0:
+                break
+            elif inSources and line.find('name="')>=0:
+                names.append(line.split('name="')[1].split('"')[0].strip())
+    return names
+
+
+def matchSources(sourceNames, meshes):
+    """
+    Attribute a mesh to each source of the state file, when the mesh name is contained in the source name.
+    Longer mesh names are matched first (e.g. `Blade1Surface` before `Blade1`).
+    OUTPUTS:
+      - match: dictionary source name -> mesh name (None if no mesh match the source)
+    """
+    match = {sn:None for sn in sourceNames}
+    for mesh in sorted(meshes, key=len, reverse=True):
+        for sn in sourceNames:
+            if match[sn] is None and sn.find(mesh)>=0:
+                match[sn] = mesh
+                break
+    return match
+
+
+def animationFile(s, outputDir=None, multipleLinTimes=False):
+    """ Name of the animation file of a series, e.g. outputDir/root.Mode5.avi """
+    if outputDir is None:
+        outputDir = os.path.dirname(s['dir'])
+    name = s['root']+'.Mode{:d}'.format(s['mode'])
+    if multipleLinTimes and s['linTime'] is not None:
+        name += '.LinTime{:d}'.format(s['linTime'])
+    return os.path.join(outputDir, name+'.avi')
+
+
+def renderJobs(series, sourceNames, outputDir=None, modes=None, fps=None, movieLength=3, resolution=(1544,784),
+        skipUpToDate=True):
+    """
+    Rendering jobs for a list of series (see indexModeShapes)
+
+    INPUTS:
+      - modes: list of mode numbers to render. Default: all
+      - fps: frame rate of the animations. Default: number of frames divided by movieLength
+      - skipUpToDate: skip the series whose animation file is newer than all its frames
+    OUTPUTS:
+      - jobs: list of dictionaries (serialized as json for the workers) with keys:
+          anim, fps, resolution, sources (dictionary source name -> list of files, empty if no mesh for the source)
+    """
+    linTimes = dict()
+    for s in series:
+        linTimes.setdefault((s['dir'], s['root'], s['mode']), set()).add(s['linTime'])
+    jobs = []
+    for s in series:
+        if modes is not None and s['mode'] not in modes:
+            continue
+        anim  = animationFile(s, outputDir, len(linTimes[(s['dir'], s['root'], s['mode'])])>1)
+        files = [f for frames in s['meshes'].values() for f in frames]
+        if skipUpToDate and os.path.exists(anim) and os.path.getmtime(anim) >= max([os.path.getmtime(f) for f in files]):
+            continue
+        match = matchSources(sourceNames, s['meshes'].keys())
+        unused = [m for m in s['meshes'].keys() if m not in match.values()]
+        if len(unused)>0:
+            print('[WARN] No source in the state file for meshes {} ({})'.format(unused, anim))
+        if all([m is None for m in match.values()]):
+            print('[WARN] No mesh plotted on scene, skipping: {}'.format(anim))
+            continue
+        nFrames = max([len(frames) for frames in s['meshes'].values()])
+        jobs.append({'anim':anim, 'fps':fps if fps is not None else max(1, int(round(nFrames/movieLength))),
+                     'resolution':list(resolution),
+                     'sources':{sn:(s['meshes'][m] if m is not None else []) for sn, m in match.items()}})
+    return jobs
+
+
+# --------------------------------------------------------------------------------}
+# --- Pool of pvbatch workers
+# --------------------------------------------------------------------------------{
+class _Worker():
+    """ A pvbatch process running renderModeShapesWorker.py, receiving jobs on stdin (one json per line) """
+    def __init__(self, pvbatch, stateFile, pvbatchArgs=None, logFile=None):
+        args = [pvbatch] + (pvbatchArgs or []) + [WORKER_SCRIPT, stateFile]
+        self.log  = open(logFile, 'w') if logFile is not None else subprocess.DEVNULL
+        self.proc = subprocess.Popen(args, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=self.log,
+                                     universal_newlines=True, bufsize=1)
+
+    def run(self, job):
+        """ Send a job, wait for the worker to be done. Returns (ok, message) """
+        try:
+            self.proc.stdin.write(json.dumps(job)+'\n')
+            self.proc.stdin.flush()
+        except (OSError, ValueError) as e:
+            return False, 'worker stopped ({})'.format(e)
+        for line in self.proc.stdout:
+            # ParaView also writes to stdout, the status of the job is on a line starting with @@
+            if line.startswith('@@DONE'):
+                return True, ''
+            elif line.startswith('@@FAIL'):
+                return False, line[6:].strip()
+            elif self.log is not subprocess.DEVNULL:
+                self.log.write(line)
+        return False, 'worker stopped (returncode {})'.format(self.proc.wait())
+
+    def alive(self):
+        return self.proc.poll() is None
+
+    def close(self):
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass
+        self.proc.wait()
+        if self.log is not subprocess.DEVNULL:
+            self.log.close()
+
+
+def runRenderJobs(jobs, stateFile, nWorkers=None, pvbatch='pvbatch', pvbatchArgs=None, logDir=None, verbose=True):
+    """
+    Render a list of jobs (see renderJobs) with a pool of pvbatch workers.
+    A worker that stops (e.g. crash of ParaView) is restarted for the next job.
+
+    INPUTS:
+      - nWorkers: number of pvbatch processes. Default: number of cores of the machine, at most the number of jobs
+      - pvbatch: pvbatch executable
+      - pvbatchArgs: additional arguments to pvbatch (e.g. ['--force-offscreen-rendering'])
+      - logDir: directory where the outputs of each worker are written (worker<i>.log). Default: not written
+    OUTPUTS:
+      - status: dictionary animation file -> (ok, elapsed time, message)
+    """
+    stateFile = os.path.abspath(stateFile)
+    if nWorkers is None:
+        nWorkers = os.cpu_count() or 1
+    nWorkers = max(1, min(nWorkers, len(jobs)))
+    if verbose:
+        print('[INFO] Rendering {} animations with {} pvbatch workers'.format(len(jobs), nWorkers))
+    for job in jobs:
+        os.makedirs(os.path.dirname(os.path.abspath(job['anim'])), exist_ok=True)
+    if logDir is not None:
+        os.makedirs(logDir, exist_ok=True)
+
+    todo   = queue.Queue()
+    for job in jobs:
+        todo.put(job)
+    status = dict()
+    lock   = threading.Lock()
+
+    def loop(iw):
+        logFile = os.path.join(logDir, 'worker{:d}.log'.format(iw)) if logDir is not None else None
+        worker  = None
+        while True:
+            try:
+                job = todo.get_nowait()
+            except queue.Empty:
+                break
+            if worker is None or not worker.alive():
+                if worker is not None:
+                    worker.close()
+                worker = _Worker(pvbatch, stateFile, pvbatchArgs, logFile)
+            t0 = time.time()
+            ok, msg = worker.run(job)
+            ok = ok and os.path.exists(job['anim'])
+            with lock:
+                status[job['anim']] = (ok, time.time()-t0, msg)
+                if verbose:
+                    print('[{}] {} ({:.1f}s) {}'.format(' OK ' if ok else 'FAIL', job['anim'], time.time()-t0, msg))
+        if worker is not None:
+            worker.close()
+
+    threads = [threading.Thread(target=loop, args=(iw,)) for iw in range(nWorkers)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    nFailed = len([s for s in status.values() if not s[0]])
+    if nFailed>0:
+        print('[WARN] {} animations failed'.format(nFailed))
+    return status
+
+
+def renderModeShapes(vtkDirs, stateFile, outputDir=None, modes=None, nWorkers=None, pvbatch='pvbatch', pvbatchArgs=None,
+        fps=None, movieLength=3, resolution=(1544,784), skipUpToDate=True, logDir=None, verbose=True):
+    """
+    Render the animations of all the mode shapes found in a set of VTK directories, in parallel.
+
+    INPUTS:
+      - vtkDirs: directory or list of directories containing the vtp files (e.g. the `vtk` folders of all the cases)
+      - stateFile: ParaView state file (e.g. ED_Surfaces.pvsm). The sources of the state are matched to the meshes
+                   of each series by name (see matchSources)
+      - outputDir: directory of the animations. Default: parent directory of each VTK directory
+      - other inputs: see renderJobs and runRenderJobs
+    OUTPUTS:
+      - status: see runRenderJobs
+    """
+    series = indexModeShapes(vtkDirs)
+    if len(series)==0:
+        raise Exception('No mode shape files (*.Mode*.vtp) found in: {}'.format(vtkDirs))
+    sourceNames = stateSources(stateFile)
+    if len(sourceNames)==0:
+        raise Exception('Cannot find source names in state file: {}'.format(stateFile))
+    jobs = renderJobs(series, sourceNames, outputDir=outputDir, modes=modes, fps=fps, movieLength=movieLength,
+                      resolution=resolution, skipUpToDate=skipUpToDate)
+    if verbose:
+        print('[INFO] {} mode shape series, {} to render'.format(len(series), len(jobs)))
+    if len(jobs)==0:
+        return dict()
+    return runRenderJobs(jobs, stateFile, nWorkers=nWorkers, pvbatch=pvbatch, pvbatchArgs=pvbatchArgs, logDir=logDir,
+                         verbose=verbose)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Render the mode shape animations of VTK directories in parallel')
+    parser.add_argument('stateFile', help='ParaView state file')
+    parser.add_argument('vtkDirs', nargs='+', help='Directories containing the vtp files')
+    parser.add_argument('-o', '--outputDir', default=None, help='Directory of the animations')
+    parser.add_argument('-n', '--nWorkers', type=int, default=None, help='Number of pvbatch workers')
+    parser.add_argument('-m', '--modes', type=int, nargs='+', default=None, help='Mode numbers to render')
+    parser.add_argument('--pvbatch', default='pvbatch', help='pvbatch executable')
+    parser.add_argument('--fps', type=int, default=None, help='Frame rate of the animations')
+    parser.add_argument('--force', action='store_true', help='Render the animations that are up to date')
+    args = parser.parse_args()
+    status = renderModeShapes(args.vtkDirs, args.stateFile, outputDir=args.outputDir, modes=args.modes,
+                              nWorkers=args.nWorkers, pvbatch=args.pvbatch, fps=args.fps, skipUpToDate=not args.force)
+    sys.exit(0 if all([s[0] for s in status.values()]) else 1)
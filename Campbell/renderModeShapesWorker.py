@@ -0,0 +1,73 @@
+"""
+pvbatch worker for renderModeShapes.py
+
+usage:
+    pvbatch renderModeShapesWorker.py STATEFILE
+
+Jobs are read from stdin, one json dictionary per line (see renderModeShapes.renderJobs). The state file is loaded once,
+with the files of the first job. For the following jobs, only the file names of the sources are changed.
+The sources that have no files for a job are hidden. The status of each job is written to stdout as a line
+starting with @@DONE or @@FAIL.
+"""
+from paraview.simple import *
+import os
+import sys
+import json
+import traceback
+
+StateFile = os.path.normpath(sys.argv[1])
+loaded    = False
+
+
+def fileNameKey(sourceName):
+    """ Keyword used by LoadState for the file names of a source (see plotModeShapes.py) """
+    if sourceName.find('*')>1:
+        sourceName = sourceName.replace('*','').replace('.','')
+    return sourceName+'FileName'
+
+
+def loadState(job):
+    """ Load the state file, using the files of a job for the sources that have files """
+    files = {fileNameKey(sn):f for sn, f in job['sources'].items() if len(f)>0}
+    DataDirectory = os.path.dirname(list(files.values())[0][0])
+    LoadState(StateFile, LoadStateDataFileOptions='Choose File Names', DataDirectory=DataDirectory, **files)
+
+
+def setSources(job):
+    """ Change the file names of the sources, hide the sources without files """
+    views = GetRenderViews()
+    for sn, files in job['sources'].items():
+        src = FindSource(sn)
+        if src is None:
+            raise Exception('Cannot find source {} in state'.format(sn))
+        if len(files)>0:
+            if list(src.FileName)!=files:
+                src.FileName = files
+                src.UpdatePipelineInformation()
+            for view in views:
+                Show(src, view)
+        else:
+            for view in views:
+                Hide(src, view)
+
+
+for line in sys.stdin:
+    if len(line.strip())==0:
+        continue
+    try:
+        job = json.loads(line)
+        if not loaded:
+            loadState(job)
+            loaded = True
+        setSources(job)
+        scene = GetAnimationScene()
+        scene.UpdateAnimationUsingDataTimeSteps()
+        SetActiveView(GetRenderView())
+        layout = GetLayout()
+        WriteAnimation(job['anim'], viewOrLayout=layout, FrameRate=job['fps'], ImageResolution=tuple(job['resolution']), Compression=True)
+        msg = '@@DONE'
+    except Exception as e:
+        traceback.print_exc()
+        msg = '@@FAIL {}'.format(str(e).replace('\n',' '))
+    sys.stdout.write(msg+'\n')
+    sys.stdout.flush()
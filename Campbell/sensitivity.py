@@ -0,0 +1,239 @@
+"""
+Eigenvalue sensitivities of the Campbell diagram with respect to model parameters
+(see linearization.sensitivityCampbell)
+
+For each parameter, the linearizations are repeated with a perturbed value (forward or central differences), and the
+derivatives of the azimuth-averaged MBC state matrix are obtained by finite differences. First-order derivatives of the
+eigenvalues and eigenvectors are then computed with the left and right eigenvectors:
+    dlambda_i = w_i^H dA v_i                                    (w_i^H v_i = 1)
+    dv_i      = sum_{k!=i} (w_k^H dA v_i)/(lambda_i-lambda_k) v_k
+such that frequencies and damping can be predicted for a range of parameter values without new simulations.
+
+The sensitivities of each operating point are cached in a file next to its linearization files (base + '.sens.npz'),
+invalidated when the linearization files change.
+
+Example:
+    Sens = operatingPointsSensitivity(fst0, {'EDFile|ShftTilt':fstP}, {'EDFile|ShftTilt':0.5})
+    Freq, Damp = predictCampbell(Sens, {'EDFile|ShftTilt':-2})
+"""
+import os
+import numpy as np
+import pandas as pd
+
+try:
+    from . import inputsCache
+    from .mbc3 import fx_mbc3
+    from .campbellData import findLinFiles, PrettyStateDescriptions
+    from .modeTracking import trackModes, trackNames
+except ImportError:
+    import inputsCache
+    from mbc3 import fx_mbc3
+    from campbellData import findLinFiles, PrettyStateDescriptions
+    from modeTracking import trackModes, trackNames
+
+CACHE_EXT = '.sens.npz'
+
+
+# --------------------------------------------------------------------------------}
+# --- Eigen derivatives
+# --------------------------------------------------------------------------------{
+def eigenDerivatives(A, dA, ndof2, ndof1=0):
+    """
+    First-order derivatives of the eigenvalues and eigenvectors of A
+
+    INPUTS:
+      - A: ns x ns state matrix (states in order {q2, q2_dot, q1})
+      - dA: nParams x ns x ns, derivatives of A with respect to the parameters
+    OUTPUTS:
+      - dictionary with keys (modes with positive imaginary part, sorted by natural frequency):
+          - Evals: nModes, EigenVects: ndof x nModes (q2 and q1 states, see mbc3.eiganalysis)
+          - dEvals: nParams x nModes, dEigenVects: nParams x ndof x nModes
+    """
+    ns = A.shape[0]
+    Lambda, V = np.linalg.eig(A)
+    W = np.linalg.inv(V)                       # rows are the left eigenvectors, normalized such that W V = I
+    M = np.einsum('ik,pkl,lj->pij', W, dA, V)  # W dA V, nParams x ns x ns
+    dLambda = np.einsum('pii->pi', M)
+    D = Lambda[None,:]-Lambda[:,None]          # lambda_j - lambda_i (row i, column j)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        C = np.where(np.abs(D)>1e-12*max(np.max(np.abs(Lambda)),1), M/D[None,:,:], 0)
+    dV = np.einsum('ik,pkj->pij', V, C)
+
+    IStates = np.concatenate((np.arange(ndof2), np.arange(2*ndof2, ns))) # q2 and q1
+    IPos = np.where(np.imag(Lambda)>0)[0]
+    IPos = IPos[np.argsort(np.abs(Lambda[IPos]), kind='stable')]
+    s = dict()
+    s['Evals']       = Lambda[IPos]
+    s['EigenVects']  = V[np.ix_(IStates, IPos)]
+    s['dEvals']      = dLambda[:, IPos]
+    s['dEigenVects'] = dV[:, IStates][:, :, IPos]
+    return s
+
+
+def finiteDifference(A0, Ap, step, Am=None):
+    """ Derivative of A: forward difference (Ap-A0)/step, or central difference (Ap-Am)/(2 step) if Am is given """
+    if Am is None:
+        return (Ap-A0)/step
+    return (Ap-Am)/(2*step)
+
+
+# --------------------------------------------------------------------------------}
+# --- Operating points
+# --------------------------------------------------------------------------------{
+def _avgA(fst):
+    FileNames = findLinFiles(os.path.splitext(fst)[0].replace('\\','/'), verbose=False)
+    if len(FileNames)==0:
+        raise Exception('No linearization data for base {}'.format(os.path.splitext(fst)[0]))
+    MBC, _, _ = fx_mbc3(FileNames, verbose=False, eigen=False)
+    return MBC, FileNames
+
+
+def opSensitivity(fst0, fstP, steps, fstM=None, cache=True):
+    """
+    Eigenvalue sensitivities of one operating point
+
+    INPUTS:
+      - fst0: fst file of the baseline case (its linearization files are used)
+      - fstP: dictionary {parameter: fst file of the case with parameter+step}
+      - steps: dictionary {parameter: step}
+      - fstM: dictionary {parameter: fst file of the case with parameter-step} for central differences (optional)
+      - cache: load/save the results from/to base + '.sens.npz'
+    OUTPUTS:
+      - dictionary, see eigenDerivatives, with additional keys: params, WS, RPM, DescStates, ndof2, ndof1
+    """
+    params = list(fstP.keys())
+    fstM   = dict() if fstM is None else fstM
+    cacheFile = os.path.splitext(fst0)[0] + CACHE_EXT
+    files = [fst0] + [fstP[p] for p in params] + [fstM[p] for p in params if p in fstM]
+    linFiles = [lf for f in files for lf in findLinFiles(os.path.splitext(f)[0].replace('\\','/'), verbose=False)]
+    key = inputsCache.caseHash({'params':params, 'steps':[steps[p] for p in params], 'central':[p in fstM for p in params]},
+                               ''.join([inputsCache.fileHash(lf) for lf in linFiles]))
+    if cache and os.path.exists(cacheFile):
+        try:
+            with np.load(cacheFile, allow_pickle=False) as npz:
+                if str(npz['key'])==key:
+                    s = {k:npz[k] for k in npz.files if k!='key'}
+                    s['params']     = s['params'].tolist()
+                    s['DescStates'] = s['DescStates'].tolist()
+                    for k in ['WS','RPM']:
+                        s[k] = float(s[k])
+                    for k in ['ndof2','ndof1']:
+                        s[k] = int(s[k])
+                    return s
+        except (OSError, ValueError, KeyError):
+            pass
+
+    MBC0, _ = _avgA(fst0)
+    dA = []
+    for p in params:
+        Ap = _avgA(fstP[p])[0]['AvgA']
+        Am = _avgA(fstM[p])[0]['AvgA'] if p in fstM else None
+        if Ap.shape!=MBC0['AvgA'].shape:
+            raise Exception('Number of states of the perturbed case {} differs from the baseline.'.format(fstP[p]))
+        dA.append(finiteDifference(MBC0['AvgA'], Ap, steps[p], Am))
+    s = eigenDerivatives(MBC0['AvgA'], np.stack(dA), MBC0['ndof2'], MBC0['ndof1'])
+    s['params']     = params
+    s['WS']         = MBC0.get('WindSpeed', np.nan)
+    s['RPM']        = MBC0['RotSpeed_rpm']
+    s['DescStates'] = PrettyStateDescriptions(MBC0['DescStates'], MBC0['ndof2'], MBC0['performedTransformation'])
+    s['ndof2']      = MBC0['ndof2']
+    s['ndof1']      = MBC0['ndof1']
+    if cache:
+        try:
+            np.savez(cacheFile, key=np.array(key), **{k:np.asarray(v) for k,v in s.items()})
+        except OSError:
+            pass
+    return s
+
+
+def operatingPointsSensitivity(fastfiles0, fastfilesP, steps, fastfilesM=None, WS=None, cache=True, freqWeight=0.0):
+    """
+    Eigenvalue sensitivities of several operating points, with modes tracked between operating points
+
+    INPUTS:
+      - fastfiles0: list of fst files of the baseline cases (operating points sorted, e.g. by wind speed)
+      - fastfilesP: dictionary {parameter: list of fst files of the cases with parameter+step}
+      - steps: dictionary {parameter: step}
+      - fastfilesM: dictionary {parameter: list of fst files of the cases with parameter-step} (optional)
+      - WS: wind speeds of the operating points, if not stored in the linearization files
+      - freqWeight: see modeTracking.trackModes
+    OUTPUTS:
+      - Sens: dictionary with keys:
+          - params, steps
+          - OP, Freq, Damp: baseline dataframes, see modeTracking.trackedCampbell
+          - Evals, dEvals: (nOP x nTracks) and (nParams x nOP x nTracks), tracked eigenvalues and their derivatives
+          - Track: see modeTracking.trackModes
+    """
+    fastfilesM = dict() if fastfilesM is None else fastfilesM
+    params = list(fastfilesP.keys())
+    S = [opSensitivity(f0, {p:fastfilesP[p][i] for p in params}, steps, {p:fastfilesM[p][i] for p in fastfilesM}, cache=cache)
+         for i, f0 in enumerate(fastfiles0)]
+    # --- Padding (the number of modes may differ between operating points)
+    nOP, nModes, ndof = len(S), max([len(s['Evals']) for s in S]), S[0]['EigenVects'].shape[0]
+    eigSol = {'Evals':np.full((nOP,nModes), np.nan, dtype=complex), 'EigenVects':np.full((nOP,ndof,nModes), np.nan, dtype=complex),
+              'Valid':np.zeros((nOP,nModes), dtype=bool)}
+    dEvals = np.full((len(params),nOP,nModes), np.nan, dtype=complex)
+    for i, s in enumerate(S):
+        n = len(s['Evals'])
+        eigSol['Evals'][i,:n]        = s['Evals']
+        eigSol['EigenVects'][i,:,:n] = s['EigenVects']
+        eigSol['Valid'][i,:n]        = True
+        dEvals[:,i,:n]               = s['dEvals']
+    eigSol['NaturalFreqs_Hz'] = np.abs(eigSol['Evals'])/(2*np.pi)
+    eigSol['DampedFreqs_Hz']  = np.imag(eigSol['Evals'])/(2*np.pi)
+    eigSol['DampRatios']      = -np.real(eigSol['Evals'])/np.abs(eigSol['Evals'])
+    Track = trackModes(eigSol, freqWeight=freqWeight)
+
+    cols = trackNames(Track, S[0]['DescStates'])
+    WS   = np.array([s['WS'] for s in S]) if WS is None else np.asarray(WS, dtype=float)
+    Sens = dict()
+    Sens['params'] = params
+    Sens['steps']  = [steps[p] for p in params]
+    Sens['OP']     = pd.DataFrame({'WS_[m/s]':WS, 'RotSpeed_[rpm]':[s['RPM'] for s in S]})
+    Sens['Freq']   = pd.DataFrame(Track['NaturalFreqs_Hz'], columns=cols)
+    Sens['Damp']   = pd.DataFrame(Track['DampRatios'], columns=cols)
+    Sens['Evals']  = np.take_along_axis(eigSol['Evals'], Track['IMode'], axis=1)
+    Sens['dEvals'] = np.take_along_axis(dEvals, Track['IMode'][None,:,:], axis=2)
+    Sens['Track']  = Track
+    return Sens
+
+
+# --------------------------------------------------------------------------------}
+# --- Predictions
+# --------------------------------------------------------------------------------{
+def predictCampbell(Sens, dp):
+    """
+    First-order prediction of the Campbell diagram for parameter changes
+
+    INPUTS:
+      - Sens: see operatingPointsSensitivity
+      - dp: dictionary {parameter: change of the parameter with respect to the baseline}
+    OUTPUTS:
+      - Freq, Damp: dataframes with the same columns as the baseline Sens['Freq'] and Sens['Damp']
+    """
+    Evals = Sens['Evals'].copy()
+    for p, v in dp.items():
+        if p not in Sens['params']:
+            raise Exception('No sensitivity computed for parameter {}, available: {}'.format(p, Sens['params']))
+        Evals = Evals + Sens['dEvals'][Sens['params'].index(p)]*v
+    Freq = pd.DataFrame(np.abs(Evals)/(2*np.pi), columns=Sens['Freq'].columns)
+    Damp = pd.DataFrame(-np.real(Evals)/np.abs(Evals), columns=Sens['Damp'].columns)
+    return Freq, Damp
+
+
+def parameterSweep(Sens, param, values):
+    """
+    Predictions of the Campbell diagram for a range of changes of one parameter, see predictCampbell
+
+    OUTPUTS:
+      - Freq, Damp: dataframes with one row per operating point and change of the parameter,
+                    with columns: param, WS_[m/s], RotSpeed_[rpm], and the tracked modes
+    """
+    F, D = [], []
+    for v in values:
+        Freq, Damp = predictCampbell(Sens, {param:v})
+        for L, df in zip([F, D], [Freq, Damp]):
+            df = pd.concat((Sens['OP'], df), axis=1)
+            df.insert(0, param, v)
+            L.append(df)
+    return pd.concat(F, ignore_index=True), pd.concat(D, ignore_index=True)
@@ -0,0 +1,134 @@
+"""
+Adaptive selection of the linearization start time (tStart) of each case, from a pilot simulation
+
+For each case, a pilot simulation (same inputs, without linearization, text outputs) is run up to the maximum tStart.
+The periodicity of key channels (rotor speed, tower-top displacements, blade root moments) is checked over successive
+revolutions: the steady state is reached when all the revolutions that follow are equal to the previous ones, within
+a tolerance. The linearization case is then written with the smallest tStart that meets the tolerance.
+
+The results of the analysis of the pilot outputs are cached in a json file (see inputsCache), and the pilot simulations
+are not rerun when they are up to date (see fastJobs), such that pilots are reused when the study is run again.
+"""
+import os
+import importlib.util
+import numpy as np
+
+try:
+    from . import inputsCache
+    from .fastJobs import setKeys, outputFiles, runFASTJobs
+except ImportError:
+    import inputsCache
+    from fastJobs import setKeys, outputFiles, runFASTJobs
+
+# Reader of text outputs of Utilities/outFile.py, loaded from its path (Utilities is not a package)
+try:
+    from ..Utilities.outFile import FASTOutputText
+except (ImportError, ValueError):
+    _spec = importlib.util.spec_from_file_location('_utilities_outFile', os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Utilities', 'outFile.py'))
+    _outFile = importlib.util.module_from_spec(_spec)
+    _spec.loader.exec_module(_outFile)
+    FASTOutputText = _outFile.FASTOutputText
+
+CACHE_FILE = '_SteadyState.json'
+
+# Channels used to detect the steady state (when present in the outputs)
+CHANNELS = ['RotSpeed', 'TTDspFA', 'TTDspSS', 'RootMxc1', 'RootMyc1', 'RootMxb1', 'RootMyb1', 'RootMzc1']
+
+
+# --------------------------------------------------------------------------------}
+# --- Pilot simulations
+# --------------------------------------------------------------------------------{
+def makePilotCase(fstFile):
+    """
+    Turn a case written by writeFASTLinInputs into a pilot simulation: no linearization, no VTK outputs, text outputs.
+    The file is only modified if needed (see fastJobs.setKeys).
+    """
+    return setKeys(fstFile, {'Linearize':False, 'CalcSteady':False, 'WrVTK':0, 'OutFileFmt':1})
+
+
+def steadyStateTime(t, X, T, tol=0.01, nPts=72):
+    """
+    Time at which a set of signals becomes periodic
+
+    INPUTS:
+      - t: time vector
+      - X: signals (nt x nChannels)
+      - T: period (e.g. time for one revolution)
+      - tol: tolerance on the difference between successive periods, relative to the maximum of each signal
+      - nPts: number of points per period used for the comparison
+    OUTPUTS:
+      - tSteady: start of the first period from which all the periods are equal to the next one.
+                 None if the signals are not periodic within t.
+    """
+    X = np.asarray(X, dtype=float).reshape(len(t), -1)
+    nPer = int(np.floor((t[-1]-t[0])/T + 1e-9))
+    if nPer<2:
+        return None
+    phase = np.arange(nPts)/nPts*T
+    P = np.array([[np.interp(t[0]+k*T+phase, t, X[:,j]) for k in range(nPer)] for j in range(X.shape[1])]) # nCh x nPer x nPts
+    scale = np.max(np.abs(X), axis=0)
+    scale[scale==0] = 1
+    err = np.max(np.abs(np.diff(P, axis=1)), axis=2) / scale[:,None] # nCh x (nPer-1), error of period k+1 vs k
+    ok  = np.all(err<tol, axis=0)
+    if not ok[-1]:
+        return None
+    k = len(ok) - np.argmin(ok[::-1]) if not np.all(ok) else 0 # first period from which all the following are ok
+    return t[0] + k*T
+
+
+# --------------------------------------------------------------------------------}
+# --- Start times
+# --------------------------------------------------------------------------------{
+def adaptiveStartTimes(pilotFiles, RPM, fastExe, tMax, tol=0.01, channels=None, tWindow=5, nCores=None, verbose=True):
+    """
+    Smallest linearization start time of each case, determined from pilot simulations
+
+    INPUTS:
+      - pilotFiles: fst files of the pilot simulations (e.g. written by writeFASTLinInputs in a separate folder)
+      - RPM: rotational speed of each case [rpm]
+      - fastExe: OpenFAST executable
+      - tMax: maximum start time, used when a case does not reach a steady state within its pilot simulation
+      - tol: see steadyStateTime
+      - channels: channels used to detect the steady state. Default: CHANNELS
+      - tWindow: period used for the comparison for parked or idling cases (RPM=0) [s]
+      - nCores: see fastJobs.runFASTJobs
+    OUTPUTS:
+      - tStarts: array of start times
+    """
+    if channels is None:
+        channels = CHANNELS
+    for f in pilotFiles:
+        makePilotCase(f)
+    runFASTJobs(pilotFiles, fastExe, nCores=nCores, verbose=verbose)
+
+    folder   = os.path.dirname(os.path.abspath(pilotFiles[0]))
+    cache    = inputsCache.loadManifest(folder, CACHE_FILE)
+    settings = {'tol':tol, 'channels':channels, 'tWindow':tWindow}
+    tStarts  = np.full(len(pilotFiles), float(tMax))
+    for i, (f, rpm) in enumerate(zip(pilotFiles, RPM)):
+        outFile = outputFiles(f)[0]
+        if not os.path.exists(outFile):
+            print('[WARN] Pilot simulation failed, using tStart={}: {}'.format(tMax, f))
+            continue
+        name = os.path.basename(f)
+        key  = inputsCache.caseHash(settings, inputsCache.fileHash(outFile))
+        if name in cache and cache[name]['hash']==key:
+            tSteady = cache[name]['tSteady']
+        else:
+            out   = FASTOutputText(outFile, useCache=False) # the results of the analysis are cached instead
+            found = [c for c in channels if c in out.ChanName]
+            if len(found)==0:
+                print('[WARN] None of the channels {} found in {}, using tStart={}'.format(channels, outFile, tMax))
+                tSteady = None
+            else:
+                T = 60/rpm if abs(rpm)>0.001 else tWindow
+                tSteady = steadyStateTime(out.time, out.read(found), T, tol=tol)
+            cache[name] = {'hash':key, 'tSteady':tSteady}
+        if tSteady is None:
+            print('[WARN] Steady state not reached in pilot simulation, using tStart={}: {}'.format(tMax, f))
+        else:
+            tStarts[i] = min(tSteady, tMax)
+    inputsCache.saveManifest(folder, cache, CACHE_FILE)
+    if verbose:
+        print('[INFO] Linearization start times: {}'.format(', '.join(['{:.1f}'.format(ts) for ts in tStarts])))
+    return tStarts
@@ -0,0 +1,141 @@
+"""
+Index of the mode shape VTK files of a directory, shared by the mode shape scripts
+(plotModeShapes.py, plotModeShapesSimple.py, renderModeShapes.py)
+
+The files have the form: `root.Mode<i>[.LinTime<j>].<mesh>.<frame>.vtp`.
+The directory is listed once (os.scandir), and the index is stored as:
+    index[root][mode][linTime][mesh] = list of frames (strings, with their leading zeros, sorted)
+where linTime is None when the files do not contain LinTime (VTKLinTim=2).
+
+The index is cached in a json file in the directory (INDEX_FILE), and reused as long as the modification time of the
+directory does not change (i.e. no file was added, removed or renamed).
+"""
+import os
+import re
+import json
+import numpy as np
+
+INDEX_FILE = '_ModeShapes_index.json'
+
+# root.Mode5.LinTime1.AD_Blade1.001.vtp, or root.Mode5.AD_Blade1.001.vtp
+_VTP_PATTERN = re.compile(r'^(?P<root>.+)\.Mode(?P<mode>\d+)\.(?:LinTime(?P<lin>\d+)\.)?(?P<mesh>[^.]+)\.(?P<frame>\d+)\.vtp$')
+
+
+def scanModeShapes(vtkDir):
+    """ Index of the mode shape files of a directory (see module documentation), in a single directory listing """
+    index = dict()
+    with os.scandir(vtkDir) as it:
+        for entry in it:
+            if not entry.name.endswith('.vtp') or entry.name.find('.Mode')<0:
+                continue
+            m = _VTP_PATTERN.match(entry.name)
+            if m is None or m.group('mesh').find('DebugError')>=0:
+                continue
+            lin = None if m.group('lin') is None else int(m.group('lin'))
+            frames = index.setdefault(m.group('root'), dict()).setdefault(int(m.group('mode')), dict()).setdefault(lin, dict()).setdefault(m.group('mesh'), [])
+            frames.append(m.group('frame'))
+    for modes in index.values():
+        for lins in modes.values():
+            for meshes in lins.values():
+                for frames in meshes.values():
+                    frames.sort(key=int)
+    return index
+
+
+def _toJson(index):
+    return {root:{str(mode):{('' if lin is None else str(lin)):meshes for lin, meshes in lins.items()} for mode, lins in modes.items()} for root, modes in index.items()}
+
+
+def _fromJson(d):
+    return {root:{int(mode):{(None if lin=='' else int(lin)):meshes for lin, meshes in lins.items()} for mode, lins in modes.items()} for root, modes in d.items()}
+
+
+def modeShapeIndex(vtkDir, useCache=True):
+    """
+    Index of the mode shape files of a directory (see module documentation), using the cache file when it is up to date.
+    If the cache cannot be written (e.g. read-only directory), the directory is scanned each time.
+    """
+    vtkDir    = os.path.abspath(vtkDir)
+    cacheFile = os.path.join(vtkDir, INDEX_FILE)
+    if not useCache:
+        return scanModeShapes(vtkDir)
+    if os.path.exists(cacheFile):
+        try:
+            with open(cacheFile, 'r') as f:
+                d = json.load(f)
+            if d['mtime']==os.stat(vtkDir).st_mtime_ns:
+                return _fromJson(d['index'])
+        except (ValueError, KeyError, OSError):
+            pass
+    try:
+        # The cache file is created before the directory is stamped, and overwritten after the scan: overwriting an
+        # existing file does not change the modification time of the directory.
+        open(cacheFile, 'a').close()
+        mtime = os.stat(vtkDir).st_mtime_ns
+    except OSError:
+        return scanModeShapes(vtkDir)
+    index = scanModeShapes(vtkDir)
+    try:
+        with open(cacheFile, 'w') as f:
+            json.dump({'mtime':mtime, 'index':_toJson(index)}, f)
+    except OSError:
+        pass
+    return index
+
+
+def modeShapeFiles(vtkDir, root, mode, linTime, mesh, frames):
+    """ File names of the frames of a mesh """
+    prefix = root+'.Mode{:d}.'.format(mode) + ('' if linTime is None else 'LinTime{:d}.'.format(linTime)) + mesh + '.'
+    return [os.path.join(vtkDir, prefix+fr+'.vtp') for fr in frames]
+
+
+# --------------------------------------------------------------------------------}
+# --- Helper functions of the mode shape scripts
+# --------------------------------------------------------------------------------{
+def _rootIndex(rootPath):
+    rootSim = os.path.basename(rootPath)
+    dirName = os.path.dirname(os.path.abspath(rootPath))
+    index   = modeShapeIndex(dirName)
+    if rootSim not in index:
+        raise Exception('No file found with pattern: ', os.path.join(dirName, rootSim+'.Mode*.*.vtp'))
+    return index[rootSim]
+
+
+def extractModeNumbers(rootPath):
+    """ Extract mode numbers based on a simulation directory and simulation basename """
+    return np.sort(np.array(list(_rootIndex(rootPath).keys()), dtype=int))
+
+
+def extractModeInfo(rootPath, iMode):
+    """
+    dirName/rootSim.Mode5.LinTime1.AD_Blade1.001.vtp
+
+    return
+     - meshes: list of meshes available
+     - nZeros: number of zeros before extension
+     - nTimes: number of time steps
+     - Suffix: '.LinTime1' if the files contain LinTime, '' otherwise
+    """
+    modes = _rootIndex(rootPath)
+    if iMode not in modes:
+        raise Exception('No file found for mode {} with root: {}'.format(iMode, rootPath))
+    lins = modes[iMode]
+    # --- Detect Suffix. If VTKLinTim=2, Suffix='', else Suffix='.LinTime1'
+    if 1 in lins:
+        Suffix, meshFrames = '.LinTime1', lins[1] # TODO consider what to do if we have more lintimes
+    elif None in lins:
+        Suffix, meshFrames = '', lins[None]
+    else:
+        lin = min(lins.keys())
+        Suffix, meshFrames = '.LinTime{:d}'.format(lin), lins[lin]
+
+    # --- Detect Meshes names and number of leading zeros
+    meshes = set(meshFrames.keys())
+    frames = [fr for f in meshFrames.values() for fr in f]
+    nZeros = [len(fr) for fr in frames]
+    nZerosUnique, counts = np.unique(nZeros, return_counts=True)
+    nZeros = int(nZerosUnique[np.argmax(counts)])
+    nTimes = max([int(fr) for fr in frames])
+    if len(nZerosUnique)>1:
+        print('[WARN] Files have different number of leading zeros {}, choosing: {}'.format(nZerosUnique, nZeros))
+    return meshes, nZeros, nTimes, Suffix
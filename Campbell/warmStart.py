@@ -0,0 +1,202 @@
+"""
+Warm-started sweep of linearization simulations (see linearization.campbell)
+
+Most of the time of a linearization simulation is spent reaching a periodic steady state. Neighbouring operating points
+have similar steady states, so:
+ - the cases are sorted by wind speed and split into chains of neighbouring cases, the chains are run concurrently
+ - the first case of a chain starts from the initial conditions of the template (long tStart)
+ - the next cases start from the state of the previous case of the chain at its linearization times: the ElastoDyn
+   initial conditions (tip and tower-top deflections, azimuth, platform displacements) are set before the case is run,
+   and a shorter tStart is used (see writeFASTLinInputs, which accepts one tStart per case)
+
+The rotor speed and pitch of each case are those of the case file, since they define the operating point.
+"""
+import os
+import time
+import queue
+import threading
+import numpy as np
+
+try:
+    from .linFile import ReadFASTLinear
+    from .fastJobs import STATE_FILE, _readKeys, setKeys, outputFiles, isUpToDate, inputsHash, loadJobState, saveJobState, runFASTJob
+except ImportError:
+    from linFile import ReadFASTLinear
+    from fastJobs import STATE_FILE, _readKeys, setKeys, outputFiles, isUpToDate, inputsHash, loadJobState, saveJobState, runFASTJob
+
+
+# --------------------------------------------------------------------------------}
+# --- Chains and start times
+# --------------------------------------------------------------------------------{
+def sweepChains(WS, nChains=None, minLength=4):
+    """
+    Split cases into chains of cases with neighbouring wind speeds
+
+    INPUTS:
+      - WS: wind speeds of the cases
+      - nChains: number of chains (i.e. of simulations that can run concurrently).
+                 Default: number of cores, with at least `minLength` cases per chain
+    OUTPUTS:
+      - chains: list of lists of case indices, sorted by wind speed
+    """
+    n = len(WS)
+    if nChains is None:
+        nChains = min(os.cpu_count() or 1, int(np.ceil(n/minLength)))
+    nChains = max(1, min(nChains, n))
+    I = np.argsort(np.asarray(WS, dtype=float), kind='stable')
+    return [list(c) for c in np.array_split(I, nChains) if len(c)>0]
+
+
+def sweepStartTimes(chains, tStart, tStartWarm=None):
+    """
+    Linearization start time of each case: tStart for the first case of each chain, tStartWarm for the others.
+    Default tStartWarm: tStart/4
+    """
+    if tStartWarm is None:
+        tStartWarm = tStart/4
+    n = sum([len(c) for c in chains])
+    tStarts = np.full(n, float(tStartWarm))
+    for c in chains:
+        tStarts[c[0]] = tStart
+    return tStarts
+
+
+# --------------------------------------------------------------------------------}
+# --- Initial conditions from linearization files
+# --------------------------------------------------------------------------------{
+def EDInitialConditions(linFiles, BlPitch=0):
+    """
+    ElastoDyn initial conditions from the state operating points of linearization files (averaged over the files,
+    i.e. over the rotor revolution).
+    The tip and tower-top deflections are the sums of the modal DOFs (mode shapes are normalized to 1 at the tip),
+    the flapwise and edgewise deflections are rotated by the pitch angle to out-of-plane and in-plane deflections.
+
+    INPUTS:
+      - linFiles: list of linearization files of a case
+      - BlPitch: pitch angle of the case [deg]
+    OUTPUTS:
+      - IC: dictionary with ElastoDyn keys (e.g. OoPDefl, TTDspFA, Azimuth)
+    """
+    data = [ReadFASTLinear(f) for f in linFiles]
+    desc = data[0]['x_desc']
+    op   = np.mean([np.array(d['x_op'], dtype=float) for d in data], axis=0)
+    def dof(pattern):
+        v = [op[i] for i,s in enumerate(desc) if s.startswith('ED ') and 'First time derivative' not in s and pattern in s]
+        return np.mean(v) if len(v)>0 else 0
+    # blade DOFs are averaged over the blades
+    flap = dof('1st flapwise bending-mode DOF') + dof('2nd flapwise bending-mode DOF')
+    edge = dof('1st edgewise bending-mode DOF')
+    th   = BlPitch*np.pi/180
+    IC = dict()
+    IC['OoPDefl']   =  flap*np.cos(th) + edge*np.sin(th)
+    IC['IPDefl']    = -flap*np.sin(th) + edge*np.cos(th)
+    IC['TTDspFA']   = dof('1st tower fore-aft bending mode DOF')      + dof('2nd tower fore-aft bending mode DOF')
+    IC['TTDspSS']   = dof('1st tower side-to-side bending mode DOF') + dof('2nd tower side-to-side bending mode DOF')
+    IC['Azimuth']   = np.mod(data[-1]['Azimuth']*180/np.pi, 360)
+    IC['PtfmSurge'] = dof('Platform horizontal surge translation DOF')
+    IC['PtfmSway']  = dof('Platform horizontal sway translation DOF')
+    IC['PtfmHeave'] = dof('Platform vertical heave translation DOF')
+    IC['PtfmRoll']  = dof('Platform roll tilt rotation DOF')*180/np.pi
+    IC['PtfmPitch'] = dof('Platform pitch tilt rotation DOF')*180/np.pi
+    IC['PtfmYaw']   = dof('Platform yaw rotation DOF')*180/np.pi
+    return IC
+
+
+def _EDFile(fstFile):
+    EDFile = _readKeys(fstFile, ['EDFile']).get('EDFile', None)
+    if EDFile is None:
+        raise Exception('EDFile not found in file: {}'.format(fstFile))
+    return os.path.join(os.path.dirname(fstFile), EDFile)
+
+
+def warmStartCase(prevFst, fstFile):
+    """ Set the ElastoDyn initial conditions of a case from the linearization outputs of a previous case """
+    prevED  = _EDFile(prevFst)
+    BlPitch = float(_readKeys(prevED, ['BlPitch(1)']).get('BlPitch(1)', 0))
+    IC = EDInitialConditions(outputFiles(prevFst), BlPitch=BlPitch)
+    return setKeys(_EDFile(fstFile), IC)
+
+
+# --------------------------------------------------------------------------------}
+# --- Runner
+# --------------------------------------------------------------------------------{
+def runWarmStartSweep(fastfiles, chains, fastExe, stateFile='default', maxRetries=1, skipUpToDate=True,
+        flags=None, showOutputs=False, callback=None, verbose=True):
+    """
+    Run chains of linearization simulations, each case being warm-started from the previous case of its chain.
+    The chains run concurrently, the cases of a chain sequentially.
+
+    INPUTS:
+      - fastfiles: list of .fst files
+      - chains: list of lists of indices in fastfiles, see sweepChains
+      - fastExe, stateFile, maxRetries, skipUpToDate, flags, showOutputs, callback, verbose: see fastJobs.runFASTJobs
+        A case is skipped only if it is up to date and the previous case of its chain was not rerun.
+    OUTPUTS:
+      - state: see fastJobs.runFASTJobs
+    """
+    fastfiles = [os.path.normpath(f) for f in fastfiles]
+    if stateFile=='default':
+        stateFile = os.path.join(os.path.dirname(os.path.abspath(fastfiles[0])), STATE_FILE) if len(fastfiles)>0 else None
+    state = loadJobState(stateFile)
+    lock  = threading.Lock()
+    done  = queue.Queue() # (fst, status) of cases done, callbacks are called from the calling thread
+    if verbose:
+        print('[INFO] Running {} simulations in {} warm-started chains'.format(len(fastfiles), len(chains)))
+
+    def setState(fst, s):
+        with lock:
+            state[fst] = s
+            saveJobState(stateFile, state)
+
+    def runChain(chain):
+        prev  = None  # last case of the chain with outputs
+        rerun = False # True if a previous case of the chain was rerun
+        for i in chain:
+            fst = fastfiles[i]
+            if prev is not None:
+                try:
+                    rerun = warmStartCase(prev, fst) or rerun
+                except Exception as e:
+                    print('[WARN] {}: no warm start ({})'.format(fst, e))
+            if skipUpToDate and not rerun and isUpToDate(fst, state.get(fst,None)):
+                if state.get(fst,{}).get('status',None)!='done' or 'inputs' not in state[fst]:
+                    setState(fst, {'status':'skipped', 'attempts':0, 'returncode':0, 'elapsed':0, 'inputs':inputsHash(fst)})
+                done.put((fst, 'skipped'))
+                prev = fst
+                continue
+            inputs = inputsHash(fst)
+            for attempt in range(maxRetries+1):
+                t0 = time.time()
+                try:
+                    rc = runFASTJob(fst, fastExe, flags=flags, showOutputs=showOutputs)
+                except OSError as e:
+                    print('[FAIL] {}: {}'.format(fst, e))
+                    rc = -1
+                ok = rc==0 and all([os.path.exists(f) for f in outputFiles(fst)])
+                setState(fst, {'status':'done' if ok else 'failed', 'attempts':attempt+1, 'returncode':rc, 'elapsed':time.time()-t0, 'inputs':inputs})
+                if verbose:
+                    print('[{}] {} ({:.1f}s)'.format(' OK ' if ok else 'FAIL', fst, time.time()-t0))
+                if ok:
+                    break
+            rerun = True
+            if ok:
+                prev = fst
+                done.put((fst, 'done'))
+
+    threads = [threading.Thread(target=runChain, args=(c,), daemon=True) for c in chains]
+    for t in threads:
+        t.start()
+    while any([t.is_alive() for t in threads]) or not done.empty():
+        try:
+            fst, status = done.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        if callback is not None:
+            callback(fst, status)
+    for t in threads:
+        t.join()
+
+    failed = [f for f in fastfiles if state.get(f,{}).get('status',None)=='failed']
+    if len(failed)>0:
+        print('[WARN] {} simulations failed, see the job state file: {}'.format(len(failed), stateFile))
+    return {fst:state[fst] for fst in fastfiles if fst in state}
@@ -0,0 +1,193 @@
+"""
+Reader for OpenFAST text output files (.out), see Utilities/ReadFASTtext.m
+
+The header is parsed when the file is opened. Only the requested channels are parsed (pandas C parser with fixed
+float64 columns, or numpy.loadtxt when pandas is not available), and they are cached in a binary columnar file next
+to the output file (CACHE_EXT, one array per channel), such that the text is only tokenized again when the output
+file changes or when channels that were never read are requested.
+
+Example:
+    f = FASTOutputText('Main.out')
+    TP = f.read(['Time','GenPwr'])  # array (nt x 2), parsed once, then loaded from Main.out.npz
+    P  = f['GenPwr']                # one channel
+"""
+import os
+import json
+import numpy as np
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+CACHE_EXT = '.npz' # cache file: FileName+CACHE_EXT
+_META_KEY = '_meta'
+
+
+def ReadFASTtext(FileName, channels=None, delim=None, HeaderRows=None, NameLine=None, UnitsLine=None, useCache=True):
+    """
+    Read an OpenFAST text output file (.out), see Utilities/ReadFASTtext.m
+
+    INPUTS:
+      - FileName: path to a .out file
+      - channels: list of channel names or indices (0 is time) to read. Default: all channels
+      - delim, HeaderRows, NameLine, UnitsLine: see FASTOutputText
+      - useCache: use and update the cache file
+    OUTPUTS:
+      - Channels: 2-D array: dimension 0 is time, dimension 1 is channel
+      - ChanName, ChanUnit: names and units of the channels read
+      - DescStr: description string of the file
+    """
+    f = FASTOutputText(FileName, delim=delim, HeaderRows=HeaderRows, NameLine=NameLine, UnitsLine=UnitsLine, useCache=useCache)
+    I = f.channelIndices(channels)
+    return f.read(I), [f.ChanName[i] for i in I], [f.ChanUnit[i] for i in I], f.DescStr
+
+
+class FASTOutputText():
+    """
+    OpenFAST text output file, with the channels read so far cached on disk.
+
+    Attributes:
+      - ChanName, ChanUnit: names and units of the channels, the first channel is time
+      - DescStr: description line of the file
+      - HeaderRows: number of lines before the data
+
+    INPUTS:
+      - delim: column delimiter. Default: all whitespace
+      - HeaderRows: number of header lines. Default: detected, the names line is the first line starting with "Time",
+                    followed by the units line
+      - NameLine, UnitsLine: line numbers (starting at 1) of the names and units. Default: HeaderRows-1 and HeaderRows
+      - useCache: use and update the cache file (skipped if it cannot be written)
+    """
+    def __init__(self, FileName, delim=None, HeaderRows=None, NameLine=None, UnitsLine=None, useCache=True):
+        self.FileName  = FileName
+        self.delim     = delim
+        self.useCache  = useCache
+        self.cacheFile = FileName+CACHE_EXT
+        st = os.stat(FileName)
+        self._stamp = [st.st_size, st.st_mtime_ns]
+        self._readHeader(HeaderRows, NameLine, UnitsLine)
+        self._columns = dict() # channel index -> values, read in this session
+
+    def _split(self, line):
+        return [s.strip() for s in line.split(self.delim)] if self.delim is not None else line.split()
+
+    def _readHeader(self, HeaderRows, NameLine, UnitsLine):
+        lines = []
+        with open(self.FileName, 'r', errors='replace') as fid:
+            if HeaderRows is None:
+                for line in fid:
+                    lines.append(line)
+                    if self._split(line)[:1]==['Time']:
+                        break
+                else:
+                    raise Exception('Time channel not found in file: {}'.format(self.FileName))
+                lines.append(fid.readline())
+                HeaderRows = len(lines)
+            else:
+                lines = [fid.readline() for i in range(HeaderRows)]
+        if NameLine is None:
+            NameLine = max(HeaderRows-1, 0)
+        if UnitsLine is None:
+            UnitsLine = NameLine+1
+        self.HeaderRows = HeaderRows
+        self.ChanName   = self._split(lines[NameLine-1]) if 0<NameLine<=HeaderRows else []
+        self.ChanUnit   = self._split(lines[UnitsLine-1]) if 0<UnitsLine<=HeaderRows else []
+        self.DescStr    = lines[NameLine-3].strip() if NameLine>=3 else ''
+        if len(self.ChanName)*len(self.ChanUnit)>0 and len(self.ChanName)!=len(self.ChanUnit):
+            print('[WARN] Column names and units are different sizes in file: {}'.format(self.FileName))
+        nCols = max(len(self.ChanName), len(self.ChanUnit))
+        if nCols==0:
+            with open(self.FileName, 'r', errors='replace') as fid:
+                for i, line in enumerate(fid):
+                    if i==HeaderRows:
+                        nCols = len(self._split(line))
+                        break
+        self.ChanName += ['Channel{}'.format(i+1) for i in range(len(self.ChanName), nCols)]
+        self.ChanUnit += ['(-)' for i in range(len(self.ChanUnit), nCols)]
+
+    def __repr__(self):
+        return '<{} {} channels of {}>'.format(type(self).__name__, len(self.ChanName), self.FileName)
+
+    def channelIndices(self, channels=None):
+        """ Indices of channels given by names or indices (0 is time). Default: all channels """
+        if channels is None:
+            return list(range(len(self.ChanName)))
+        if isinstance(channels, (str, int, np.integer)):
+            channels = [channels]
+        I = []
+        for c in channels:
+            if isinstance(c, str):
+                if c not in self.ChanName:
+                    raise Exception('Channel {} not found in file: {}'.format(c, self.FileName))
+                I.append(self.ChanName.index(c))
+            else:
+                I.append(int(c))
+        return I
+
+    # --------------------------------------------------------------------------------
+    # --- Cache
+    # --------------------------------------------------------------------------------
+    def _loadCache(self, I):
+        """ Columns of I found in the cache file, if it is up to date """
+        if not self.useCache or not os.path.exists(self.cacheFile):
+            return dict()
+        try:
+            with np.load(self.cacheFile) as npz:
+                meta = json.loads(str(npz[_META_KEY]))
+                if meta['stamp']!=self._stamp or meta['names']!=self.ChanName or meta['HeaderRows']!=self.HeaderRows:
+                    return dict()
+                return {i:npz[str(i)] for i in I if str(i) in npz.files}
+        except (ValueError, KeyError, OSError):
+            return dict()
+
+    def _saveCache(self):
+        """ Write all the columns read so far (including the ones previously cached) """
+        if not self.useCache:
+            return
+        cols = self._loadCache(self.channelIndices())
+        cols.update(self._columns)
+        meta = {'stamp':self._stamp, 'names':self.ChanName, 'HeaderRows':self.HeaderRows}
+        tmpFile = self.cacheFile+'.tmp{}'.format(os.getpid())
+        try:
+            with open(tmpFile, 'wb') as f:
+                np.savez(f, **{_META_KEY:json.dumps(meta)}, **{str(i):v for i, v in cols.items()})
+            os.replace(tmpFile, self.cacheFile)
+        except OSError:
+            if os.path.exists(tmpFile):
+                os.remove(tmpFile)
+
+    # --------------------------------------------------------------------------------
+    # --- Parsing
+    # --------------------------------------------------------------------------------
+    def _parse(self, I):
+        """ Parse some columns of the text file (nt x len(I)) """
+        I = sorted(I)
+        if pd is not None:
+            sep = r'\s+' if self.delim is None else self.delim
+            df = pd.read_csv(self.FileName, sep=sep, header=None, skiprows=self.HeaderRows, usecols=I,
+                             dtype={i:np.float64 for i in I}, engine='c', comment=None)
+            M = df[I].to_numpy()
+        else:
+            M = np.loadtxt(self.FileName, delimiter=self.delim, skiprows=self.HeaderRows, usecols=I, ndmin=2)
+        return {i:np.ascontiguousarray(M[:,j]) for j, i in enumerate(I)}
+
+    def read(self, channels=None):
+        """ Values of some channels (nt x nChannels) """
+        I = self.channelIndices(channels)
+        missing = [i for i in set(I) if i not in self._columns]
+        if len(missing)>0:
+            cached = self._loadCache(missing)
+            self._columns.update(cached)
+            missing = [i for i in missing if i not in cached]
+            if len(missing)>0:
+                self._columns.update(self._parse(missing))
+                self._saveCache()
+        return np.column_stack([self._columns[i] for i in I])
+
+    def __getitem__(self, key):
+        """ Values of one channel (by name or index), e.g. f['GenPwr'] """
+        return self.read([key])[:,0]
+
+    @property
+    def time(self):
+        return self[0]
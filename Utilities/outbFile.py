@@ -0,0 +1,276 @@
+"""
+Reader for OpenFAST binary output files (.outb), see Utilities/ReadFASTbinary.m
+
+The header is parsed when the file is opened, and the packed data (int16, or float64 for uncompressed files) is
+memory-mapped: nothing else is read from disk until channels are requested.
+Only the requested channels and time window are decoded (scale and offset applied), chunk by chunk, such that
+a few channels of a long simulation with many channels can be extracted without loading the whole file.
+
+Example:
+    f = FASTOutputBinary('Main.outb')
+    TP = f.read(['Time','GenPwr'], tmin=100)  # decoded array (nt x 2)
+    P  = f['GenPwr'][1000:2000]               # decoded values of one channel
+    for chunk in f.view(['RotSpeed','BldPitch1']).chunks(10000):
+        ...
+"""
+import os
+import numpy as np
+
+# File identifiers used in FAST
+FileFmtID_WithTime              = 1 # time channel stored, compressed (int16 channels, int32 time)
+FileFmtID_WithoutTime           = 2 # constant time step, compressed (int16 channels)
+FileFmtID_NoCompressWithoutTime = 3 # constant time step, uncompressed (float64 channels)
+FileFmtID_ChanLen_In            = 4 # as WithoutTime, with the length of channel names stored in the header
+
+CHUNK_SIZE = 65536 # default number of time steps decoded at once
+
+
+def ReadFASTbinary(FileName, channels=None, tmin=None, tmax=None, machinefmt='<'):
+    """
+    Read an OpenFAST binary output file (.outb), see Utilities/ReadFASTbinary.m
+
+    INPUTS:
+      - FileName: path to a .outb file
+      - channels: list of channel names or indices (0 is time) to read. Default: all channels
+      - tmin, tmax: time window to read. Default: all time steps
+      - machinefmt: byte order of the file, '<' (little endian) or '>' (big endian)
+    OUTPUTS:
+      - Channels: 2-D array: dimension 0 is time, dimension 1 is channel (time is in column 0 when channels is None)
+      - ChanName, ChanUnit: names and units of the channels read
+      - FileID: file format identifier
+      - DescStr: description string of the file
+    """
+    f = FASTOutputBinary(FileName, machinefmt=machinefmt)
+    I = f.channelIndices(channels)
+    Channels = f.read(I, tmin=tmin, tmax=tmax)
+    return Channels, [f.ChanName[i] for i in I], [f.ChanUnit[i] for i in I], f.FileID, f.DescStr
+
+
+class FASTOutputBinary():
+    """
+    Memory-mapped OpenFAST binary output file.
+
+    Attributes:
+      - FileID, DescStr, NumOutChans, NT
+      - ChanName, ChanUnit: lists of length NumOutChans+1, the first channel is time
+      - ColScl, ColOff: scale and offsets of the channels (values = (packed - ColOff)/ColScl)
+    """
+    def __init__(self, FileName, machinefmt='<'):
+        self.FileName = FileName
+        self._bo = machinefmt
+        with open(FileName, 'rb') as fid:
+            self._readHeader(fid)
+            self._dataOffset = fid.tell()
+        self._time   = None
+        self._packed = None
+
+    def _readHeader(self, fid):
+        bo = self._bo
+        def read(dtype, n=1):
+            a = np.fromfile(fid, dtype=np.dtype(dtype).newbyteorder(bo), count=n)
+            if len(a)<n:
+                raise Exception('Could not read the header of the FAST binary file: {}'.format(self.FileName))
+            return a
+        self.FileID = int(read('i2')[0])
+        if self.FileID not in [FileFmtID_WithTime, FileFmtID_WithoutTime, FileFmtID_NoCompressWithoutTime, FileFmtID_ChanLen_In]:
+            raise Exception('Unknown FAST binary file format identifier {} (or wrong byte order) in file: {}'.format(self.FileID, self.FileName))
+        if self.FileID == FileFmtID_ChanLen_In:
+            LenName = int(read('i2')[0]) # Number of characters in channel names and units
+        else:
+            LenName = 10 # default number of characters per channel name
+        self.NumOutChans = int(read('i4')[0])
+        self.NT          = int(read('i4')[0])
+        if self.FileID == FileFmtID_WithTime:
+            self.TimeScl, self.TimeOff = read('f8', 2)
+        else:
+            self.TimeOut1, self.TimeIncr = read('f8', 2)
+        if self.FileID == FileFmtID_NoCompressWithoutTime:
+            self.ColScl = np.ones(self.NumOutChans)
+            self.ColOff = np.zeros(self.NumOutChans)
+        else:
+            self.ColScl = read('f4', self.NumOutChans).astype(float)
+            self.ColOff = read('f4', self.NumOutChans).astype(float)
+        LenDesc      = int(read('i4')[0])
+        self.DescStr = read('u1', LenDesc).tobytes().decode('latin-1').strip()
+        names = read('u1', LenName*(self.NumOutChans+1)).tobytes().decode('latin-1')
+        units = read('u1', LenName*(self.NumOutChans+1)).tobytes().decode('latin-1')
+        self.ChanName = [names[i*LenName:(i+1)*LenName].strip() for i in range(self.NumOutChans+1)]
+        self.ChanUnit = [units[i*LenName:(i+1)*LenName].strip() for i in range(self.NumOutChans+1)]
+
+    def __repr__(self):
+        return '<{} {} ({} channels, {} time steps, FileID={})>'.format(type(self).__name__, self.FileName, self.NumOutChans+1, self.NT, self.FileID)
+
+    # --------------------------------------------------------------------------------}
+    # --- Memory maps
+    # --------------------------------------------------------------------------------{
+    @property
+    def packed(self):
+        """ Memory map of the packed channels (NT x NumOutChans), without time """
+        if self._packed is None:
+            offset = self._dataOffset
+            if self.FileID == FileFmtID_WithTime:
+                offset += 4*self.NT
+            dtype = 'f8' if self.FileID == FileFmtID_NoCompressWithoutTime else 'i2'
+            dtype = np.dtype(dtype).newbyteorder(self._bo)
+            nBytes = offset + dtype.itemsize*self.NT*self.NumOutChans
+            if os.path.getsize(self.FileName) < nBytes:
+                raise Exception('Could not read entire {} file: expected {} bytes, file has {} bytes.'.format(self.FileName, nBytes, os.path.getsize(self.FileName)))
+            if self.NT*self.NumOutChans==0:
+                self._packed = np.zeros((self.NT, self.NumOutChans), dtype=dtype)
+            else:
+                self._packed = np.memmap(self.FileName, dtype=dtype, mode='r', offset=offset, shape=(self.NT, self.NumOutChans))
+        return self._packed
+
+    @property
+    def time(self):
+        """ Time vector (decoded once, it is needed to select time windows) """
+        if self._time is None:
+            if self.FileID == FileFmtID_WithTime:
+                self.packed # checks the file size
+                PackedTime = np.memmap(self.FileName, dtype=np.dtype('i4').newbyteorder(self._bo), mode='r', offset=self._dataOffset, shape=(self.NT,))
+                self._time = (np.asarray(PackedTime, dtype=float) - self.TimeOff) / self.TimeScl
+            else:
+                self._time = self.TimeOut1 + self.TimeIncr*np.arange(self.NT)
+        return self._time
+
+    # --------------------------------------------------------------------------------}
+    # --- Selection and decoding
+    # --------------------------------------------------------------------------------{
+    def channelIndices(self, channels=None):
+        """ Indices (0 is time) of channels given by names or indices. Default: all channels """
+        if channels is None:
+            return list(range(self.NumOutChans+1))
+        if isinstance(channels, (str, int, np.integer)):
+            channels = [channels]
+        I = []
+        for c in channels:
+            if isinstance(c, str):
+                if c not in self.ChanName:
+                    raise Exception('Channel "{}" not found in file: {}'.format(c, self.FileName))
+                I.append(self.ChanName.index(c))
+            else:
+                if c<0 or c>self.NumOutChans:
+                    raise Exception('Channel index {} out of range (0-{}) in file: {}'.format(c, self.NumOutChans, self.FileName))
+                I.append(int(c))
+        return I
+
+    def timeSlice(self, tmin=None, tmax=None):
+        """ Slice of the time steps within [tmin, tmax] """
+        if tmin is None and tmax is None:
+            return slice(0, self.NT)
+        if self.FileID == FileFmtID_WithTime:
+            eps = 1/abs(self.TimeScl) # resolution of the packed time
+            i0 = 0       if tmin is None else int(np.searchsorted(self.time, tmin-eps, side='left'))
+            i1 = self.NT if tmax is None else int(np.searchsorted(self.time, tmax+eps, side='right'))
+        else:
+            # constant time step, no need to decode the time vector
+            eps = 1e-9*abs(self.TimeIncr)
+            i0 = 0       if tmin is None else int(np.ceil ((tmin-self.TimeOut1-eps)/self.TimeIncr))
+            i1 = self.NT if tmax is None else int(np.floor((tmax-self.TimeOut1+eps)/self.TimeIncr))+1
+        return slice(max(i0,0), min(max(i1,0), self.NT))
+
+    def decode(self, I, rows):
+        """ Decoded values of channels I (0 is time) for a range of time steps (slice) """
+        I = np.asarray(I, dtype=int)
+        out = np.empty((len(range(*rows.indices(self.NT))), len(I)))
+        bT  = I==0
+        if np.any(bT):
+            out[:,bT] = self.time[rows][:,None]
+        if np.any(~bT):
+            J = I[~bT]-1
+            out[:,~bT] = (self.packed[rows, J] - self.ColOff[J]) / self.ColScl[J]
+        return out
+
+    def view(self, channels=None, tmin=None, tmax=None):
+        """ Lazy view on some channels and a time window, see ChannelsView """
+        return ChannelsView(self, self.channelIndices(channels), self.timeSlice(tmin, tmax))
+
+    def read(self, channels=None, tmin=None, tmax=None, chunkSize=CHUNK_SIZE):
+        """ Decoded values of some channels within a time window (nt x nChannels) """
+        return self.view(channels, tmin=tmin, tmax=tmax).read(chunkSize=chunkSize)
+
+    def __getitem__(self, key):
+        """ Lazy view on one channel (by name or index), e.g. f['GenPwr'][1000:2000] """
+        v = self.view(key)
+        v.squeeze = True
+        return v
+
+
+class ChannelsView():
+    """
+    Lazy view on some channels and a range of time steps of a FASTOutputBinary file.
+    Nothing is decoded until the view is indexed (e.g. v[1000:2000], v[:, 'GenPwr']), converted to an array,
+    or iterated by chunks.
+    """
+    def __init__(self, f, I, rows, squeeze=False):
+        self.f       = f
+        self.I       = list(I)
+        self.rows    = range(*rows.indices(f.NT))
+        self.squeeze = squeeze # view on one channel, decoded as 1D arrays
+
+    @property
+    def names(self):
+        return [self.f.ChanName[i] for i in self.I]
+
+    @property
+    def units(self):
+        return [self.f.ChanUnit[i] for i in self.I]
+
+    @property
+    def shape(self):
+        return (len(self.rows),) if self.squeeze else (len(self.rows), len(self.I))
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __repr__(self):
+        return '<{} {} channels x {} time steps of {}>'.format(type(self).__name__, len(self.I), len(self), self.f.FileName)
+
+    def _decode(self, rows, I):
+        if len(rows)==0:
+            return np.zeros((0, len(I)))
+        if rows.step<0:
+            # decoded in increasing order and reversed (the stop of a decreasing range may be -1)
+            return self.f.decode(I, slice(rows[-1], rows[0]+1, -rows.step))[::-1]
+        return self.f.decode(I, slice(rows.start, rows.stop, rows.step))
+
+    def __getitem__(self, key):
+        """ Decoded values, rows are selected with an integer or a slice, columns with an integer, a name, a slice or a list """
+        if isinstance(key, tuple):
+            if self.squeeze or len(key)!=2:
+                raise IndexError('too many indices for view of {} dimension(s)'.format(len(self.shape)))
+            rows, cols = key
+        else:
+            rows, cols = key, slice(None)
+        if isinstance(cols, (int, np.integer, str)):
+            cols, squeeze = [cols], True
+        else:
+            squeeze = self.squeeze
+        if isinstance(cols, slice):
+            I = self.I[cols]
+        else:
+            I = [self.f.channelIndices(c)[0] if isinstance(c, str) else self.I[c] for c in cols]
+        if isinstance(rows, (int, np.integer)):
+            out = self._decode(self.rows[rows:rows+1 if rows!=-1 else None], I)[0]
+        else:
+            out = self._decode(self.rows[rows], I)
+        return out[...,0] if squeeze else out
+
+    def chunks(self, chunkSize=CHUNK_SIZE):
+        """ Generator of decoded arrays of at most chunkSize time steps """
+        for i in range(0, len(self.rows), chunkSize):
+            out = self._decode(self.rows[i:i+chunkSize], self.I)
+            yield out[:,0] if self.squeeze else out
+
+    def read(self, chunkSize=CHUNK_SIZE):
+        """ Decoded values of the view """
+        out = np.empty((len(self.rows), len(self.I)))
+        i = 0
+        for c in self.chunks(chunkSize):
+            out[i:i+len(c)] = c.reshape(len(c), -1)
+            i += len(c)
+        return out[:,0] if self.squeeze else out
+
+    def __array__(self, dtype=None, copy=None):
+        a = self.read()
+        return a.astype(dtype) if dtype is not None else a
@@ -0,0 +1,225 @@
+"""
+Power spectral densities of stacks of time series (e.g. several channels of many simulations at once),
+see Utilities/getPSD.m
+
+The time series are given as an array (nFiles x nt x nChannels), possibly memory-mapped (see outbFile and readStack).
+The files are processed by blocks: each block is read once, and the spectra of all its files and channels are
+computed with a single real FFT (one per block of segments for the Welch method). Blocks can be processed in a
+pool of processes.
+
+Example:
+    X = readStack(['Seed{}.outb'.format(i) for i in range(1000)], ['GenPwr','RootMyc1'], tmin=60)
+    f, S = psdStack(X, dt=0.05, method='welch', nperseg=4096)   # S: nFiles x nf x nChannels
+    fb, Sb = logBinPSD(f, S.mean(axis=0), nPerDecade=20)         # average over seeds, logarithmic bins
+"""
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from .outbFile import FASTOutputBinary
+except ImportError:
+    from outbFile import FASTOutputBinary
+
+BLOCK_SIZE = 16 # default number of files per block
+
+
+# --------------------------------------------------------------------------------}
+# --- Spectra
+# --------------------------------------------------------------------------------{
+def periodogram(X, dt, N=None, axis=1):
+    """
+    One-sided PSD computed directly with an FFT, as in getPSD.m: N/2 frequencies from 0 (the Nyquist frequency is
+    excluded), S = 2 |FFT(X)/N|^2 / df, with df = 1/(N dt).
+
+    INPUTS:
+      - X: time series, time along `axis`
+      - N: even number of steps of the FFT (X is truncated or padded with zeros). Default: number of time steps
+    OUTPUTS:
+      - f: frequencies [Hz]
+      - S: PSD [unit^2/Hz], with the frequencies along `axis`
+    """
+    X = np.asarray(X, dtype=float)
+    if N is None:
+        N = X.shape[axis]
+    if N % 2 == 1:
+        raise Exception('N must be even for the periodogram (N={})'.format(N))
+    df = 1/(N*dt)
+    F  = np.fft.rfft(X, n=N, axis=axis)
+    F  = np.take(F, np.arange(N//2), axis=axis)
+    return df*np.arange(N//2), 2*np.abs(F/N)**2/df
+
+
+def welch(X, dt, nperseg=None, noverlap=None, window='hann', detrend=True, axis=1):
+    """
+    One-sided PSD with Welch's method (averaged periodograms of windowed, overlapping segments)
+
+    INPUTS:
+      - X: time series, time along `axis`
+      - nperseg: number of time steps per segment. Default: min(nt, 256)
+      - noverlap: number of overlapping time steps. Default: nperseg//2
+      - window: 'hann', 'hamming', 'boxcar' or array of length nperseg
+      - detrend: remove the mean of each segment
+    OUTPUTS:
+      - f: frequencies [Hz], from 0 to the Nyquist frequency
+      - S: PSD [unit^2/Hz], with the frequencies along `axis`
+    """
+    X  = np.moveaxis(np.asarray(X, dtype=float), axis, -1)
+    nt = X.shape[-1]
+    if nperseg is None:
+        nperseg = min(nt, 256)
+    if nperseg>nt:
+        raise Exception('Segments ({}) longer than the time series ({})'.format(nperseg, nt))
+    if noverlap is None:
+        noverlap = nperseg//2
+    if isinstance(window, str):
+        n = np.arange(nperseg)
+        if window=='hann':
+            w = 0.5 - 0.5*np.cos(2*np.pi*n/nperseg)
+        elif window=='hamming':
+            w = 0.54 - 0.46*np.cos(2*np.pi*n/nperseg)
+        elif window=='boxcar':
+            w = np.ones(nperseg)
+        else:
+            raise Exception('Unknown window: {}'.format(window))
+    else:
+        w = np.asarray(window, dtype=float)
+    # All the segments at once: (..., nSeg, nperseg), views of X
+    seg = np.lib.stride_tricks.sliding_window_view(X, nperseg, axis=-1)[..., ::nperseg-noverlap, :]
+    if detrend:
+        seg = seg - np.mean(seg, axis=-1, keepdims=True)
+    F = np.fft.rfft(seg*w, axis=-1)
+    S = np.mean(np.abs(F)**2, axis=-2) / (np.sum(w**2)/dt)
+    S[..., 1:] *= 2
+    if nperseg % 2 == 0:
+        S[..., -1] /= 2 # Nyquist frequency
+    f = np.fft.rfftfreq(nperseg, dt)
+    return f, np.moveaxis(S, -1, axis)
+
+
+def getPSD(Data, df, N=None, BinLen=None, axis=0):
+    """
+    One-sided PSD, as getPSD.m (see periodogram), for one or several time series (time along `axis`)
+
+    INPUTS:
+      - Data: time series
+      - df: frequency step in Hz = 1/tmax
+      - N: even number of steps processed by the FFT. Default: length of Data
+      - BinLen: if provided, the PSD is also averaged over bins of BinLen frequencies (see binPSD)
+    OUTPUTS:
+      - f1, Sf1: frequencies and PSD
+      - f1_Bin, Sf1_Bin: binned frequencies and PSD (only if BinLen is provided)
+    """
+    Data = np.asarray(Data, dtype=float)
+    if N is None:
+        N = Data.shape[axis]
+    # getPSD.m defines the frequency step independently of N, equivalent to a time step of 1/(N df)
+    f1, Sf1 = periodogram(Data, 1/(N*df), N=N, axis=axis)
+    if BinLen is None:
+        return f1, Sf1
+    f1_Bin, Sf1_Bin = binPSD(f1, Sf1, BinLen, axis=axis)
+    return f1, Sf1, f1_Bin, Sf1_Bin
+
+
+# --------------------------------------------------------------------------------}
+# --- Binning
+# --------------------------------------------------------------------------------{
+def _binMean(f, S, starts, axis):
+    """ Mean of f and S over contiguous bins of frequencies starting at indices `starts` """
+    counts = np.diff(np.append(starts, len(f)))
+    shape  = [1]*np.ndim(S)
+    shape[axis] = len(counts)
+    fb = np.add.reduceat(f, starts)/counts
+    Sb = np.add.reduceat(S, starts, axis=axis)/counts.reshape(shape)
+    return fb, Sb
+
+
+def binPSD(f, S, BinLen, axis=1):
+    """ PSD averaged over bins of BinLen consecutive frequencies, as getPSD.m (f1_Bin, Sf1_Bin) """
+    S = np.asarray(S)
+    axis = axis % S.ndim
+    return _binMean(np.asarray(f, dtype=float), S, np.arange(0, len(f), BinLen), axis)
+
+
+def logBinPSD(f, S, nPerDecade=10, axis=1):
+    """
+    PSD averaged over logarithmically spaced bins of frequencies (nPerDecade bins per decade, empty bins are
+    skipped), for plots on logarithmic axes. The frequency 0 is excluded.
+    """
+    f = np.asarray(f, dtype=float)
+    S = np.asarray(S)
+    axis = axis % S.ndim
+    i0 = int(np.searchsorted(f, 0, side='right'))
+    if i0>=len(f):
+        raise Exception('No positive frequency to bin')
+    edges  = 10**(np.arange(np.floor(np.log10(f[i0])*nPerDecade), np.ceil(np.log10(f[-1])*nPerDecade)+1)/nPerDecade)
+    starts = np.unique(np.searchsorted(f, edges, side='left'))
+    starts = starts[(starts>=i0) & (starts<len(f))]
+    if len(starts)==0 or starts[0]!=i0:
+        starts = np.concatenate(([i0], starts))
+    fb, Sb = _binMean(f[i0:], np.take(S, np.arange(i0, len(f)), axis=axis), starts-i0, axis)
+    return fb, Sb
+
+
+# --------------------------------------------------------------------------------}
+# --- Stacks of time series
+# --------------------------------------------------------------------------------{
+def _psdBlock(args):
+    X, dt, method, kwargs = args
+    if method=='welch':
+        return welch(X, dt, axis=1, **kwargs)
+    elif method=='periodogram':
+        return periodogram(X, dt, axis=1, **kwargs)
+    raise Exception('Unknown PSD method: {}'.format(method))
+
+
+def psdStack(X, dt, method='welch', blockSize=BLOCK_SIZE, nProcs=None, BinLen=None, nPerDecade=None, **kwargs):
+    """
+    PSD of all the channels of a stack of time series
+
+    INPUTS:
+      - X: array (nFiles x nt x nChannels), possibly memory-mapped. A 2D array is considered as one file.
+      - dt: time step [s]
+      - method: 'welch' or 'periodogram', other keyword arguments are passed to welch or periodogram
+      - blockSize: number of files read and transformed at once
+      - nProcs: number of processes the blocks are distributed to. Default: blocks are processed in this process
+      - BinLen: if provided, the PSD is also averaged over bins of BinLen frequencies (see binPSD)
+      - nPerDecade: if provided (and BinLen is not), the PSD is also averaged over logarithmic bins (see logBinPSD)
+    OUTPUTS:
+      - f: frequencies [Hz]
+      - S: PSD (nFiles x nf x nChannels)
+      - fBin, SBin: binned frequencies and PSD, if BinLen or nPerDecade are provided
+    """
+    if np.ndim(X)==2:
+        X = X[None,:,:]
+    nFiles = X.shape[0]
+    blocks = [(X[i:i+blockSize], dt, method, kwargs) for i in range(0, nFiles, blockSize)]
+    if nProcs is not None and nProcs>1 and len(blocks)>1:
+        with ProcessPoolExecutor(max_workers=nProcs) as pool:
+            res = list(pool.map(_psdBlock, blocks))
+    else:
+        res = [_psdBlock(b) for b in blocks]
+    f = res[0][0]
+    S = np.concatenate([r[1] for r in res], axis=0)
+    if BinLen is not None:
+        return (f, S) + binPSD(f, S, BinLen, axis=1)
+    elif nPerDecade is not None:
+        return (f, S) + logBinPSD(f, S, nPerDecade, axis=1)
+    return f, S
+
+
+def readStack(FileNames, channels, tmin=None, tmax=None):
+    """
+    Stack of channels of several OpenFAST binary output files (see outbFile), truncated to the shortest file.
+    Only the selected channels and time window are decoded.
+
+    OUTPUTS:
+      - X: array (nFiles x nt x nChannels)
+      - dt: time step of the first file
+    """
+    views = [FASTOutputBinary(f).view(channels, tmin=tmin, tmax=tmax) for f in FileNames]
+    nt = min([len(v) for v in views])
+    X  = np.empty((len(views), nt, len(views[0].I)))
+    for i, v in enumerate(views):
+        X[i] = v[:nt]
+    t  = views[0].f.time
+    return X, t[1]-t[0]
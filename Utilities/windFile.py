@@ -0,0 +1,368 @@
+"""
+Readers for full-field wind files: TurbSim (.bts), Bladed (.wnd + .sum) and HAWC (u, v, w binary files),
+see Utilities/readfile_BTS.m, readfile_WND.m and readfile_HAWCwind.m
+
+The headers are parsed when the files are opened, and the velocity payload is memory-mapped: nothing else is read from
+disk until velocities are requested. The field is exposed as a lazy array of shape (nt, nComp, ny, nz), indexed
+orthogonally (one index per dimension: integer, slice, or list of indices). Only the selected values are read, and
+the scale and offset of each component are applied to them only.
+
+Example:
+    w = TurbSimBTS('Seed1.bts')
+    uHub = w[:, 0, w.iyHub, w.izHub]               # time series of u at hub height (nt)
+    disc = w[1000:2000, :, 5:20, 4:22]            # time window, rotor disc subset (1000 x 3 x 15 x 18)
+    for it, chunk in w.chunks(1024, components=0): # streaming over time chunks
+        ...
+    mean, std = fieldStatistics(['Seed{}.bts'.format(i) for i in range(100)], components=0)
+"""
+import os
+import numpy as np
+
+CHUNK_SIZE = 1024 # default number of time steps decoded at once
+
+
+class WindField():
+    """
+    Lazy full-field wind (nt x nComp x ny x nz), see TurbSimBTS, BladedWND, HAWCWind.
+
+    Attributes:
+      - nt, nComp, ny, nz, dt, dy, dz
+      - y, z: lateral and vertical coordinates of the grid points
+      - zHub: hub height, iyHub, izHub: indices of the grid point closest to the hub
+      - scale, offset: values = packed*scale + offset, for each component
+    Subclasses define _component(k): view (nt x ny x nz) of the packed values of component k.
+    """
+    @property
+    def shape(self):
+        return (self.nt, self.nComp, self.ny, self.nz)
+
+    def __len__(self):
+        return self.nt
+
+    def __repr__(self):
+        return '<{} {} (nt={}, nComp={}, ny={}, nz={}, dt={})>'.format(type(self).__name__, self.FileName, self.nt, self.nComp, self.ny, self.nz, self.dt)
+
+    @property
+    def t(self):
+        return np.arange(self.nt)*self.dt
+
+    @property
+    def iyHub(self):
+        return int(np.argmin(np.abs(self.y)))
+
+    @property
+    def izHub(self):
+        return int(np.argmin(np.abs(self.z-self.zHub)))
+
+    def _component(self, k):
+        raise NotImplementedError()
+
+    def __getitem__(self, key):
+        """ Decoded velocities, one index per dimension (t, component, y, z): integer, slice, or list (orthogonal indexing) """
+        if not isinstance(key, tuple):
+            key = (key,)
+        if len(key)>4:
+            raise IndexError('too many indices for a wind field of 4 dimensions')
+        key = key + (slice(None),)*(4-len(key))
+        squeeze = [isinstance(k, (int, np.integer)) for k in key]
+        # Integers are replaced by slices of length one, such that all the indices are orthogonal
+        idx = []
+        for k, n in zip(key, self.shape):
+            if isinstance(k, (int, np.integer)):
+                k = int(k)+n if k<0 else int(k)
+                if k<0 or k>=n:
+                    raise IndexError('index {} out of bounds for dimension of size {}'.format(k, n))
+                k = slice(k, k+1)
+            elif not isinstance(k, slice):
+                k = np.asarray(k, dtype=int).ravel()
+            idx.append(k)
+        It, Ik, Iy, Iz = idx
+        comps = np.arange(self.nComp)[Ik]
+        out = []
+        for k in comps:
+            a = self._component(k)
+            # Slices first (views on the memory map), then lists (copies of the subset only)
+            for axis, I in enumerate([It, Iy, Iz]):
+                if isinstance(I, slice):
+                    a = a[(slice(None),)*axis + (I,)]
+            for axis, I in enumerate([It, Iy, Iz]):
+                if not isinstance(I, slice):
+                    a = np.take(a, I, axis=axis)
+            out.append(np.asarray(a, dtype=float)*self.scale[k] + self.offset[k])
+        if len(out)==0:
+            out = np.zeros([len(range(n)[I]) if isinstance(I, slice) else len(I) for I, n in zip(idx, self.shape)])
+        else:
+            out = np.stack(out, axis=1)
+        return out.reshape([n for n, s in zip(out.shape, squeeze) if not s])
+
+    def __array__(self, dtype=None, copy=None):
+        a = self[:]
+        return a.astype(dtype) if dtype is not None else a
+
+    def chunks(self, chunkSize=CHUNK_SIZE, components=slice(None), y=slice(None), z=slice(None), tmin=None, tmax=None):
+        """
+        Generator of (it, decoded velocities) over chunks of at most chunkSize time steps, where it is the index of
+        the first time step of the chunk. The components and grid points are selected as in __getitem__.
+        """
+        i0 = 0       if tmin is None else int(np.ceil(tmin/self.dt-1e-9))
+        i1 = self.nt if tmax is None else int(np.floor(tmax/self.dt+1e-9))+1
+        i0, i1 = max(i0, 0), min(i1, self.nt)
+        for it in range(i0, i1, chunkSize):
+            yield it, self[it:min(it+chunkSize, i1), components, y, z]
+
+
+def fieldStatistics(fields, chunkSize=CHUNK_SIZE, components=slice(None), y=slice(None), z=slice(None), tmin=None, tmax=None):
+    """
+    Mean and standard deviation over time (and over all the fields, e.g. seeds), computed by streaming over chunks
+
+    INPUTS:
+      - fields: list of WindField objects or of file names (opened with openWindFile)
+      - other inputs: see WindField.chunks
+    OUTPUTS:
+      - mean, std: arrays of the shape of the selection without the time dimension
+    """
+    n, S, S2 = 0, 0, 0
+    for f in fields:
+        if isinstance(f, str):
+            f = openWindFile(f)
+        for _, c in f.chunks(chunkSize, components=components, y=y, z=z, tmin=tmin, tmax=tmax):
+            n  += len(c)
+            S  = S  + np.sum(c, axis=0)
+            S2 = S2 + np.sum(c**2, axis=0)
+    if n==0:
+        raise Exception('No time step selected')
+    mean = S/n
+    return mean, np.sqrt(np.maximum(S2/n - mean**2, 0))
+
+
+def openWindFile(FileName, **kwargs):
+    """ Open a wind file based on its extension (.bts or .wnd) """
+    ext = os.path.splitext(FileName)[1].lower()
+    if ext=='.bts':
+        return TurbSimBTS(FileName, **kwargs)
+    elif ext=='.wnd':
+        return BladedWND(FileName, **kwargs)
+    raise Exception('Unknown wind file extension: {}'.format(FileName))
+
+
+def _read(fid, dtype, n=1, FileName=''):
+    a = np.fromfile(fid, dtype=np.dtype(dtype), count=n)
+    if len(a)<n:
+        raise Exception('Could not read the header of wind file: {}'.format(FileName))
+    return a
+
+
+def _memmap(FileName, dtype, offset, shape):
+    nBytes = offset + np.dtype(dtype).itemsize*int(np.prod(shape))
+    if os.path.getsize(FileName) < nBytes:
+        raise Exception('Could not read entire file {}: expected {} bytes, file has {} bytes.'.format(FileName, nBytes, os.path.getsize(FileName)))
+    if np.prod(shape)==0:
+        return np.zeros(shape, dtype=dtype)
+    return np.memmap(FileName, dtype=dtype, mode='r', offset=offset, shape=shape)
+
+
+# --------------------------------------------------------------------------------}
+# --- TurbSim
+# --------------------------------------------------------------------------------{
+class TurbSimBTS(WindField):
+    """
+    Memory-mapped TurbSim binary file (.bts), see readfile_BTS.m
+
+    Additional attributes: ntwr, zTwr, mffws, z1, DescStr
+    """
+    def __init__(self, FileName, fileFmt='int16'):
+        self.FileName = FileName
+        with open(FileName, 'rb') as fid:
+            r = lambda dtype, n=1: _read(fid, dtype, n, FileName)
+            self.FileID = int(r('<i2')[0]) # TurbSim format identifier (should = 7 or 8 if periodic)
+            self.nz, self.ny, self.ntwr, self.nt = [int(v) for v in r('<i4', 4)]
+            self.dz, self.dy, self.dt, self.mffws, self.zHub, self.z1 = [float(v) for v in r('<f4', 6)]
+            V = r('<f4', 6).astype(float)
+            Vslope, Voffset = V[0::2], V[1::2]
+            nchar = int(r('<i4')[0])
+            self.DescStr = r('u1', nchar).tobytes().decode('latin-1')
+            offset = fid.tell()
+        self.nComp = 3
+        if fileFmt=='float32':
+            Vslope, Voffset = np.ones(3), np.zeros(3)
+        self.scale  = 1/Vslope
+        self.offset = -Voffset/Vslope
+        nv, nvTwr   = 3*self.ny*self.nz, 3*self.ntwr
+        self._packed = _memmap(FileName, np.dtype(fileFmt).newbyteorder('<'), offset, (self.nt, nv+nvTwr))
+        # Per time step: grid points (iz, iy, component), then tower points (iz, component)
+        self._grid  = self._packed[:, :nv].reshape(self.nt, self.nz, self.ny, 3).transpose(0, 3, 2, 1)
+        self._tower = self._packed[:, nv:].reshape(self.nt, self.ntwr, 3).transpose(0, 2, 1)
+        self.y    = np.arange(self.ny)*self.dy - self.dy*(self.ny-1)/2
+        self.z    = np.arange(self.nz)*self.dz + self.z1
+        self.zTwr = self.z1 - np.arange(self.ntwr)*self.dz
+
+    def _component(self, k):
+        return self._grid[:, k]
+
+    def tower(self, rows=slice(None)):
+        """ Decoded velocities at the tower points for a range of time steps (nt x 3 x ntwr) """
+        return np.asarray(self._tower[rows], dtype=float)*self.scale[None,:,None] + self.offset[None,:,None]
+
+
+def readfile_BTS(FileName, fileFmt='int16'):
+    """ Read a TurbSim file entirely, with the outputs of readfile_BTS.m (velocity is nt x 3 x ny x nz) """
+    w = TurbSimBTS(FileName, fileFmt=fileFmt)
+    return w[:], w.tower(), w.y, w.z, w.zTwr, w.nz, w.ny, w.dz, w.dy, w.dt, w.zHub, w.z1, w.mffws
+
+
+# --------------------------------------------------------------------------------}
+# --- Bladed
+# --------------------------------------------------------------------------------{
+def _readSummary(sumFile, needStats=True):
+    """
+    Variables of the summary file of a Bladed wind file: zHub, Clockwise, UBAR, TI_u, TI_v, TI_w, ZGoffset, LHR
+    UBAR and the turbulence intensities are not needed (needStats=False) for new-style wind files, which store them in
+    their header (or use unit intensities).
+    """
+    keys = ['HUB HEIGHT', 'CLOCKWISE', 'UBAR', 'TI(U', 'TI(V', 'TI(W']
+    SummVars = np.zeros(len(keys))
+    SummVars[1] = -1 # clockwise is optional, default to false
+    found = np.zeros(len(keys), dtype=bool)
+    ZGoffset, LHR, foundOffset = 0.0, False, False
+    with open(sumFile, 'r', errors='replace') as f:
+        for line in f:
+            line = line.upper()
+            for i, key in enumerate(keys):
+                if not found[i] and line.find(key)>=0:
+                    found[i] = True
+                    txt = line[line.find('=')+1:] if line.find('=')>=0 else line
+                    txt = txt.split('%')[0].split()
+                    tok = txt[0] if len(txt)>0 else ''
+                    try:
+                        SummVars[i] = float(tok)
+                    except ValueError:
+                        SummVars[i] = 1 if tok[:1]=='T' else -1 # use -1 for false
+                    break
+            if line.find('HEIGHT OFFSET')>=0 and not foundOffset:
+                foundOffset = True
+                txt = line[line.find('=')+1:].split() # whole line if there is no "=", as readfile_WND.m
+                try:
+                    ZGoffset = float(txt[0])
+                except (IndexError, ValueError):
+                    ZGoffset = np.nan
+            if line.find('BLADED LEFT-HAND RULE')>=0:
+                LHR = True
+    need = [0] + ([2, 3, 4, 5] if needStats else [])
+    if not np.all(found[need]):
+        raise Exception('Reached the end of summary file without all necessary data: {}'.format(sumFile))
+    return SummVars, ZGoffset, LHR
+
+
+class BladedWND(WindField):
+    """
+    Memory-mapped Bladed wind file (.wnd), scaled using its summary file (.sum), see readfile_WND.m
+
+    Additional attributes: mffws, z1, SummVars (zHub, Clockwise, UBAR, TI_u, TI_v, TI_w)
+    """
+    def __init__(self, FileName):
+        base = FileName[:-4] if FileName.lower().endswith('.wnd') else FileName
+        self.FileName = base+'.wnd'
+        with open(self.FileName, 'rb') as fid:
+            r = lambda dtype, n=1: _read(fid, dtype, n, self.FileName)
+            nffc = int(r('<i2')[0])
+            TI   = None
+            if nffc != -99: # old-style AeroDyn wind file
+                dz, dy, dx, nt, MFFWS = r('<i2', 5).astype(float)
+                r('<i2', 5)
+                nz, ny = r('<i2', 2).astype(int)
+                r('<i2', 3*(-nffc-1))
+                nffc = -nffc
+                dz, dy, dx, MFFWS = 0.001*dz, 0.001*dy, 0.001*dx, 0.1*MFFWS
+                nz = (nz % 2**16)//1000 # the mod 2^16 is a work around for somewhat larger grids
+                ny = (ny % 2**16)//1000
+            else: # newer-style AeroDyn wind file
+                fc = int(r('<i2')[0])
+                if fc==4:
+                    nffc = int(r('<i4')[0])
+                    lat, z0, zOffset, TI_U, TI_V, TI_W = r('<f4', 6).astype(float)
+                    TI = [TI_U, TI_V, TI_W]
+                else:
+                    nffc = 3 if fc>2 else 1
+                    TI = [1, 1, 1] # as readfile_WND.m: the velocities are only scaled by the mean wind speed
+                    if fc in [7, 8]: # General Kaimal, Mann model
+                        r('<i4') # HeadRec
+                        nffc = int(r('<i4')[0])
+                dz, dy, dx = r('<f4', 3).astype(float)
+                nt    = int(r('<i4')[0])
+                MFFWS = float(r('<f4')[0])
+                r('<f4', 3) # zLu, yLu, xLu
+                r('<i4', 2)
+                nz, ny = r('<i4', 2).astype(int)
+                if nffc==3:
+                    r('<i4', 2*nffc)
+                if fc==7:
+                    r('<f4', 2) # CohDec, CohLc
+                elif fc==8:
+                    r('<f4', 6); r('<i4', 3); r('<f4', 2); r('<i4', 3); r('<f4', 2)
+            offset = fid.tell()
+        self.nComp, self.nz, self.ny = int(nffc), int(nz), int(ny)
+        self.nt = max(int(nt)*2, 1)
+        self.dz, self.dy, self.dt, self.mffws = dz, dy, dx/MFFWS, MFFWS
+
+        self.SummVars, ZGoffset, LHR = _readSummary(base+'.sum', needStats=TI is None)
+        if TI is not None:
+            self.SummVars[2:6] = [MFFWS] + TI
+        self.scale  = 0.00001*self.SummVars[2]*self.SummVars[3:3+self.nComp]
+        self.offset = np.array([self.SummVars[2], 0, 0])[:self.nComp]
+        if LHR and self.nComp>1: # Bladed defined the v-component opposite of the right-hand rule
+            self.scale[1] = -self.scale[1]
+
+        packed = _memmap(self.FileName, np.dtype('<i2'), offset, (self.nt, self.nz, self.ny, self.nComp))
+        if self.SummVars[1]>0: # clockwise rotation, flip the y direction
+            packed = packed[:, :, ::-1, :]
+        self._grid = packed.transpose(0, 3, 2, 1)
+        self.zHub = self.SummVars[0]
+        self.z1   = self.zHub - ZGoffset - self.dz*(self.nz-1)/2 # bottom of the grid
+        self.y    = np.arange(self.ny)*self.dy - self.dy*(self.ny-1)/2
+        self.z    = np.arange(self.nz)*self.dz + self.z1
+
+    def _component(self, k):
+        return self._grid[:, k]
+
+
+def readfile_WND(FileName):
+    """ Read a Bladed wind file entirely, with the outputs of readfile_WND.m (velocity is nt x nComp x ny x nz) """
+    w = BladedWND(FileName)
+    return w[:], w.y, w.z, w.nz, w.ny, w.dz, w.dy, w.dt, w.zHub, w.z1, w.SummVars
+
+
+# --------------------------------------------------------------------------------}
+# --- HAWC
+# --------------------------------------------------------------------------------{
+class HAWCWind(WindField):
+    """
+    Memory-mapped HAWC wind files (one float32 file per component, x (time) slowest, z fastest), see readfile_HAWCwind.m
+
+    INPUTS:
+      - fileNames: list of the files of each component, or root name to which 'u.bin', 'v.bin', 'w.bin' are appended
+      - nz, ny, nx: number of points of the grid, nx being the number of time steps
+      - dt, dy, dz: grid spacing (dt = dx/U)
+      - zHub: height of the center of the grid
+    """
+    def __init__(self, fileNames, nz, ny, nx, dt=1, dy=1, dz=1, zHub=0):
+        if isinstance(fileNames, str):
+            fileNames = [fileNames+c for c in ['u.bin', 'v.bin', 'w.bin']]
+        self.FileName  = fileNames[0]
+        self.fileNames = fileNames
+        self.nt, self.nComp, self.ny, self.nz = int(nx), len(fileNames), int(ny), int(nz)
+        self.dt, self.dy, self.dz, self.zHub = dt, dy, dz, zHub
+        self.scale  = np.ones(self.nComp)
+        self.offset = np.zeros(self.nComp)
+        self._comps = [None]*self.nComp
+        self.y = np.arange(self.ny)*self.dy - self.dy*(self.ny-1)/2
+        self.z = np.arange(self.nz)*self.dz - self.dz*(self.nz-1)/2 + self.zHub
+
+    def _component(self, k):
+        if self._comps[k] is None:
+            self._comps[k] = _memmap(self.fileNames[k], np.dtype('<f4'), 0, (self.nt, self.ny, self.nz))[:, ::-1, :]
+        return self._comps[k]
+
+
+def readfile_HAWCwind(fileNames, nz, ny, nx):
+    """ Read HAWC wind files entirely, velocity is nt x nComp x ny x nz (as the second output of readfile_HAWCwind.m) """
+    return HAWCWind(fileNames, nz, ny, nx)[:]